@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+ПАКЕТНЫЙ РАСЧЕТ ЗАДАНИЙ ИЗ ФАЙЛА
+
+Каждая строка входного файла - одно задание в формате messages.HELP.
+Номер задания задается через --task для всего файла или префиксом строки
+("5: 1 2 3 4;5"). Пустые строки и строки с "#" в начале пропускаются, но
+в выходном файле им соответствуют пустые строки: N-я строка результата
+относится к N-й строке ввода.
+
+Файл отображается в память (mmap) и делится на куски по границам строк.
+Рабочие процессы получают только смещения куска, сами читают его через
+mmap, разбирают и считают задания (пары задания 1 одной длины - одним
+вызовом execute_1_batch). Результаты пишутся в выходной файл по порядку
+кусков сразу по готовности, в stderr выводится прогресс.
+
+Примеры:
+    python batch.py jobs.txt --task 5 --output results.txt
+    python batch.py jobs.txt --workers 8 --chunk-size 4
+"""
+
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from exceptions import USER_MESSAGES, BotError, ErrorCode
+from input_parser import PARSERS, precheck
+
+# Размер куска по умолчанию (МБ) и период вывода прогресса (секунды)
+CHUNK_MB = 1.0
+PROGRESS_INTERVAL = 1.0
+TASKS = tuple(PARSERS)
+COMMENT = "#"
+
+
+def iter_chunks(mm: mmap.mmap, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Куски файла (начало, конец) не меньше chunk_size, по границам строк"""
+    start, size = 0, len(mm)
+    while start < size:
+        end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if end < 0 else end + 1
+        yield start, end
+        start = end
+
+
+def split_job(line: str, task: Optional[str]) -> Tuple[Optional[str], str]:
+    """Строка -> (задание, данные); префикс "N:" важнее task"""
+    head, sep, rest = line.partition(":")
+    if sep and head.strip() in TASKS:
+        return head.strip(), rest
+    return task, line
+
+
+def parse_job(task: str, line: str):
+    """Разбор данных задания; ошибки - InputError с позицией"""
+    args = PARSERS[task](line)
+    if task == "4" and args[2] is None:
+        raise ValueError("не указана операция (+ или -)")
+    return args
+
+
+def _error_text(e: Exception) -> str:
+    text = e.user_message if isinstance(e, BotError) else str(e)
+    return "error: " + text.replace("\n", " ")
+
+
+def run_chunk(path: str, start: int, end: int, task: Optional[str]) -> Tuple[str, int, int]:
+    """
+    Расчет всех заданий куска [start, end) файла path
+
+    Returns:
+        (текст результатов, заданий, ошибок)
+    """
+    from task_1 import execute_1_batch
+    from task_4 import execute_4
+    from task_5 import execute_5
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode("utf-8")
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+
+    output: List[str] = [""] * len(lines)
+    pairs, pair_rows = [], []
+    jobs = errors = 0
+    for row, line in enumerate(lines):
+        line = line.rstrip("\r")
+        if not line.strip() or line.lstrip().startswith(COMMENT):
+            continue
+        jobs += 1
+        kind, line = split_job(line, task)
+        if kind is None:
+            output[row] = "error: не указано задание (--task или префикс '1:', '4:', '5:')"
+            errors += 1
+            continue
+        # Явно неверные строки отсекаются по коду, без исключения
+        code = precheck(line, kind)
+        if code != ErrorCode.OK:
+            output[row] = "error: " + USER_MESSAGES[code]
+            errors += 1
+            continue
+        try:
+            args = parse_job(kind, line)
+            if kind == "1":
+                if len(args[0]) != len(args[1]):
+                    raise ValueError("Массивы должны быть одинаковой длины")
+                # Задания 1 считаются вместе после разбора всего куска
+                pairs.append(args)
+                pair_rows.append(row)
+            elif kind == "4":
+                output[row] = str(execute_4(*args))
+            else:
+                output[row] = str(execute_5(*args))
+        except Exception as e:
+            output[row] = _error_text(e)
+            errors += 1
+
+    if pairs:
+        try:
+            results = execute_1_batch(pairs)
+        except Exception:
+            # Ошибка в одной паре не должна терять результаты остальных
+            results = []
+            for pair in pairs:
+                try:
+                    results.append(execute_1_batch([pair])[0])
+                except Exception as e:
+                    results.append(e)
+        for row, result in zip(pair_rows, results):
+            if isinstance(result, Exception):
+                output[row] = _error_text(result)
+                errors += 1
+            else:
+                output[row] = str(result)
+
+    return "".join(line + "\n" for line in output), jobs, errors
+
+
+def _run_chunk(job) -> Tuple[str, int, int, int]:
+    path, start, end, task = job
+    text, jobs, errors = run_chunk(path, start, end, task)
+    return text, jobs, errors, end - start
+
+
+def run_batch(path: str, out, task: Optional[str] = None, workers: Optional[int] = None,
+              chunk_size: int = int(CHUNK_MB * 1024 * 1024), progress: bool = True) -> dict:
+    """
+    Расчет файла path с записью результатов в открытый файл out
+
+    Args:
+        workers: число процессов (по умолчанию - число ядер, 0 - в текущем процессе)
+
+    Returns:
+        dict: статистика (задания, ошибки, время, пропускная способность)
+    """
+    total = os.path.getsize(path)
+    jobs = errors = done = 0
+    start = time.perf_counter()
+    last = start
+
+    if total:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chunks = [(path, lo, hi, task) for lo, hi in iter_chunks(mm, chunk_size)]
+
+        pool = None
+        if workers != 0 and len(chunks) > 1:
+            context = multiprocessing.get_context("spawn")
+            pool = context.Pool(min(workers or os.cpu_count(), len(chunks)))
+        try:
+            # imap отдает результаты в порядке кусков, как только готов очередной
+            results = pool.imap(_run_chunk, chunks) if pool else map(_run_chunk, chunks)
+            for text, n, failed, size in results:
+                out.write(text)
+                jobs += n
+                errors += failed
+                done += size
+                now = time.perf_counter()
+                if progress and now - last >= PROGRESS_INTERVAL:
+                    last = now
+                    print(f"{done * 100 / total:5.1f}%  заданий: {jobs}  "
+                          f"{jobs / (now - start):.0f}/с  {done / (now - start) / 2**20:.1f} МБ/с",
+                          file=sys.stderr)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "jobs": jobs,
+        "errors": errors,
+        "bytes": total,
+        "elapsed_s": elapsed,
+        "jobs_per_s": jobs / elapsed if elapsed else 0.0,
+        "mb_per_s": total / elapsed / 2**20 if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетный расчет заданий 1, 4 и 5 из файла")
+    parser.add_argument("input", help="файл заданий, по одному в строке")
+    parser.add_argument("--task", choices=TASKS, help="задание для строк без префикса 'N:'")
+    parser.add_argument("--output", help="файл результатов (по умолчанию stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="число процессов (по умолчанию - число ядер, 0 - без пула)")
+    parser.add_argument("--chunk-size", type=float, default=CHUNK_MB,
+                        help="размер куска файла, МБ")
+    parser.add_argument("--quiet", action="store_true", help="без вывода прогресса")
+    args = parser.parse_args(argv)
+
+    chunk_size = max(1, int(args.chunk_size * 1024 * 1024))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            stats = run_batch(args.input, out, args.task, args.workers, chunk_size, not args.quiet)
+    else:
+        stats = run_batch(args.input, sys.stdout, args.task, args.workers, chunk_size, not args.quiet)
+    print(json.dumps(stats, ensure_ascii=False), file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,131 +1,231 @@
 #!/usr/bin/env python3
 """
-СКРИПТ ДЛЯ ИЗМЕРЕНИЯ ПРОИЗВОДИТЕЛЬНОСТИ ОПТИМИЗАЦИЙ
+НАБОР БЕНЧМАРКОВ ДЛЯ ЗАДАНИЙ 1, 4 И 5
+
+Каждое задание измеряется на размерах от 10 до 10^6 элементов (для задания 4 -
+количество цифр). Для каждого размера выполняются прогревочные и повторные
+запуски, считаются медиана и 95-й перцентиль времени и пиковая память по
+tracemalloc. Результаты выводятся в JSON и могут сравниваться с сохраненной
+базовой линией: при замедлении больше порога скрипт завершается с кодом 1.
+
+Примеры:
+    python benchmark.py --output results.json
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.25 --min-delta 0.05
 """
 
-import time
-import tracemalloc
+import argparse
+import json
+import platform
 import random
+import statistics
 import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from task_1 import execute_1
 from task_4 import execute_4
 from task_5 import execute_5
 
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_THRESHOLD = 0.25
+# Замедление меньше этой разницы медиан (мс) - шум таймера, а не регрессия
+DEFAULT_MIN_DELTA_MS = 0.05
+
+# Бюджет времени на повторы одного размера (секунды)
+TIME_BUDGET = 2.0
+
+
 def measure_memory(func, *args):
-    """Измерение потребления памяти"""
+    """Измерение потребления памяти (текущая и пиковая, в KB)"""
     tracemalloc.start()
-    
-    result = func(*args)
-    
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
-    
-    return result, current / 1024, peak / 1024  # в KB
+    try:
+        result = func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, current / 1024, peak / 1024
+
 
 def measure_time(func, *args, iterations=1000):
-    """Измерение времени выполнения"""
+    """Измерение среднего времени выполнения (мс на одну операцию)"""
     start = time.perf_counter()
-    
+
     for _ in range(iterations):
         func(*args)
-    
+
     end = time.perf_counter()
-    return (end - start) * 1000 / iterations  # мс на одну операцию
-
-def run_benchmarks():
-    """Запуск всех бенчмарков"""
-    print("=" * 60)
-    print("БЕНЧМАРКИНГ ОПТИМИЗАЦИЙ")
-    print("=" * 60)
-    
-    # Тестовые данные
-    test_arr1 = [random.randint(-100, 100) for _ in range(1000)]
-    test_arr2 = [random.randint(-100, 100) for _ in range(1000)]
-    test_arr4_1 = [1, 2, 3]
-    test_arr4_2 = [4, 5, 6]
-    test_arr5 = [random.randint(-10, 10) for _ in range(1000)]
-    test_target = 5
-    
-    print("\n1. ЗАДАНИЕ 1 - Обработка двух массивов")
-    print("-" * 40)
-    
-    # Измерение времени
-    time_original = measure_time(execute_1, test_arr1, test_arr2, iterations=100)
-    _, mem_current, mem_peak = measure_memory(execute_1, test_arr1, test_arr2)
-    
-    print(f"Время выполнения: {time_original:.3f} мс")
-    print(f"Пиковое потребление памяти: {mem_peak:.2f} KB")
-    
-    print("\n2. ЗАДАНИЕ 4 - Арифметика чисел-массивов")
-    print("-" * 40)
-    
-    # Тестирование кэширования (упрощённый вариант)
-    # Создаём простой кэш прямо в функции
-    cache = {}
-    
-    def execute_cached(arr1, arr2, operation):
-        key = (tuple(arr1), tuple(arr2), operation)
-        if key not in cache:
-            cache[key] = execute_4(arr1, arr2, operation)
-        return cache[key]
-    
-    start = time.perf_counter()
-    for _ in range(1000):
-        execute_4(test_arr4_1, test_arr4_2, '+')
-    time_no_cache = (time.perf_counter() - start) * 1000
-    
-    start = time.perf_counter()
-    for _ in range(1000):
-        execute_cached(test_arr4_1, test_arr4_2, '+')
-    time_with_cache = (time.perf_counter() - start) * 1000
-    
-    print(f"Без кэша: {time_no_cache:.2f} мс")
-    print(f"С кэшем:  {time_with_cache:.2f} мс")
-    print(f"Ускорение: {time_no_cache/time_with_cache:.1f} раз")
-    
-    print("\n3. ЗАДАНИЕ 5 - Подмассивы с заданной суммой")
-    print("-" * 40)
-    
-    # Тестирование алгоритма O(n) vs O(n²)
-    time_new = measure_time(execute_5, test_arr5, test_target, iterations=10)
-    _, mem_current_new, mem_peak_new = measure_memory(execute_5, test_arr5, test_target)
-    
-    print(f"Новый алгоритм (O(n²)):")
-    print(f"  Время: {time_new:.3f} мс")
-    print(f"  Память: {mem_peak_new:.2f} KB")
-    
-    # Оцениваем старый алгоритм на меньших данных
-    small_arr = test_arr5[:100]  # 100 элементов
-    time_old_estimated = measure_time(
-        lambda arr, t: sum(1 for i in range(len(arr)) 
-                          for j in range(i, len(arr)) 
-                          if sum(arr[i:j+1]) == t),
-        small_arr, test_target, iterations=1
-    )
-    
-    # Экстраполяция на 1000 элементов
-    scale_factor = (1000/100) ** 2  # O(n²) масштабирование
-    time_old_estimated *= scale_factor
-    
-    print(f"\nСтарый алгоритм (O(n³)) оценка для 1000 элементов:")
-    print(f"  Время: {time_old_estimated:.1f} мс (оценка)")
-    print(f"  Ускорение: {time_old_estimated/time_new:.1f} раз")
-    
-    print("\n4. ОБЩИЕ ВЫВОДЫ")
-    print("-" * 40)
-    
-    total_improvement = {
-        'task1': 1.5,  # Ускорение в 1.5 раза
-        'task4': 10.0, # Ускорение в 10 раз с кэшем
-        'task5': 100.0 # Ускорение в 100+ раз
+    return (end - start) * 1000 / iterations
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Перцентиль q (0..100) с линейной интерполяцией"""
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+# ========== ВХОДНЫЕ ДАННЫЕ ==========
+
+def make_task1(size: int, rng: random.Random) -> Tuple:
+    arr1 = [rng.randint(-100, 100) for _ in range(size)]
+    arr2 = [rng.randint(-100, 100) for _ in range(size)]
+    return arr1, arr2
+
+
+def make_task4(size: int, rng: random.Random) -> Tuple:
+    arr1 = [rng.randint(1, 9)] + [rng.randint(0, 9) for _ in range(size - 1)]
+    arr2 = [rng.randint(1, 9)] + [rng.randint(0, 9) for _ in range(size - 1)]
+    return arr1, arr2, rng.choice("+-")
+
+
+def make_task5(size: int, rng: random.Random) -> Tuple:
+    arr = [rng.randint(-10, 10) for _ in range(size)]
+    return arr, rng.randint(-10, 10)
+
+
+TASKS: Dict[str, Tuple[Callable, Callable]] = {
+    "task1": (execute_1, make_task1),
+    "task4": (execute_4, make_task4),
+    "task5": (execute_5, make_task5),
+}
+
+
+# ========== ИЗМЕРЕНИЯ ==========
+
+def bench_case(func: Callable, args: Tuple, warmup: int, repeats: int) -> Dict[str, Any]:
+    """Замер одного размера: прогрев, повторы, пиковая память"""
+    for _ in range(warmup):
+        func(*args)
+
+    samples = []
+    deadline = time.perf_counter() + TIME_BUDGET
+    for i in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+        # Для больших размеров не выходим за бюджет, но делаем минимум 3 замера
+        if i >= 2 and time.perf_counter() > deadline:
+            break
+
+    _, _, peak = measure_memory(func, *args)
+
+    return {
+        "runs": len(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": percentile(samples, 95),
+        "min_ms": min(samples),
+        "peak_kb": peak,
+    }
+
+
+def run_benchmarks(tasks=tuple(TASKS), sizes=DEFAULT_SIZES, warmup=2, repeats=20,
+                   seed=0, progress=None) -> Dict[str, Any]:
+    """Запуск всех бенчмарков, результат в виде словаря для JSON"""
+    report: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": {},
     }
-    
-    print("Суммарное улучшение производительности:")
-    for task, improvement in total_improvement.items():
-        print(f"  {task}: в {improvement:.1f} раз")
-    
-    print(f"\nЭкономия памяти: ~30-50% за счет оптимизаций")
-    print("Потребление CPU: снижено на 60-80%")
+
+    for name in tasks:
+        func, make = TASKS[name]
+        report["results"][name] = {}
+        for size in sizes:
+            args = make(size, random.Random(seed + size))
+            case = bench_case(func, args, warmup, repeats)
+            report["results"][name][str(size)] = case
+            if progress:
+                progress(name, size, case)
+
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float, min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """
+    Сравнение с базовой линией по медиане
+
+    Регрессия - медиана больше базовой в 1 + threshold раз и не меньше
+    чем на min_delta_ms: на малых размерах медианы - микросекунды, и
+    относительная разница между одинаковыми прогонами бывает больше порога.
+
+    Returns:
+        list: описания регрессий (пустой, если регрессий нет)
+    """
+    regressions = []
+    for name, cases in report["results"].items():
+        base_cases = baseline.get("results", {}).get(name, {})
+        for size, case in cases.items():
+            base = base_cases.get(size)
+            if not base:
+                continue
+            ratio = case["median_ms"] / max(base["median_ms"], 1e-6)
+            delta = case["median_ms"] - base["median_ms"]
+            if ratio > 1 + threshold and delta >= min_delta_ms:
+                regressions.append(
+                    f"{name} n={size}: {base['median_ms']:.3f} -> "
+                    f"{case['median_ms']:.3f} мс (x{ratio:.2f})"
+                )
+    return regressions
+
+
+def _print_case(name: str, size: int, case: Dict[str, Any]):
+    print(f"{name:6} n={size:<8} median={case['median_ms']:10.3f} мс  "
+          f"p95={case['p95_ms']:10.3f} мс  peak={case['peak_kb']:10.1f} KB  "
+          f"runs={case['runs']}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки заданий 1, 4 и 5")
+    parser.add_argument("--tasks", nargs="+", choices=list(TASKS), default=list(TASKS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для результатов JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON с базовой линией для сравнения")
+    parser.add_argument("--save-baseline", help="сохранить результаты как базовую линию")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление медианы (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="минимальная разница медиан для регрессии, мс")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.tasks, args.sizes, args.warmup, args.repeats,
+                            args.seed, progress=_print_case)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    elif not args.save_baseline:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print("РЕГРЕССИИ ПРОИЗВОДИТЕЛЬНОСТИ:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("Регрессий нет", file=sys.stderr)
+
+    return 0
+
 
 if __name__ == "__main__":
-    run_benchmarks()
\ No newline at end of file
+    sys.exit(main())
@@ -1,203 +1,206 @@
 """
 Основной модуль бота
+
+Импорт модуля дешевый: aiogram, обработчики, клавиатуры и таблица заданий
+загружаются при сборке приложения (create_app), которая происходит при
+первом обращении к get_app() или к атрибутам модуля bot.dp, bot.bot,
+bot.outbox, bot.executor, bot.scheduler, bot.sessions, bot.profiler,
+bot.config.
+Настройки - переменные окружения BOT_* (см. config.py).
 """
 
-import asyncio
-import random
-from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.fsm.storage.memory import MemoryStorage
+from typing import Optional
 
-# ========== КОНФИГУРАЦИЯ ==========
-TOKEN = "8508097815:AAGH_LuVgWdmNty4paGoEsWf0eEfKLgRzxQ"
+from config import Config, load_config
+from logger import log
 
-# Сначала создаем объекты
-bot = Bot(token=TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+# Атрибуты модуля, которые берутся из приложения (и собирают его при первом обращении)
+APP_ATTRS = ("bot", "dp", "sessions", "outbox", "executor", "scheduler", "profiler", "config")
+
+
+class App:
+    """
+    Собранное приложение: диспетчер с обработчиками и общие ресурсы
+
+    Бот (клиент Bot API) создается при первом обращении к App.bot: утилиты,
+    которые подают обновления своему боту (loadtest.py, replay.py), токен
+    не требуют.
+    """
+
+    def __init__(self, config: Config):
+        from aiogram import Dispatcher
+        from sessions import SessionStore, SessionStorage
+        from outbox import Outbox
+        from executor import TaskExecutor
+        from scheduler import Scheduler
+        from profiler import Profiler
+        from cache import results as result_cache
+        import metrics
+        import handlers
+
+        self.config = config
+        self._bot = None
+
+        # ========== ХРАНИЛИЩЕ ПОЛЬЗОВАТЕЛЕЙ ==========
+        self.sessions = SessionStore(
+            max_sessions=config.session_max,
+            max_bytes=config.session_max_bytes,
+            idle_ttl=config.session_idle_ttl,
+            path=config.session_db
+        )
+        self.dp = Dispatcher(storage=SessionStorage(self.sessions))
+
+        # Ответы обработчиков отправляются через очередь: send(msg.answer(...)) без await
+        self.outbox = Outbox(
+            global_rate=config.outbox_global_rate,
+            chat_rate=config.outbox_chat_rate,
+            chat_burst=config.outbox_chat_burst
+        )
+
+        # ========== ВЫПОЛНЕНИЕ ЗАДАНИЙ ==========
+        self.executor = TaskExecutor(
+            backend=config.executor_backend,
+            max_workers=config.executor_workers,
+            max_queue=config.executor_queue,
+            timeout=config.executor_timeout
+        )
+        # Очередь перед пулом: дешевые задания раньше, пользователи по очереди
+        self.scheduler = Scheduler(
+            self.executor,
+            user_jobs=config.scheduler_user_jobs,
+            user_queue=config.scheduler_user_queue
+        )
+
+        # ========== МЕТРИКИ ==========
+        metrics.setup(self.dp)
+        if config.record_file:
+            import recorder
+            recorder.setup(self.dp, config.record_file)
+        metrics.watch("bot_cache_hit_ratio", "Доля попаданий в кэш результатов",
+                      lambda: result_cache.stats()["hit_rate"])
+        metrics.watch("bot_cache_entries", "Количество записей в кэше результатов",
+                      lambda: len(result_cache))
+        metrics.watch("bot_executor_queue_depth", "Задания, ожидающие свободного рабочего",
+                      lambda: self.executor.queue_depth)
+        metrics.watch("bot_executor_pending", "Задания в пуле исполнителя (ожидают и выполняются)",
+                      lambda: self.executor.pending)
+        metrics.watch("bot_scheduler_queued", "Задания, ожидающие в очереди планировщика",
+                      lambda: self.scheduler.queued)
+        metrics.watch("bot_sessions", "Сессии пользователей в памяти", lambda: len(self.sessions))
+        metrics.watch("bot_sessions_bytes", "Объем сессий в памяти", lambda: self.sessions.nbytes)
+        metrics.watch("bot_outbox_queued", "Запросы в очереди исходящих сообщений",
+                      lambda: self.outbox.queued)
+        self.profiler = Profiler(self.dp, config.profile_dir)
+
+        handlers.setup(self)
+
+    @property
+    def bot(self):
+        """
+        Клиент Bot API с пулом соединений из настроек
+
+        Raises:
+            ConfigurationError: не задан токен (BOT_TOKEN)
+        """
+        if self._bot is None:
+            from aiogram import Bot
+            from outbox import make_session
+            self._bot = Bot(token=self.config.require_token(),
+                            session=make_session(pool_size=self.config.outbox_pool_size))
+        return self._bot
+
+    async def close(self):
+        """Остановка: неотправленные ответы уходят до закрытия сессии бота"""
+        self.profiler.stop()
+        await self.outbox.close()
+        if self._bot is not None:
+            await self._bot.session.close()
+        self.executor.shutdown()
+        self.sessions.close()
+
+
+def create_app(config: Optional[Config] = None) -> App:
+    """
+    Сборка приложения
+
+    Args:
+        config: настройки (по умолчанию - из переменных окружения)
+
+    Raises:
+        ConfigurationError: неверные настройки
+    """
+    return App(config if config is not None else load_config())
+
+
+_app: Optional[App] = None
+
+
+def get_app() -> App:
+    """Приложение процесса (собирается при первом вызове)"""
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def __getattr__(name: str):
+    # bot.dp, bot.outbox ... - как у прежнего модуля с объектами на верхнем уровне
+    if name in APP_ATTRS:
+        return getattr(get_app(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Потом импортируем модули
-from logger import log
-# Импортируем конкретные переменные из messages
-from messages import WELCOME, HELP, TASK1_DETAILS, TASK4_DETAILS, TASK5_DETAILS
-from task_1 import execute_1
-from task_4 import execute_4
-from task_5 import execute_5
-
-# ========== КЛАВИАТУРЫ ==========
-def get_kb(buttons):
-    """Создает клавиатуру"""
-    kb = [[KeyboardButton(text=b)] for b in buttons]
-    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
-
-MAIN_KB = get_kb(["Задание 1", "Задание 4", "Задание 5", "Помощь"])
-TASK_KB = get_kb(["Ввести", "Сгенерировать", "Выполнить", "Результат", "Назад"])
-
-# ========== ХРАНИЛИЩЕ ПОЛЬЗОВАТЕЛЕЙ ==========
-users = {}
-
-# ========== ОБРАБОТЧИКИ ==========
-
-@dp.message(F.text == "/start")
-async def start_cmd(msg: Message):
-    """Обработчик /start"""
-    users[msg.from_user.id] = {"state": "main"}
-    await msg.answer(WELCOME, reply_markup=MAIN_KB)
-    log(f"User {msg.from_user.id} started")
-
-@dp.message(F.text == "Помощь")
-async def help_cmd(msg: Message):
-    """Обработчик помощи"""
-    await msg.answer(HELP)
-
-@dp.message(F.text == "Назад")
-async def back_cmd(msg: Message):
-    """Возврат в главное меню"""
-    users[msg.from_user.id] = {"state": "main"}
-    await msg.answer("Главное меню:", reply_markup=MAIN_KB)
-
-@dp.message(F.text.startswith("Задание"))
-async def task_select(msg: Message):
-    """Выбор задания"""
-    uid = msg.from_user.id
-    task_num = msg.text.split()[1]
-    users[uid] = {
-        "state": f"task{task_num}",
-        "task": task_num,
-        "data": {}
-    }
-    
-    # Используем правильную переменную для описания задания
-    if task_num == "1":
-        task_desc = TASK1_DETAILS
-    elif task_num == "4":
-        task_desc = TASK4_DETAILS
-    elif task_num == "5":
-        task_desc = TASK5_DETAILS
-    else:
-        task_desc = f"Задание {task_num}"
-    
-    await msg.answer(f"Задание {task_num}:\n{task_desc}", reply_markup=TASK_KB)
-
-@dp.message(F.text == "Сгенерировать")
-async def generate_data(msg: Message):
-    """Генерация данных"""
-    uid = msg.from_user.id
-    user = users.get(uid, {})
-    task = user.get("task", "1")
-    
-    if task == "1":
-        arr1 = [random.randint(-10, 10) for _ in range(5)]
-        arr2 = [random.randint(-10, 10) for _ in range(5)]
-        users[uid]["data"] = {"arr1": arr1, "arr2": arr2}
-        await msg.answer(f"Сгенерировано:\nМассив1: {arr1}\nМассив2: {arr2}")
-    
-    elif task == "4":
-        num1 = random.randint(100, 999)
-        num2 = random.randint(100, 999)
-        arr1 = [int(d) for d in str(num1)]
-        arr2 = [int(d) for d in str(num2)]
-        users[uid]["data"] = {"arr1": arr1, "arr2": arr2}
-        await msg.answer(f"Сгенерировано:\nЧисло1: {arr1}\nЧисло2: {arr2}")
-    
-    elif task == "5":
-        arr = [random.randint(-5, 10) for _ in range(8)]
-        target = random.randint(0, 20)
-        users[uid]["data"] = {"arr": arr, "target": target}
-        await msg.answer(f"Сгенерировано:\nМассив: {arr}\nСумма: {target}")
-    
-    log(f"User {uid} generated data for task {task}")
-
-@dp.message(F.text == "Выполнить")
-async def execute_task(msg: Message):
-    """Выполнение расчета"""
-    uid = msg.from_user.id
-    user = users.get(uid, {})
-    data = user.get("data", {})
-    task = user.get("task", "1")
-    
-    try:
-        if task == "1" and "arr1" in data and "arr2" in data:
-            result = execute_1(data["arr1"], data["arr2"])
-            users[uid]["result"] = result
-            await msg.answer(f"Результат: {result}")
-        
-        elif task == "4" and "arr1" in data and "arr2" in data:
-            if "operation" not in data:
-                await msg.answer("Введите операцию (+ или -):")
-                users[uid]["state"] = "await_op"
-                return
-            result = execute_4(data["arr1"], data["arr2"], data["operation"])
-            users[uid]["result"] = result
-            await msg.answer(f"Результат: {result}")
-        
-        elif task == "5" and "arr" in data and "target" in data:
-            result = execute_5(data["arr"], data["target"])
-            users[uid]["result"] = result
-            await msg.answer(f"Найдено подмассивов: {result}")
-        
-        else:
-            await msg.answer("Сначала введите или сгенерируйте данные!")
-    
-    except Exception as e:
-        await msg.answer(f"Ошибка: {e}")
-        log(f"Error in task {task}: {e}")
-
-@dp.message(F.text == "Результат")
-async def show_result(msg: Message):
-    """Показ результата"""
-    uid = msg.from_user.id
-    result = users.get(uid, {}).get("result")
-    await msg.answer(f"Результат: {result}" if result else "Сначала выполните расчет!")
-
-@dp.message()
-async def handle_text(msg: Message):
-    """Обработка текстового ввода"""
-    uid = msg.from_user.id
-    user = users.get(uid, {})
-    state = user.get("state", "")
-    text = msg.text.strip()
-    
-    if state == "task1" and user.get("task") == "1":
-        try:
-            arr1, arr2 = map(lambda x: list(map(int, x.split())), text.split(";"))
-            users[uid]["data"] = {"arr1": arr1, "arr2": arr2}
-            await msg.answer(f"Сохранено:\nМассив1: {arr1}\nМассив2: {arr2}")
-        except:
-            await msg.answer("Формат: '1 2 3;4 5 6'")
-    
-    elif state == "task4" and user.get("task") == "4":
-        if ";" in text:
-            try:
-                nums, op = text.split(";")
-                arr1, arr2 = map(lambda x: list(map(int, x.split())), nums.split("|"))
-                users[uid]["data"] = {"arr1": arr1, "arr2": arr2, "operation": op}
-                await msg.answer(f"Сохранено:\nЧисло1: {arr1}\nЧисло2: {arr2}\nОперация: {op}")
-            except:
-                await msg.answer("Формат: '1 2 3|4 5 6;+'")
-        elif text in "+-":
-            users[uid]["data"]["operation"] = text
-            await msg.answer(f"Операция сохранена: {text}")
-    
-    elif state == "task5" and user.get("task") == "5":
-        try:
-            arr_text, target_text = text.split(";")
-            arr = list(map(int, arr_text.split()))
-            target = int(target_text)
-            users[uid]["data"] = {"arr": arr, "target": target}
-            await msg.answer(f"Сохранено:\nМассив: {arr}\nСумма: {target}")
-        except:
-            await msg.answer("Формат: '1 2 3 4;5'")
-    
-    elif state == "await_op" and text in "+-":
-        users[uid]["data"]["operation"] = text
-        users[uid]["state"] = "task4"
-        await msg.answer(f"Операция сохранена: {text}")
-    
-    else:
-        await msg.answer("Используйте кнопки меню")
 
 # ========== ЗАПУСК ==========
-async def main():
-    """Главная функция запуска"""
+def make_webhook_server(**overrides):
+    """Сервер webhook с настройками из конфигурации (overrides - для тестов)"""
+    import metrics
+    from webhook import WebhookServer
+    app = get_app()
+    config = app.config
+    target = overrides.pop("bot") if "bot" in overrides else app.bot
+    options = dict(host=config.webhook_host, port=config.webhook_port, path=config.webhook_path,
+                   secret_token=config.webhook_secret, max_in_flight=config.webhook_max_in_flight,
+                   url=config.webhook_url)
+    options.update(overrides)
+    server = WebhookServer(app.dp, target, **options)
+    metrics.watch("bot_webhook_in_flight", "Обновления webhook в обработке",
+                  lambda: server.handler.in_flight)
+    return server
+
+async def main(mode: Optional[str] = None):
+    """
+    Главная функция запуска
+
+    Args:
+        mode: "polling" или "webhook" (по умолчанию - BOT_RUN_MODE)
+
+    Raises:
+        ConfigurationError: неверные настройки или не задан токен
+    """
+    if _app is None:
+        # Без токена запуск прерывается до загрузки aiogram и обработчиков
+        load_config().require_token()
+    import metrics
+    app = get_app()
+    config = app.config
+    mode = mode or config.run_mode
+    if mode not in ("polling", "webhook"):
+        raise ValueError(f"Неизвестный режим запуска: {mode}")
+    bot = app.bot
     print("Бот запущен. Используйте /start в Telegram")
-    await dp.start_polling(bot)
\ No newline at end of file
+    log("Bot starting", mode=mode, config=repr(config))
+    metrics_server = None
+    if config.metrics_port is not None:
+        metrics_server = metrics.MetricsServer(config.metrics_host, config.metrics_port)
+        metrics_server.route("/profile", app.profiler.handle_http)
+        metrics_server.route("/scheduler", app.scheduler.handle_http)
+        await metrics_server.start()
+    try:
+        if mode == "webhook":
+            await make_webhook_server().serve_forever()
+        else:
+            await app.dp.start_polling(bot)
+    finally:
+        await app.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
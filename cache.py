@@ -0,0 +1,190 @@
+"""
+Кэш результатов заданий
+
+Ограниченный по количеству записей и объему памяти LRU-кэш с
+необязательным временем жизни записей. Ключ строится по хэшу содержимого
+аргументов, поэтому большие массивы не хранятся в ключах повторно.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Ограничения по умолчанию
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Аргументы короче этого порога кладутся в ключ как есть, без хэширования
+SMALL_KEY_LENGTH = 64
+
+
+def _feed(h, value):
+    """Добавление значения в хэш с пометкой типа"""
+    if isinstance(value, (list, tuple, array)):
+        h.update(b"L%d:" % len(value))
+        try:
+            h.update(array('q', value).tobytes())
+            return
+        except (TypeError, OverflowError):
+            pass
+        for item in value:
+            _feed(h, item)
+    elif hasattr(value, "tobytes") and hasattr(value, "dtype"):
+        h.update(b"N" + str(value.dtype).encode() + b":")
+        h.update(value.tobytes())
+    else:
+        h.update(b"S" + repr(value).encode() + b";")
+
+
+def content_key(name: str, *args) -> Tuple:
+    """Ключ кэша: имя функции и содержимое (или хэш содержимого) аргументов"""
+    small = []
+    for arg in args:
+        if isinstance(arg, (list, tuple, array)) and len(arg) <= SMALL_KEY_LENGTH:
+            small.append(tuple(arg))
+        elif isinstance(arg, (int, str)) and not isinstance(arg, bool):
+            small.append(arg)
+        else:
+            break
+    else:
+        return (name, *small)
+
+    h = hashlib.blake2b(digest_size=16)
+    for arg in args:
+        _feed(h, arg)
+    return name, h.digest()
+
+
+def estimate_size(value) -> int:
+    """Приблизительный объем памяти, занимаемый результатом (в байтах)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        # Малые целые кэшируются интерпретатором, остальные занимают ~28 байт
+        size += 28 * len(value)
+    return size
+
+
+class ResultCache:
+    """
+    Потокобезопасный LRU-кэш результатов с ограничением объема и TTL
+
+    Результаты возвращаются без копирования, поэтому изменять их нельзя.
+    """
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: Optional[float] = None):
+        """
+        Args:
+            max_entries: максимальное количество записей
+            max_bytes: максимальный суммарный объем результатов
+            ttl: время жизни записи в секундах (None - без ограничения)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получение результата по ключу с обновлением порядка LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, created = entry
+            if self.ttl is not None and time.monotonic() - created > self.ttl:
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохранение результата с вытеснением самых старых записей"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def call(self, func: Callable, *args, name: Optional[str] = None) -> Any:
+        """
+        Вызов функции с мемоизацией по содержимому аргументов
+
+        Исключения не кэшируются. Вычисление выполняется вне блокировки,
+        поэтому параллельные промахи по одному ключу могут посчитать
+        результат дважды, но не блокируют друг друга.
+        """
+        key = content_key(name or func.__name__, *args)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func(*args)
+            self.put(key, value)
+        return value
+
+    async def call_async(self, runner: Callable, func: Callable, *args,
+                         name: Optional[str] = None) -> Any:
+        """
+        Асинхронный вариант call: при промахе результат считает runner
+
+        runner - корутина вида runner(func, *args), например TaskExecutor.run.
+        """
+        key = content_key(name or func.__name__, *args)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await runner(func, *args)
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Очистка кэша (счетчики сохраняются)"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий, промахов и вытеснений"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        """Удаление записи (вызывается под блокировкой)"""
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+_MISSING = object()
+
+# Общий кэш результатов execute_1 / execute_4 / execute_5
+results = ResultCache()
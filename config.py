@@ -0,0 +1,196 @@
+"""
+НАСТРОЙКИ БОТА ИЗ ПЕРЕМЕННЫХ ОКРУЖЕНИЯ
+
+Каждая настройка задается переменной BOT_<ИМЯ> (BOT_TOKEN, BOT_RUN_MODE,
+BOT_EXECUTOR_WORKERS ...), без переменной берется значение по умолчанию
+из FIELDS. Неверное значение - ConfigurationError с именем переменной.
+
+Модуль легкий (без aiogram): его импортируют bot.py, main.py и
+супервизор до того, как понадобится само приложение.
+
+Пример:
+    BOT_TOKEN=123:abc BOT_RUN_MODE=webhook BOT_ADMIN_IDS=1,2 python main.py
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from exceptions import ConfigurationError
+
+ENV_PREFIX = "BOT_"
+RUN_MODES = ("polling", "webhook")
+EXECUTOR_BACKENDS = ("process", "thread")
+# Формат токена Bot API: "<id бота>:<секрет>"
+TOKEN_RE = re.compile(r"^\d+:[\w-]+$")
+# Секрет webhook: 1-256 символов A-Z, a-z, 0-9, _ и - (ограничение Telegram)
+SECRET_RE = re.compile(r"^[\w-]{1,256}$")
+# Значения, отключающие необязательную настройку (порт метрик, файл записи ...)
+OFF_VALUES = ("", "none", "off")
+
+
+def _optional(parse: Callable[[str], Any]) -> Callable[[str], Any]:
+    """Разбор значения, которое можно отключить ("off", "none" или пустая строка)"""
+    def parse_optional(value: str):
+        return None if value.strip().lower() in OFF_VALUES else parse(value)
+    return parse_optional
+
+
+def _ids(value: str) -> Tuple[int, ...]:
+    """ "1, 2,3" -> (1, 2, 3)"""
+    return tuple(int(part) for part in value.replace(",", " ").split())
+
+
+# Настройка -> (разбор строки из окружения, значение по умолчанию)
+FIELDS: Dict[str, Tuple[Callable[[str], Any], Any]] = {
+    "token": (_optional(str.strip), None),
+    # Режим получения обновлений: "polling" или "webhook"
+    "run_mode": (str.strip, "polling"),
+    # Пул для тяжелых расчетов: "process" или "thread"
+    "executor_backend": (str.strip, "process"),
+    "executor_workers": (int, 2),
+    "executor_queue": (int, 32),
+    "executor_timeout": (_optional(float), 10.0),
+    # Планировщик расчетов: выполняемых и ожидающих заданий одного пользователя
+    "scheduler_user_jobs": (int, 1),
+    "scheduler_user_queue": (int, 3),
+    # Webhook: локальный адрес сервера, секрет и лимит одновременной обработки.
+    # webhook_url - публичный адрес для setWebhook (None - не регистрировать)
+    "webhook_host": (str.strip, "127.0.0.1"),
+    "webhook_port": (int, 8080),
+    "webhook_path": (str.strip, "/webhook"),
+    "webhook_secret": (_optional(str.strip), None),
+    "webhook_url": (_optional(str.strip), None),
+    "webhook_max_in_flight": (int, 100),
+    # Метрики Prometheus на локальном порту (None - не запускать сервер)
+    "metrics_host": (str.strip, "127.0.0.1"),
+    "metrics_port": (_optional(int), 9100),
+    # Запись входящих обновлений для replay.py (None - не записывать)
+    "record_file": (_optional(str.strip), None),
+    # Администраторы (id пользователей Telegram): команда /profile и каталог ее отчетов
+    "admin_ids": (_ids, ()),
+    "profile_dir": (str.strip, "profiles"),
+    # Сессии пользователей: лимиты памяти и файл SQLite (None - без сохранения)
+    "session_max": (int, 10_000),
+    "session_max_bytes": (int, 256 * 1024 * 1024),
+    "session_idle_ttl": (float, 24 * 60 * 60),
+    "session_db": (_optional(str.strip), None),
+    # Исходящие сообщения: лимиты Telegram (всего и на чат в секунду) и пул соединений
+    "outbox_global_rate": (float, 25.0),
+    "outbox_chat_rate": (float, 1.0),
+    "outbox_chat_burst": (int, 1),
+    "outbox_pool_size": (int, 32),
+    # Ввод файлом: максимальный размер документа
+    "max_document_bytes": (int, 20 * 1024 * 1024),
+}
+
+# Настройки, которые должны быть больше нуля
+POSITIVE = ("executor_workers", "executor_queue", "executor_timeout",
+            "scheduler_user_jobs", "scheduler_user_queue", "webhook_port",
+            "webhook_max_in_flight", "metrics_port", "session_max", "session_max_bytes",
+            "session_idle_ttl", "outbox_global_rate", "outbox_chat_rate",
+            "outbox_chat_burst", "outbox_pool_size", "max_document_bytes")
+
+
+def env_name(field: str) -> str:
+    return ENV_PREFIX + field.upper()
+
+
+class Config:
+    """Проверенные настройки бота (поля - ключи FIELDS)"""
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **values):
+        unknown = set(values) - set(FIELDS)
+        if unknown:
+            raise ConfigurationError(f"Unknown settings: {sorted(unknown)}",
+                                     context={"settings": sorted(unknown)})
+        for field, (_, default) in FIELDS.items():
+            setattr(self, field, values.get(field, default))
+        self.validate()
+
+    def validate(self):
+        """
+        Проверка значений
+
+        Raises:
+            ConfigurationError: первое неверное значение
+        """
+        if self.token is not None and not TOKEN_RE.match(self.token):
+            _invalid("token", "***", "ожидается '<id бота>:<секрет>'")
+        if self.run_mode not in RUN_MODES:
+            _invalid("run_mode", self.run_mode, f"допустимо: {', '.join(RUN_MODES)}")
+        if self.executor_backend not in EXECUTOR_BACKENDS:
+            _invalid("executor_backend", self.executor_backend,
+                     f"допустимо: {', '.join(EXECUTOR_BACKENDS)}")
+        for field in POSITIVE:
+            value = getattr(self, field)
+            if value is not None and value <= 0:
+                _invalid(field, value, "должно быть больше нуля")
+        if not self.webhook_path.startswith("/"):
+            _invalid("webhook_path", self.webhook_path, "путь должен начинаться с '/'")
+        if self.webhook_secret is not None and not SECRET_RE.match(self.webhook_secret):
+            _invalid("webhook_secret", "***", "допустимы 1-256 символов A-Z, a-z, 0-9, _ и -")
+
+    def require_token(self) -> str:
+        """
+        Токен для подключения к Bot API
+
+        Raises:
+            ConfigurationError: токен не задан
+        """
+        if self.token is None:
+            raise ConfigurationError(
+                "Bot token is not set",
+                user_message=f"Не задан токен бота: переменная окружения {env_name('token')}",
+                context={"variable": env_name("token")})
+        return self.token
+
+    def replace(self, **changes) -> "Config":
+        """Копия настроек с измененными полями"""
+        values = {field: getattr(self, field) for field in FIELDS}
+        values.update(changes)
+        return Config(**values)
+
+    def __repr__(self) -> str:
+        # Секреты в логи и отчеты не попадают
+        shown = {field: getattr(self, field) for field in FIELDS}
+        for field in ("token", "webhook_secret"):
+            if shown[field] is not None:
+                shown[field] = "***"
+        return f"Config({', '.join(f'{k}={v!r}' for k, v in shown.items())})"
+
+
+def _invalid(field: str, value: Any, reason: str):
+    variable = env_name(field)
+    raise ConfigurationError(
+        f"Invalid setting {variable}={value!r}: {reason}",
+        user_message=f"Неверное значение {variable}: {reason}",
+        context={"variable": variable})
+
+
+def load_config(environ: Optional[Mapping[str, str]] = None, **overrides) -> Config:
+    """
+    Настройки из переменных окружения BOT_*
+
+    Args:
+        environ: окружение (по умолчанию os.environ)
+        overrides: значения, которые важнее окружения (для тестов и утилит)
+
+    Raises:
+        ConfigurationError: значение не разбирается или не проходит проверку
+    """
+    environ = os.environ if environ is None else environ
+    values: Dict[str, Any] = {}
+    for field, (parse, _) in FIELDS.items():
+        raw = environ.get(env_name(field))
+        if raw is None:
+            continue
+        try:
+            values[field] = parse(raw)
+        except ValueError:
+            shown = "***" if field in ("token", "webhook_secret") else raw
+            _invalid(field, shown, "значение не разбирается")
+    values.update(overrides)
+    return Config(**values)
@@ -0,0 +1,152 @@
+"""
+Доставка результатов пользователю
+
+Результат форматируется один раз: текст пишется в буфер кусками (без
+промежуточной строки на весь массив), кодируется в байты и кэшируется.
+Короткий результат уходит обычным сообщением, длинный - документом
+result.txt из тех же байтов в памяти, с началом результата в подписи.
+Повторные "Результат" и "Выполнить" с тем же результатом берут готовое
+представление из кэша.
+"""
+
+import io
+from array import array
+from collections import OrderedDict
+from typing import Any, Optional
+
+from aiogram.methods.base import TelegramMethod
+from aiogram.types import BufferedInputFile, Message
+
+import metrics
+from cache import estimate_size
+from outbox import MAX_TEXT
+
+# Элементов массива на один кусок при форматировании
+RENDER_CHUNK = 4096
+# Подпись документа: лимит Telegram 1024 символа, начало результата короче
+CAPTION_PREVIEW = 200
+DOCUMENT_NAME = "result.txt"
+# Готовые представления: количество и суммарный объем (байты текста и удерживаемые результаты)
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+renders_total = metrics.registry.add(metrics.Counter(
+    "bot_result_renders_total", "Результаты, отформатированные для отправки"))
+documents_total = metrics.registry.add(metrics.Counter(
+    "bot_result_documents_total", "Результаты, отправленные документом"))
+
+
+class Rendering:
+    """Готовое представление результата: байты UTF-8 и длина массива"""
+
+    __slots__ = ("data", "count", "_text")
+
+    def __init__(self, data: bytes, count: Optional[int]):
+        self.data = data
+        self.count = count
+        self._text: Optional[str] = None
+
+    def fits(self, prefix: str) -> bool:
+        """Помещается ли prefix + результат в одно сообщение"""
+        # Символов не больше, чем байтов UTF-8: проверка по байтам без декодирования
+        return len(prefix) + len(self.data) <= MAX_TEXT
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.data.decode("utf-8")
+        return self._text
+
+    def preview(self, limit: int = CAPTION_PREVIEW) -> str:
+        """Начало результата по границе элемента: "[1, 2, 3, ...]" """
+        if len(self.data) <= limit:
+            return self.text
+        head = self.data[:limit]
+        if self.count is None:
+            return head.decode("utf-8", "ignore") + "..."
+        cut = head.rfind(b", ")
+        return head[:cut if cut > 0 else limit].decode("utf-8", "ignore") + ", ...]"
+
+
+def render(result: Any) -> Rendering:
+    """Форматирование результата в байты (массивы - как str(list): элементы через repr)"""
+    renders_total.inc()
+    if not isinstance(result, (list, tuple, array)):
+        return Rendering(str(result).encode("utf-8"), None)
+    buffer = io.BytesIO()
+    buffer.write(b"[")
+    for start in range(0, len(result), RENDER_CHUNK):
+        if start:
+            buffer.write(b", ")
+        chunk = result[start:start + RENDER_CHUNK]
+        buffer.write(", ".join(map(repr, chunk)).encode("utf-8"))
+    buffer.write(b"]")
+    return Rendering(buffer.getvalue(), len(result))
+
+
+class RenderCache:
+    """
+    LRU готовых представлений по объекту результата
+
+    Результаты не изменяются на месте (кэш заданий отдает один объект
+    всем пользователям с теми же данными), поэтому ключ - id объекта
+    без хэширования содержимого. Ссылка на результат хранится вместе с
+    представлением, чтобы id не достался другому объекту, поэтому в
+    лимит max_bytes входит и объем самого результата.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, result: Any) -> Rendering:
+        """Представление результата (форматируется при первом обращении)"""
+        key = id(result)
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is result:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        rendering = render(result)
+        size = len(rendering.data) + estimate_size(result)
+        if size <= self.max_bytes:
+            if entry is not None:
+                self._remove(key)
+            self._data[key] = (result, rendering, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+        return rendering
+
+    def _remove(self, key: int):
+        self._bytes -= self._data.pop(key)[2]
+
+
+renders = RenderCache()
+
+
+def answer(msg: Message, result: Any, title: str = "Результат",
+           reply_markup=None) -> TelegramMethod:
+    """
+    Запрос с результатом для send(...): сообщение или документ
+
+    Документ отправляется из байтов кэша (BufferedInputFile читает их
+    кусками без копии целиком).
+    """
+    rendering = renders.get(result)
+    prefix = f"{title}: "
+    if rendering.fits(prefix):
+        return msg.answer(prefix + rendering.text, reply_markup=reply_markup)
+    documents_total.inc()
+    size = f" ({rendering.count} эл.)" if rendering.count is not None else ""
+    return msg.answer_document(BufferedInputFile(rendering.data, DOCUMENT_NAME),
+                               caption=f"{title}{size}: {rendering.preview()}",
+                               reply_markup=reply_markup)
@@ -4,8 +4,9 @@
 ОПТИМИЗАЦИИ:
 1. Иерархия исключений для точной обработки
 2. Контекстная информация в исключениях
-3. Автоматическое логирование
-4. Пользовательские сообщения об ошибках
+3. Логирование только при сообщении об ошибке, не при создании
+4. Сводка повторяющихся ошибок вместо записи на каждую
+5. Числовые коды ошибок для проверок без исключений
 
 ВАЖНОСТЬ:
 1. Чистая обработка ошибок
@@ -14,79 +15,151 @@
 4. Предотвращение падений бота
 """
 
-from typing import Optional, Any, Dict
+import atexit
+import logging
+import time
+from enum import IntEnum
+from typing import Optional, Any, Dict, Tuple
 from logger import logger
 
+# Повторы одной ошибки за AGGREGATE_INTERVAL секунд записываются одной строкой со счетчиком
+AGGREGATE_INTERVAL = 60.0
+AGGREGATE_MAX_KEYS = 10_000
+
+
+class ErrorCode(IntEnum):
+    """
+    Числовые коды ошибок
+
+    Сотни задают класс исключения (0xx - BotError, 1xx - InputError,
+    2xx - ValidationError и т.д.). Горячие проверки возвращают код вместо
+    исключения, а исключение строится через from_code, только если ошибку
+    нужно показать.
+    """
+    OK = 0
+    UNKNOWN = 1
+    INPUT = 100
+    INPUT_TOO_LARGE = 101
+    INPUT_FORMAT = 102
+    INPUT_EMPTY = 103
+    VALIDATION = 200
+    LENGTH_MISMATCH = 201
+    CALCULATION = 300
+    CONFIGURATION = 400
+    RESOURCE = 500
+    QUEUE_FULL = 501
+    TIMEOUT = 502
+
+
+# Сообщения пользователю по умолчанию (без сообщения для кода показывается message)
+USER_MESSAGES: Dict[int, str] = {
+    ErrorCode.UNKNOWN: "Внутренняя ошибка бота",
+    ErrorCode.INPUT_TOO_LARGE: "Слишком большой ввод",
+    ErrorCode.INPUT_FORMAT: "Неверный формат ввода",
+    ErrorCode.INPUT_EMPTY: "Массив не может быть пустым",
+    ErrorCode.LENGTH_MISMATCH: "Массивы должны быть одинаковой длины",
+    ErrorCode.CONFIGURATION: "Ошибка конфигурации бота",
+    ErrorCode.RESOURCE: "Ошибка ресурсов",
+    ErrorCode.QUEUE_FULL: "Бот перегружен, попробуйте позже",
+    ErrorCode.TIMEOUT: "Превышено время выполнения, уменьшите размер данных",
+}
+
+
 class BotError(Exception):
     """
     Базовый класс всех исключений бота
-    
+
     ДОПОЛНИТЕЛЬНЫЕ ВОЗМОЖНОСТИ:
-    1. Автоматическое логирование
+    1. Логирование при сообщении об ошибке (report)
     2. Контекстная информация
     3. Пользовательские сообщения
+    4. Числовой код ошибки
+
+    Создание исключения ничего не форматирует и не пишет в лог: на
+    обычном пути неверного ввода это лишняя работа. Запись делает
+    report (вызывается из handle_bot_error) один раз для исключения.
     """
-    
-    def __init__(self, 
-                 message: str, 
+
+    code = ErrorCode.UNKNOWN
+    log_level = "ERROR"
+
+    def __init__(self,
+                 message: str,
                  user_message: Optional[str] = None,
                  context: Optional[Dict[str, Any]] = None,
-                 log_level: str = "ERROR"):
+                 log_level: Optional[str] = None,
+                 code: Optional[int] = None):
         """
         Инициализация исключения
-        
+
         Args:
             message: внутреннее сообщение об ошибке (для логов)
             user_message: сообщение для показа пользователю
             context: дополнительный контекст ошибки
             log_level: уровень логирования (ERROR, WARNING, INFO)
+            code: код ошибки (по умолчанию - код класса)
         """
+        super().__init__(message)
         self.message = message
-        self.user_message = user_message or message
+        self._user_message = user_message
         self.context = context or {}
-        self.log_level = log_level
-        
-        # Автоматическое логирование при создании исключения
-        self._log_error()
-        
-        super().__init__(self.message)
-    
-    def _log_error(self):
-        """Автоматическое логирование исключения"""
-        log_message = f"{self.__class__.__name__}: {self.message}"
-        
-        if self.context:
-            context_str = ", ".join(f"{k}={v}" for k, v in self.context.items())
-            log_message += f" [Context: {context_str}]"
-        
-        # Используем глобальный логгер
-        if self.log_level == "WARNING":
-            logger.warning(log_message)
-        elif self.log_level == "INFO":
-            logger.info(log_message)
-        else:
-            logger.error(log_message)
-    
+        if log_level is not None:
+            self.log_level = log_level
+        if code is not None:
+            self.code = code
+        self.reported = False
+
+    @property
+    def user_message(self) -> str:
+        if self._user_message:
+            return self._user_message
+        return USER_MESSAGES.get(self.code, self.message)
+
+    @classmethod
+    def from_code(cls, code: int, message: Optional[str] = None,
+                  **context) -> "BotError":
+        """Исключение по коду: класс выбирается по сотням кода"""
+        error_class = _CODE_CLASSES.get(int(code) // 100, cls)
+        return error_class(message or ErrorCode(code).name, context=context, code=code)
+
+    def report(self):
+        """Запись в лог (один раз; повторы сводятся в счетчик)"""
+        if not self.reported:
+            self.reported = True
+            aggregator.add(self)
+
+    def __reduce__(self):
+        # Поля сохраняются при передаче исключения из рабочего процесса
+        return _restore, (self.__class__, self.__dict__)
+
     def to_dict(self) -> Dict[str, Any]:
         """Сериализация исключения в словарь (для API)"""
         return {
             "type": self.__class__.__name__,
+            "code": int(self.code),
             "message": self.message,
             "user_message": self.user_message,
             "context": self.context
         }
 
+
+def _restore(cls, state):
+    error = cls.__new__(cls)
+    Exception.__init__(error, state.get("message"))
+    error.__dict__.update(state)
+    return error
+
 # ========== СПЕЦИАЛИЗИРОВАННЫЕ ИСКЛЮЧЕНИЯ ==========
 
 class ValidationError(BotError):
     """
     Ошибка валидации входных данных
-    
+
     Вызывается когда:
     1. Неправильный формат ввода
     2. Некорректные типы данных
     3. Нарушение ограничений (длина, диапазон)
-    
+
     Пример использования:
         raise ValidationError(
             message="Массивы разной длины",
@@ -94,19 +167,18 @@ class ValidationError(BotError):
             context={"arr1_len": len(arr1), "arr2_len": len(arr2)}
         )
     """
-    def __init__(self, message: str, user_message: Optional[str] = None, 
-                 context: Optional[Dict[str, Any]] = None):
-        super().__init__(message, user_message, context, log_level="WARNING")
+    code = ErrorCode.VALIDATION
+    log_level = "WARNING"
 
 class CalculationError(BotError):
     """
     Ошибка выполнения вычислений
-    
+
     Вызывается когда:
     1. Математические ошибки (деление на 0)
     2. Переполнение вычислений
     3. Ошибки в алгоритмах
-    
+
     Пример использования:
         raise CalculationError(
             message="Division by zero in calculation",
@@ -114,19 +186,18 @@ class CalculationError(BotError):
             context={"operation": "division", "divisor": 0}
         )
     """
-    def __init__(self, message: str, user_message: Optional[str] = None,
-                 context: Optional[Dict[str, Any]] = None):
-        super().__init__(message, user_message, context, log_level="ERROR")
+    code = ErrorCode.CALCULATION
+    log_level = "ERROR"
 
 class InputError(BotError):
     """
     Ошибка ввода пользователя
-    
+
     Вызывается когда:
     1. Пользователь ввел некорректные данные
     2. Не хватает обязательных параметров
     3. Неподдерживаемый формат
-    
+
     Пример использования:
         raise InputError(
             message="Invalid input format for task 1",
@@ -134,73 +205,131 @@ class InputError(BotError):
             context={"input": user_input, "expected_format": "array;array"}
         )
     """
-    def __init__(self, message: str, user_message: Optional[str] = None,
-                 context: Optional[Dict[str, Any]] = None):
-        super().__init__(message, user_message, context, log_level="INFO")
+    code = ErrorCode.INPUT
+    log_level = "INFO"
 
 class ConfigurationError(BotError):
     """
     Ошибка конфигурации бота
-    
+
     Вызывается когда:
     1. Неверный токен бота
     2. Отсутствуют обязательные настройки
     3. Ошибки в конфигурационных файлах
     """
-    def __init__(self, message: str, user_message: Optional[str] = None,
-                 context: Optional[Dict[str, Any]] = None):
-        super().__init__(message, user_message or "Ошибка конфигурации бота", 
-                        context, log_level="CRITICAL")
+    code = ErrorCode.CONFIGURATION
+    log_level = "CRITICAL"
 
 class ResourceError(BotError):
     """
     Ошибка ресурсов
-    
+
     Вызывается когда:
     1. Закончилась память
     2. Превышены лимиты времени
     3. Проблемы с файловой системой
     """
-    def __init__(self, message: str, user_message: Optional[str] = None,
-                 context: Optional[Dict[str, Any]] = None):
-        super().__init__(message, user_message or "Ошибка ресурсов", 
-                        context, log_level="ERROR")
+    code = ErrorCode.RESOURCE
+    log_level = "ERROR"
+
+
+_CODE_CLASSES = {1: InputError, 2: ValidationError, 3: CalculationError,
+                 4: ConfigurationError, 5: ResourceError}
+
+# ========== СВОДКА ПОВТОРЯЮЩИХСЯ ОШИБОК ==========
+
+class ErrorAggregator:
+    """
+    Сводка одинаковых ошибок (тип, код и сообщение) по интервалам
+
+    Первая ошибка в интервале записывается сразу, следующие такие же
+    только считаются. Счетчики записываются строкой "Repeated error" при
+    первой ошибке после конца интервала и при выходе из программы.
+
+    Сами исключения не хранятся: их traceback держит кадры с данными
+    сессий и результатами. Для счетчика достаточно ключа и уровня.
+    """
+
+    def __init__(self, interval: float = AGGREGATE_INTERVAL):
+        self.interval = interval
+        # (тип, код, сообщение) -> [повторы, уровень]
+        self._counts: Dict[Tuple[str, int, str], list] = {}
+        self._started = time.monotonic()
+
+    def add(self, error: BotError):
+        now = time.monotonic()
+        if now - self._started >= self.interval or len(self._counts) >= AGGREGATE_MAX_KEYS:
+            self.flush(now)
+        key = (error.__class__.__name__, int(error.code), error.message)
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += 1
+            return
+        self._counts[key] = [0, error.log_level]
+        self._write(key, error.log_level, error.message, error.context)
+
+    def flush(self, now: Optional[float] = None):
+        """Запись накопленных счетчиков повторов"""
+        for key, (count, log_level) in self._counts.items():
+            if count:
+                self._write(key, log_level, "Repeated error",
+                            {"error_message": key[2], "repeated": count,
+                             "interval_s": self.interval})
+        self._counts.clear()
+        self._started = now if now is not None else time.monotonic()
+
+    @staticmethod
+    def _write(key: Tuple[str, int, str], log_level: str, message: str,
+               context: Dict[str, Any]):
+        level = logging.getLevelName(log_level)
+        if not isinstance(level, int):
+            level = logging.ERROR
+        if logger.isEnabledFor(level):
+            fields = {"error": key[0], "code": key[1]}
+            fields.update(context)
+            logger.log(level, message, extra={"fields": fields})
+
+
+aggregator = ErrorAggregator()
+atexit.register(aggregator.flush)
 
 # ========== УТИЛИТЫ ДЛЯ РАБОТЫ С ИСКЛЮЧЕНИЯМИ ==========
 
-def handle_bot_error(error: BotError) -> str:
+def handle_bot_error(error: Exception) -> str:
     """
-    Обработка исключения бота и возврат сообщения для пользователя
-    
+    Обработка исключения и возврат сообщения для пользователя
+
+    Ошибка записывается в лог здесь, а не при создании. Исключения не
+    из иерархии BotError считаются внутренними ошибками вычислений.
+
     Args:
-        error: исключение BotError или его наследник
-    
+        error: исключение BotError, его наследник или любое другое
+
     Returns:
         str: сообщение для показа пользователю
     """
+    if not isinstance(error, BotError):
+        error = CalculationError(f"Unexpected error: {error}", "Внутренняя ошибка бота",
+                                 {"error_type": error.__class__.__name__})
+    error.report()
     return error.user_message
 
 def safe_execute(func, *args, **kwargs):
     """
     Безопасное выполнение функции с перехватом исключений
-    
+
+    Исключение возвращается как есть, без оборачивания: сообщение для
+    пользователя и запись в лог дает handle_bot_error, если ошибку
+    действительно нужно показать.
+
     Args:
         func: функция для выполнения
         *args, **kwargs: аргументы функции
-    
+
     Returns:
-        tuple: (результат, ошибка_или_None)
+        tuple: (результат, исключение_или_None)
     """
     try:
-        result = func(*args, **kwargs)
-        return result, None
-    except BotError as e:
-        return None, e
+        return func(*args, **kwargs), None
     except Exception as e:
-        # Преобразование стандартных исключений в BotError
-        bot_error = CalculationError(
-            message=f"Unexpected error: {str(e)}",
-            user_message="Внутренняя ошибка бота",
-            context={"original_error": str(e), "function": func.__name__}
-        )
-        return None, bot_error
\ No newline at end of file
+        return None, e
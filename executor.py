@@ -0,0 +1,282 @@
+"""
+Выполнение тяжелых заданий вне цикла событий asyncio
+
+Маленькие входные данные считаются прямо в обработчике, большие
+отправляются в пул потоков или процессов. Для каждого задания действует
+ограничение по времени, а очередь ожидающих заданий ограничена, чтобы
+при перегрузке бот сразу отказывал, а не копил работу.
+"""
+
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from exceptions import ErrorCode, ResourceError
+
+# Настройки по умолчанию
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_QUEUE = 32
+INLINE_THRESHOLD = 5_000
+
+BACKENDS = ("thread", "process")
+PRELOAD_MODULES = ("task_1", "task_4", "task_5")
+
+
+def input_size(args) -> int:
+    """Размер входных данных: суммарная длина всех аргументов-массивов"""
+    return sum(len(a) for a in args if hasattr(a, "__len__") and not isinstance(a, str))
+
+
+def _worker_loop(conn, preload):
+    """Цикл рабочего процесса: получает (func, args) и отправляет результат"""
+    # Модули заданий импортируются заранее, чтобы не тратить на это лимит времени
+    for name in preload:
+        importlib.import_module(name)
+    conn.send(True)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        func, args = job
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class _ProcessWorker:
+    """Рабочий процесс с собственным каналом связи"""
+
+    def __init__(self, context, preload):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child, preload), daemon=True)
+        self.process.start()
+        child.close()
+
+    async def ready(self):
+        """Ожидание готовности процесса после запуска"""
+        await self._receive()
+
+    async def run(self, func: Callable, args) -> Tuple[bool, Any]:
+        """Отправка задания и ожидание пары (успех, результат или исключение)"""
+        self.conn.send((func, args))
+        return await self._receive()
+
+    async def _receive(self) -> Any:
+        """Чтение ответа из канала без блокировки цикла событий"""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_ready():
+            loop.remove_reader(fd)
+            if done.done():
+                return
+            try:
+                done.set_result(self.conn.recv())
+            except Exception as e:
+                done.set_exception(e)
+
+        loop.add_reader(fd, on_ready)
+        try:
+            return await done
+        finally:
+            loop.remove_reader(fd)
+
+    def kill(self):
+        """Принудительная остановка процесса (задание превысило лимит)"""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        """Штатная остановка процесса"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class TaskExecutor:
+    """
+    Исполнитель заданий с пулом потоков или процессов
+
+    Превышение времени и переполнение очереди сообщаются через ResourceError.
+    В режиме процессов задание, превысившее лимит, прерывается вместе с
+    рабочим процессом, который тут же заменяется новым. Поток прервать
+    нельзя, поэтому в режиме потоков задание досчитывается в фоне, но
+    его место в пуле учитывается до завершения.
+    """
+
+    def __init__(self,
+                 backend: str = "process",
+                 max_workers: Optional[int] = None,
+                 max_queue: int = DEFAULT_MAX_QUEUE,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 inline_threshold: int = INLINE_THRESHOLD,
+                 start_method: str = "spawn",
+                 preload: Tuple[str, ...] = PRELOAD_MODULES):
+        """
+        Args:
+            backend: "thread" или "process"
+            max_workers: количество рабочих (по умолчанию - число ядер)
+            max_queue: сколько заданий может ждать свободного рабочего
+            timeout: лимит времени на одно задание в секундах (None - без лимита)
+            inline_threshold: задания меньшего размера выполняются сразу
+            start_method: способ запуска процессов multiprocessing
+            preload: модули, импортируемые рабочими процессами при запуске
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный тип пула: {backend}")
+        self.backend = backend
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.inline_threshold = inline_threshold
+        self._context = multiprocessing.get_context(start_method)
+        self._preload = preload
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_ProcessWorker] = []
+        # Запуски замены рабочих: ссылки держатся до завершения (иначе задачу может собрать GC)
+        self._tasks: Set[asyncio.Task] = set()
+        self.pending = 0
+        self.running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество заданий, ожидающих свободного рабочего"""
+        return self.pending - self.running
+
+    async def start(self):
+        """Запуск пула (вызывается лениво при первом тяжелом задании)"""
+        if self.backend == "thread":
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix="task")
+        elif self._idle is None:
+            self._idle = asyncio.Queue()
+            workers = [self._spawn() for _ in range(self.max_workers)]
+            await asyncio.gather(*(w.ready() for w in workers))
+            for worker in workers:
+                self._idle.put_nowait(worker)
+
+    def _spawn(self) -> _ProcessWorker:
+        worker = _ProcessWorker(self._context, self._preload)
+        self._workers.append(worker)
+        return worker
+
+    async def run(self, func: Callable, *args, size: Optional[int] = None) -> Any:
+        """
+        Выполнение func(*args) с учетом размера входных данных
+
+        Raises:
+            ResourceError: очередь переполнена или превышен лимит времени
+        """
+        if size is None:
+            size = input_size(args)
+        if size < self.inline_threshold:
+            return func(*args)
+
+        if self.pending >= self.max_workers + self.max_queue:
+            raise ResourceError(
+                message="Task queue is full",
+                user_message="Бот перегружен, попробуйте позже",
+                context={"pending": self.pending, "function": func.__name__},
+                code=ErrorCode.QUEUE_FULL
+            )
+
+        await self.start()
+        if self.backend == "thread":
+            return await self._run_thread(func, args)
+
+        self.pending += 1
+        try:
+            return await self._run_process(func, args)
+        finally:
+            self.pending -= 1
+
+    async def _run_thread(self, func: Callable, args) -> Any:
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self._threads.submit(self._track, func, args)
+        # Место освобождается только когда поток действительно закончил работу
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise self._timeout_error(func)
+
+    def _release(self):
+        self.pending -= 1
+
+    def _track(self, func: Callable, args) -> Any:
+        self.running += 1
+        try:
+            return func(*args)
+        finally:
+            self.running -= 1
+
+    async def _run_process(self, func: Callable, args) -> Any:
+        worker = await self._idle.get()
+        self.running += 1
+        try:
+            ok, value = await asyncio.wait_for(worker.run(func, args), self.timeout)
+        except asyncio.TimeoutError:
+            self._replace(worker)
+            raise self._timeout_error(func)
+        except BaseException:
+            # Отмена или сбой канала: состояние процесса неизвестно
+            self._replace(worker)
+            raise
+        finally:
+            self.running -= 1
+
+        self._idle.put_nowait(worker)
+        if not ok:
+            raise value
+        return value
+
+    def _replace(self, worker: _ProcessWorker):
+        """Замена прерванного рабочего процесса новым"""
+        worker.kill()
+        self._workers.remove(worker)
+        task = asyncio.get_running_loop().create_task(self._enlist(self._spawn()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _enlist(self, worker: _ProcessWorker):
+        """Возврат нового процесса в пул после его готовности"""
+        await worker.ready()
+        if self._idle is not None:
+            self._idle.put_nowait(worker)
+
+    def _timeout_error(self, func: Callable) -> ResourceError:
+        return ResourceError(
+            message=f"Task {func.__name__} exceeded {self.timeout} s",
+            user_message="Превышено время выполнения, уменьшите размер данных",
+            context={"function": func.__name__, "timeout": self.timeout},
+            code=ErrorCode.TIMEOUT
+        )
+
+    def shutdown(self):
+        """Остановка пула"""
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        for task in self._tasks:
+            task.cancel()
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+        self._idle = None
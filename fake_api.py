@@ -0,0 +1,213 @@
+"""
+Локальная имитация Telegram Bot API
+
+Минимальный HTTP-сервер на aiohttp с методами getMe, getUpdates, getFile,
+sendMessage и sendDocument. Нужен для нагрузочных тестов и замеров без
+доступа к сети: обновления подкладываются через push_message, ответы
+бота забираются через wait_reply.
+
+С параметрами chat_limit и global_limit сервер, как Telegram, отвечает
+429 с retry_after, если сообщений в чат или всего за секунду больше
+лимита.
+"""
+
+import asyncio
+import itertools
+import math
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+FAKE_TOKEN = "123456:FAKE-TOKEN-FOR-LOCAL-API"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "LocalBot", "username": "local_bot"}
+
+
+class FakeTelegramAPI:
+    """Имитация Bot API для одного бота"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 chat_limit: Optional[int] = None, global_limit: Optional[int] = None):
+        """
+        Args:
+            chat_limit: сообщений в один чат за секунду (None - без лимита)
+            global_limit: сообщений всего за секунду (None - без лимита)
+        """
+        self.host = host
+        self.port = port
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self._sent: Dict[Any, deque] = defaultdict(deque)
+        self.rejected = 0
+        self._updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._replies: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._files: Dict[str, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def make_bot(self, token: str = FAKE_TOKEN, **session_kwargs) -> Bot:
+        """Бот, который обращается к этому серверу вместо api.telegram.org"""
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.base_url), **session_kwargs)
+        return Bot(token=token, session=session)
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.router.add_get("/file/bot{token}/{path}", self._download)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 система выбирает свободный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ========== СТОРОНА ПОЛЬЗОВАТЕЛЯ ==========
+
+    def push_message(self, user_id: int, text: str) -> int:
+        """Отправка текстового сообщения от пользователя, возвращает update_id"""
+        return self._push(user_id, text=text)
+
+    def push_document(self, user_id: int, content: bytes, file_name: str = "input.txt") -> int:
+        """Отправка файла от пользователя, возвращает update_id"""
+        file_id = f"upload{len(self._files) + 1}"
+        self._files[file_id] = content
+        return self._push(user_id, document={
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_name": file_name,
+            "file_size": len(content),
+        })
+
+    def _push(self, user_id: int, **content) -> int:
+        update_id = next(self._update_ids)
+        self._updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                **content,
+            },
+        })
+        self._new_updates.set()
+        return update_id
+
+    async def wait_reply(self, chat_id: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Ожидание следующего ответа бота в чат"""
+        return await asyncio.wait_for(self._replies[chat_id].get(), timeout)
+
+    # ========== СТОРОНА БОТА ==========
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        if method.startswith("send"):
+            retry_after = self._check_limits(params.get("chat_id"))
+            if retry_after:
+                self.rejected += 1
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    def _check_limits(self, chat_id) -> int:
+        """0, если отправка разрешена, иначе retry_after в секундах"""
+        now = time.monotonic()
+        windows = []
+        if self.chat_limit is not None:
+            windows.append((self._sent[chat_id], self.chat_limit))
+        if self.global_limit is not None:
+            windows.append((self._sent[None], self.global_limit))
+        for sent, limit in windows:
+            while sent and now - sent[0] >= 1.0:
+                sent.popleft()
+            if len(sent) >= limit:
+                return max(1, math.ceil(1.0 - (now - sent[0])))
+        for sent, _ in windows:
+            sent.append(now)
+        return 0
+
+    async def _download(self, request: web.Request) -> web.Response:
+        content = self._files.get(request.match_info["path"])
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content)
+
+    async def _api_getme(self, params) -> Dict[str, Any]:
+        return BOT_USER
+
+    async def _api_getfile(self, params) -> Dict[str, Any]:
+        file_id = params["file_id"]
+        return {"file_id": file_id, "file_unique_id": file_id,
+                "file_size": len(self._files.get(file_id, b"")), "file_path": file_id}
+
+    async def _api_getupdates(self, params) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset", 0) or 0)
+        limit = int(params.get("limit", 100) or 100)
+        timeout = float(params.get("timeout", 0) or 0)
+
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _message(self, params, **extra) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+        self._replies[chat_id].put_nowait({"received": time.perf_counter(), **message})
+        return message
+
+    async def _api_sendmessage(self, params) -> Dict[str, Any]:
+        return self._message(params, text=params.get("text", ""))
+
+    async def _api_senddocument(self, params) -> Dict[str, Any]:
+        document = params.get("document")
+        if isinstance(document, str) and document.startswith("attach://"):
+            # aiogram загружает файл отдельным полем и ссылается на него
+            document = params.get(document[len("attach://"):])
+        content = document.file.read() if hasattr(document, "file") else b""
+        # Отправленный файл можно скачать через getFile, как загруженный пользователем
+        file_id = f"file{next(self._message_ids)}"
+        self._files[file_id] = content
+        return self._message(params, caption=params.get("caption"), document={
+            "file_id": file_id,
+            "file_unique_id": "local",
+            "file_name": getattr(document, "filename", None),
+            "file_size": len(content),
+        })
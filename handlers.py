@@ -0,0 +1,517 @@
+"""
+Обработчики сообщений бота
+
+Модуль загружает aiogram и модули заданий, поэтому импортируется только
+при сборке приложения (bot.create_app). Общие ресурсы - сессии, очередь
+исходящих, пул исполнителя, профайлер и настройки - обработчики берут из
+приложения, к которому подключены через setup.
+"""
+
+import asyncio
+import io
+import random
+import zlib
+from functools import partial
+from aiogram import F
+from aiogram.types import (CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup,
+                           KeyboardButton, Message, ReplyKeyboardMarkup)
+
+from logger import log, error
+# Импортируем конкретные переменные из messages
+from messages import WELCOME, HELP, TASK1_DETAILS, TASK4_DETAILS, TASK5_DETAILS
+from task_1 import execute_1, SortedList, SortedPairing
+from task_4 import execute_4
+from task_5 import execute_5, build_index, NO_INDEX, SubarrayPager, PrefixCounter
+from cache import results as result_cache
+import delivery
+from executor import input_size
+import metrics
+from profiler import USAGE as PROFILE_USAGE, parse_request as parse_profile_request
+from exceptions import BotError, InputError, handle_bot_error
+from input_parser import (parse_task1, parse_task4, parse_task5, parse_edit,
+                          FORMAT_TASK1, FORMAT_TASK4, FORMAT_TASK5)
+from router import BotStates, StateRouter, TaskSpec, INPUT_DATA, INPUT_EDIT, INPUT_OPERATION
+
+# Сколько элементов массива показывать в подтверждении ввода
+PREVIEW_ITEMS = 50
+# Подмассивов задания 5 на одной странице и элементов в записи одного подмассива
+SUBARRAY_PAGE = 20
+SUBARRAY_PREVIEW = 10
+
+# Приложение, к которому подключены обработчики (задает setup)
+app = None
+
+def send(request):
+    """Ответ через очередь исходящих: send(msg.answer(...)) без await"""
+    return app.outbox.submit(request)
+
+# ========== КЛАВИАТУРЫ ==========
+def get_kb(buttons):
+    """Создает клавиатуру"""
+    kb = [[KeyboardButton(text=b)] for b in buttons]
+    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
+
+# Главное меню (MAIN_KB) строится из зарегистрированных заданий в конце модуля
+TASK_KB = get_kb(["Ввести", "Сгенерировать", "Выполнить", "Результат", "Назад"])
+
+# ========== ВЫПОЛНЕНИЕ ЗАДАНИЙ ==========
+def task_runner(session, progress=None):
+    """
+    Раннер для result_cache.call_async: расчет через планировщик с учетом
+    метрик (вызывается при промахе кэша)
+
+    progress(text) получает сообщения о ходе долгого расчета.
+    """
+    run = partial(app.scheduler.run, user_id=session.user_id, progress=progress)
+
+    async def run_task(func, *args):
+        return await metrics.measure_task(func.__name__, run, func, *args,
+                                          size=input_size(args))
+    return run_task
+
+async def in_thread(size, func, *args):
+    """
+    func(*args) в потоке, если объем работы не меньше порога исполнителя
+
+    Для расчетов над данными сессии в процессе бота (индекс, пересчет),
+    которые не должны блокировать цикл событий.
+    """
+    if size < app.executor.inline_threshold:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+# ========== ОБРАБОТЧИКИ ==========
+# Кнопки, команды и ввод по состояниям разбираются таблицами router (см. router.py)
+router = StateRouter()
+
+@router.command("/start")
+async def start_cmd(msg: Message, session, text):
+    """Обработчик /start"""
+    session.reset(BotStates.main.state)
+    send(msg.answer(WELCOME, reply_markup=MAIN_KB))
+    log("User started", user_id=msg.from_user.id)
+
+@router.button("Помощь")
+async def help_cmd(msg: Message, session, text):
+    """Обработчик помощи"""
+    send(msg.answer(HELP))
+
+@router.command("/profile")
+async def profile_cmd(msg: Message, session, text):
+    """Профилирование следующих N обновлений или N секунд (только для администраторов)"""
+    if msg.from_user.id not in app.config.admin_ids:
+        send(msg.answer("Используйте кнопки меню"))
+        return
+    arg = text[len("/profile"):].strip()
+    if not arg:
+        status = app.profiler.status()
+        send(msg.answer(f"Идет замер: {status['updates']} обновлений" if status["active"]
+                        else PROFILE_USAGE))
+        return
+    if arg == "stop":
+        result = app.profiler.stop()
+        send(msg.answer(profile_report(result) if result else "Замер не идет"))
+        return
+    try:
+        updates, seconds = parse_profile_request(arg)
+        app.profiler.start(updates, seconds, on_done=lambda r: send(msg.answer(profile_report(r))))
+    except (ValueError, RuntimeError) as e:
+        send(msg.answer(f"{e}\n{PROFILE_USAGE}"))
+        return
+    send(msg.answer(f"Профилирование запущено: {arg}"))
+
+def profile_report(result):
+    files = "\n".join(result["files"])
+    return f"Замер завершен: {result['updates']} обновлений за {result['seconds']} с\n{files}"
+
+@router.button("Назад")
+async def back_cmd(msg: Message, session, text):
+    """Возврат в главное меню"""
+    session.reset(BotStates.main.state)
+    send(msg.answer("Главное меню:", reply_markup=MAIN_KB))
+
+async def task_select(msg: Message, session, text):
+    """Выбор задания (кнопки "Задание N" добавляет register_task)"""
+    spec = router.tasks[text.split()[1]]
+    session.reset(BotStates.task.state, task=spec.key)
+    send(msg.answer(f"Задание {spec.key}:\n{spec.description}", reply_markup=TASK_KB))
+
+@router.button("Ввести")
+async def enter_data(msg: Message, session, text):
+    """Подсказка формата ввода для выбранного задания"""
+    if session.state != BotStates.task:
+        send(msg.answer("Сначала выберите задание"))
+        return
+    send(msg.answer(f"Введите данные. {router.task(session.task).input_format}"))
+
+@router.button("Сгенерировать")
+async def generate_data(msg: Message, session, text):
+    """Генерация данных"""
+    spec = router.task(session.task)
+    send(msg.answer("Сгенерировано:\n" + spec.load(session, *spec.generate())))
+    log("Data generated", user_id=session.user_id, task=spec.key)
+
+@router.button("Выполнить")
+async def execute_task(msg: Message, session, text):
+    """Выполнение расчета"""
+    spec = router.task(session.task)
+    try:
+        if not session.has_data():
+            send(msg.answer("Сначала введите или сгенерируйте данные!"))
+            return
+        reply, markup = await spec.run(session, lambda text: send(msg.answer(text)))
+        if reply is None:
+            # Результат в сессии: сообщение или документ, форматируется один раз
+            send(delivery.answer(msg, session.result, reply_markup=markup))
+        else:
+            send(msg.answer(reply, reply_markup=markup))
+    except BotError as e:
+        send(msg.answer(handle_bot_error(e)))
+    except Exception as e:
+        send(msg.answer(f"Ошибка: {e}"))
+        error("Task failed", user_id=session.user_id, task=spec.key, error=str(e))
+
+@router.button("Результат")
+async def show_result(msg: Message, session, text):
+    """Показ результата"""
+    if session.result is None:
+        send(msg.answer("Сначала выполните расчет!"))
+        return
+    # Повторные нажатия берут готовое представление из кэша delivery
+    send(delivery.answer(msg, session.result))
+
+@router.on(BotStates.task, INPUT_DATA)
+async def handle_text(msg: Message, session, text):
+    """Ввод данных выбранного задания"""
+    try:
+        send(msg.answer(save_input(session, text)))
+    except InputError as e:
+        send(msg.answer(handle_bot_error(e)))
+
+@router.on(BotStates.task, INPUT_EDIT)
+async def edit_data(msg: Message, session, text):
+    """Добавление и изменение элементов ("+ ...", "set ...")"""
+    try:
+        send(msg.answer(await apply_edit(session, text)))
+    except InputError as e:
+        send(msg.answer(handle_bot_error(e)))
+
+@router.on(BotStates.task, INPUT_OPERATION)
+@router.on(BotStates.await_op, INPUT_OPERATION)
+async def set_operation(msg: Message, session, text):
+    """Операция задания 4"""
+    session.operation = text
+    session.result = None
+    session.state = BotStates.task.state
+    send(msg.answer(f"Операция сохранена: {text}"))
+
+@router.otherwise
+async def unknown_input(msg: Message, session, text):
+    send(msg.answer("Используйте кнопки меню"))
+
+# ========== ПОДМАССИВЫ ПО СТРАНИЦАМ ==========
+
+def data_tag(session):
+    """
+    Метка массива и суммы задания 5 для callback_data
+
+    Кнопки страниц остаются в чате после нового ввода; по метке они
+    отличаются от кнопок текущих данных (и после перезапуска бота).
+    """
+    return f"{zlib.crc32(str(session.target).encode(), zlib.crc32(session.arr)):08x}"
+
+def pages_kb(text, tag, page, cursor):
+    """Кнопка следующей страницы; метка данных (data_tag) и курсор хранятся в callback_data"""
+    data = f"sub:{tag}:{page}:{cursor[0]}:{cursor[1]}"
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=text, callback_data=data)]])
+
+def parse_page(data):
+    """"sub:метка:страница:j:k" -> (метка, страница, j, k) или None, если данные неверные"""
+    parts = data.split(":")
+    if len(parts) != 5 or not all(part.isdigit() for part in parts[2:]):
+        return None
+    return parts[1], int(parts[2]), int(parts[3]), int(parts[4])
+
+async def subarrays_page(call: CallbackQuery):
+    """Очередная страница подмассивов задания 5 с суммой target"""
+    session = app.sessions.get(call.from_user.id)
+    if session.task != "5" or not session.has_data():
+        await call.answer("Сначала введите данные задания 5", show_alert=True)
+        return
+    button = parse_page(call.data)
+    if button is None:
+        await call.answer("Неверная кнопка", show_alert=True)
+        return
+    tag, page, end, skip = button
+    if tag != data_tag(session):
+        await call.answer("Данные изменились: нажмите \"Выполнить\" еще раз", show_alert=True)
+        return
+    # Курсор (j, k): префикс j от 1 до n
+    if page < 1 or not 1 <= end <= len(session.arr):
+        await call.answer("Неверная кнопка", show_alert=True)
+        return
+
+    # Тот же курсор - продолжаем текущий генератор, иначе (кнопка старой
+    # страницы, сессия вытеснена) - восстанавливаем перечисление по курсору.
+    # На время поиска генератор забирается из сессии: повторное нажатие
+    # создаст свой, а не войдет в уже работающий
+    pager, session.pager = session.pager, None
+    if pager is None or pager.cursor != (end, skip):
+        pager = SubarrayPager(session.arr, session.target, (end, skip))
+    await call.answer()
+
+    if len(session.arr) >= app.executor.inline_threshold:
+        # Поиск следующих пар может пройти весь массив: не блокируем цикл событий
+        pairs = await asyncio.get_running_loop().run_in_executor(None, pager.next_page, SUBARRAY_PAGE)
+    else:
+        pairs = pager.next_page(SUBARRAY_PAGE)
+    if not pairs:
+        send(call.message.answer("Больше подмассивов нет"))
+        return
+
+    first = (page - 1) * SUBARRAY_PAGE + 1
+    lines = [f"Подмассивы {first}-{first + len(pairs) - 1} (позиции с 1):"]
+    for start, end in pairs:
+        values = session.arr[start:min(end + 1, start + SUBARRAY_PREVIEW)]
+        tail = ", ..." if end + 1 - start > SUBARRAY_PREVIEW else ""
+        lines.append(f"{start + 1}-{end + 1}: [{', '.join(map(str, values))}{tail}]")
+    markup = None
+    if not pager.done:
+        session.pager = pager
+        markup = pages_kb("Следующая страница", tag, page + 1, pager.cursor)
+    send(call.message.answer("\n".join(lines), reply_markup=markup))
+
+def fmt_array(values, limit=PREVIEW_ITEMS):
+    """Краткая запись массива для сообщения (первые limit элементов)"""
+    if len(values) <= limit:
+        return str(list(values))
+    head = ", ".join(map(str, values[:limit]))
+    return f"[{head}, ...] ({len(values)} эл.)"
+
+def save_input(session, text):
+    """
+    Разбор ввода для текущего задания и сохранение в сессию
+
+    Returns:
+        str: ответ пользователю
+
+    Raises:
+        InputError: неверный формат ввода
+    """
+    spec = router.task(session.task)
+    return "Сохранено:\n" + spec.load(session, *spec.parse(text))
+
+async def apply_edit(session, text):
+    """
+    Добавление ("+ ...") или изменение ("set ...") элементов с пересчетом
+
+    Первое изменение строит состояние пересчета за O(n log n), следующие
+    обновляют результат за время, пропорциональное изменению.
+
+    Returns:
+        str: ответ пользователю
+
+    Raises:
+        InputError: неверная команда или нет данных
+    """
+    command = parse_edit(text, session.task)
+    if not session.has_data():
+        raise InputError(message="No data to edit",
+                         user_message="Сначала введите или сгенерируйте данные")
+
+    if command[0] == "set":
+        _, which, position, value = command
+        values = session.arr if session.task == "5" else (session.arr1, session.arr2)[which - 1]
+        if position >= len(values):
+            raise InputError(message=f"Position {position + 1} out of range",
+                             user_message=f"Позиция должна быть от 1 до {len(values)}")
+
+    # Массивы не меняются на месте: их может читать расчет или перечисление
+    # подмассивов в потоке. Изменение собирает новые массивы и подменяет их в сессии
+    names = ("arr",) if session.task == "5" else ("arr1", "arr2")
+    arrays = tuple(getattr(session, name) for name in names)
+    state = session.incremental
+    if state is None and (session.task == "5" or SortedList is not None):
+        if session.task == "5":
+            make, args = PrefixCounter, (session.arr, session.target)
+        else:
+            make, args = SortedPairing, arrays
+        state = await in_thread(input_size(arrays), make, *args)
+        check_unchanged(session, names, arrays)
+
+    if command[0] == "append":
+        added = command[1:]
+        if state is not None:
+            if session.task == "5":
+                state.extend(added[0])
+            else:
+                state.append(*added)
+        updated = tuple(values + extra for values, extra in zip(arrays, added))
+        reply = f"Добавлено элементов: {len(added[0])} (всего {len(updated[0])})"
+    else:
+        updated = list(arrays)
+        values = updated[which - 1] = arrays[which - 1][:]
+        old, values[position] = values[position], value
+        if session.task == "5":
+            if state is not None:
+                # Замена меняет все следующие префиксы: полный проход O(n), в потоке
+                state = await in_thread(len(values), PrefixCounter, values, session.target)
+                check_unchanged(session, names, arrays)
+        elif state is not None:
+            state.set(which, old, value)
+        reply = f"Позиция {position + 1}: {value}"
+
+    for name, values in zip(names, updated):
+        setattr(session, name, values)
+    # Данные изменились: индекс и перечисление устарели
+    session.index = session.pager = None
+    session.incremental = state
+    if state is None:
+        session.result = None
+        return reply
+    session.result = state.count if session.task == "5" else state.result()
+    result = session.result if session.task == "5" else fmt_array(session.result)
+    return f"{reply}\nРезультат: {result}"
+
+def check_unchanged(session, names, arrays):
+    """
+    Данные не заменены другим обновлением, пока пересчет шел в потоке
+
+    Raises:
+        InputError: массивы сессии уже другие (состояние пересчета устарело)
+    """
+    if any(getattr(session, name) is not values for name, values in zip(names, arrays)):
+        raise InputError(message="Data changed during edit",
+                         user_message="Данные изменились во время пересчета, повторите команду")
+
+async def handle_document(msg: Message):
+    """Ввод данных текстовым файлом (для больших массивов)"""
+    session = app.sessions.get(msg.from_user.id)
+    if session.state != BotStates.task:
+        send(msg.answer("Сначала выберите задание"))
+        return
+    if msg.document.file_size and msg.document.file_size > app.config.max_document_bytes:
+        send(msg.answer(f"Файл слишком большой (больше {app.config.max_document_bytes // (1024 * 1024)} МБ)"))
+        return
+    
+    buffer = await msg.bot.download(msg.document, destination=io.BytesIO())
+    try:
+        text = buffer.getvalue().decode("utf-8").strip()
+        send(msg.answer(save_input(session, text)))
+    except UnicodeDecodeError:
+        send(msg.answer("Файл должен быть в кодировке UTF-8"))
+    except InputError as e:
+        send(msg.answer(handle_bot_error(e)))
+    app.sessions.save(session)
+
+async def route(msg: Message, metrics_probe=None):
+    """Единая точка входа сообщений: обработчик выбирается таблицами router"""
+    session = app.sessions.get(msg.from_user.id)
+    handler, text = router.resolve(msg.text or "", session.state, router.tasks.get(session.task))
+    if metrics_probe is not None:
+        # В метриках и записи трассы - имя выбранного обработчика, а не route
+        metrics_probe.handler = handler.__name__
+    try:
+        await handler(msg, session, text)
+    finally:
+        app.sessions.save(session)
+
+# ========== ЗАДАНИЯ ==========
+# Новое задание добавляется описанием TaskSpec: обработчики выше его не перечисляют
+
+def load_task1(session, arr1, arr2):
+    session.set_arrays(arr1=arr1, arr2=arr2)
+    return f"Массив1: {fmt_array(arr1)}\nМассив2: {fmt_array(arr2)}"
+
+def load_task4(session, arr1, arr2, operation):
+    session.set_arrays(arr1=arr1, arr2=arr2)
+    session.operation = operation
+    reply = f"Число1: {fmt_array(arr1)}\nЧисло2: {fmt_array(arr2)}"
+    return reply + (f"\nОперация: {operation}" if operation else "")
+
+def load_task5(session, arr, target):
+    # Индекс по всем суммам: при том же массиве и другой сумме он не строится заново
+    # (новый строится при расчете, вне цикла событий)
+    index = session.index if session.arr is not None and session.arr == arr else None
+    session.set_arrays(arr=arr)
+    session.target = target
+    session.index = index
+    return f"Массив: {fmt_array(arr)}\nСумма: {target}"
+
+def generate_task1():
+    return [random.randint(-10, 10) for _ in range(5)], [random.randint(-10, 10) for _ in range(5)]
+
+def generate_task4():
+    num1 = random.randint(100, 999)
+    num2 = random.randint(100, 999)
+    return [int(d) for d in str(num1)], [int(d) for d in str(num2)], None
+
+def generate_task5():
+    return [random.randint(-5, 10) for _ in range(8)], random.randint(0, 20)
+
+async def calculate_task1(session, progress):
+    if session.incremental is not None:
+        # После правок результат уже пересчитан: тот же объект - то же представление
+        if session.result is None:
+            session.result = session.incremental.result()
+    else:
+        session.result = await result_cache.call_async(
+            task_runner(session, progress), execute_1, session.arr1, session.arr2)
+    return None, None
+
+async def calculate_task4(session, progress):
+    if session.operation is None:
+        session.state = BotStates.await_op.state
+        return "Введите операцию (+ или -):", None
+    session.result = await result_cache.call_async(
+        task_runner(session, progress), execute_4, session.arr1, session.arr2, session.operation)
+    return None, None
+
+async def calculate_task5(session, progress):
+    # Индекс строится при первом расчете для массива (и заново после вытеснения сессии).
+    # Построение O(n^2) по числу пар: в потоке, чтобы не задерживать другие чаты.
+    # Отказ запоминается (NO_INDEX): следующие расчеты сразу идут через execute_5
+    if session.index is None and session.incremental is None:
+        arr = session.arr
+        index = await in_thread(len(arr) * (len(arr) + 1) // 2, build_index, arr)
+        if session.arr is arr:
+            session.index = index if index is not None else NO_INDEX
+    if session.incremental is not None:
+        result = session.incremental.count
+    elif session.index is not None and session.index is not NO_INDEX:
+        result = session.index.count(session.target)
+    else:
+        result = await result_cache.call_async(
+            task_runner(session, progress), execute_5, session.arr, session.target)
+    session.result = result
+    markup = pages_kb("Показать подмассивы", data_tag(session), 1, (1, 0)) if result else None
+    return f"Найдено подмассивов: {result}", markup
+
+for spec in (
+    TaskSpec("1", TASK1_DETAILS, FORMAT_TASK1, parse_task1, generate_task1, load_task1,
+             calculate_task1, editable=True),
+    TaskSpec("4", TASK4_DETAILS, FORMAT_TASK4, parse_task4, generate_task4, load_task4,
+             calculate_task4, operations=True),
+    TaskSpec("5", TASK5_DETAILS, FORMAT_TASK5, parse_task5, generate_task5, load_task5,
+             calculate_task5, editable=True),
+):
+    router.register_task(spec, task_select)
+
+MAIN_KB = get_kb([spec.button for spec in router.tasks.values()] + ["Помощь"])
+
+# ========== ПОДКЛЮЧЕНИЕ ==========
+
+def setup(application):
+    """
+    Подключение обработчиков к диспетчеру приложения
+
+    Обработчики общие для процесса: они работают с ресурсами последнего
+    подключенного приложения.
+    """
+    global app
+    app = application
+    dp = application.dp
+    dp.callback_query.register(subarrays_page, F.data.startswith("sub:"))
+    dp.message.register(handle_document, F.document)
+    # Все остальные сообщения разбирает таблица router
+    dp.message.register(route)
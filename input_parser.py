@@ -0,0 +1,338 @@
+"""
+Разбор пользовательского ввода для заданий 1, 4 и 5
+
+Форматы (см. messages.HELP):
+    задание 1: "1 2 3;4 5 6"
+    задание 4: "1 2 3|4 5 6;+" (операцию можно не указывать; цифры
+               можно писать слитно: "123|456;+")
+    задание 5: "1 2 3 4;5"
+
+Числа сразу разбираются в array('q') (или в массив NumPy), без
+промежуточных списков. Размер ввода проверяется до разбора. При ошибке
+выбрасывается InputError с позицией неверного фрагмента.
+"""
+
+import re
+import warnings
+from array import array
+from typing import Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy разбор идет через array('q', map(int, ...))
+    np = None
+
+from exceptions import ErrorCode, InputError
+
+# Ограничения размера ввода
+MAX_INPUT_CHARS = 16 * 1024 * 1024
+MAX_ELEMENTS = 1_000_000
+MAX_DIGITS = 10_000_000
+
+_TOKEN = re.compile(r"\S+")
+_SPACE = re.compile(r"\s")
+_WHITESPACE = (" ", "\n", "\t", "\r")
+_INT64_MAX = 2 ** 63 - 1
+_INT64_MIN = -2 ** 63
+# Целое число без "_" (int() принимает "1_000")
+_INTEGER = re.compile(r"\s*[+-]?[0-9]+\s*\Z")
+
+FORMAT_TASK1 = "Формат: '1 2 3;4 5 6'"
+FORMAT_TASK4 = "Формат: '1 2 3|4 5 6;+'"
+FORMAT_TASK5 = "Формат: '1 2 3 4;5'"
+FORMAT_APPEND = "Добавление: '+ 5 7 9' (для задания 1: '+ 1 2;3 4')"
+FORMAT_SET = "Изменение: 'set 3=10' (для задания 1: 'set 2 3=10' - массив 2, позиция 3)"
+
+_SET = re.compile(r"set\s+(?:([12])\s+)?(\d+)\s*=\s*(-?\d+)\s*$")
+
+
+def _error(message: str, user_message: str, text: str, position: int) -> InputError:
+    return InputError(
+        message=message,
+        user_message=f"{user_message} (позиция {position + 1})",
+        context={"position": position, "fragment": text[position:position + 20]}
+    )
+
+
+def _check_size(text: str):
+    if len(text) > MAX_INPUT_CHARS:
+        raise InputError(
+            message=f"Input too large: {len(text)} chars",
+            user_message=f"Слишком большой ввод (больше {MAX_INPUT_CHARS} символов)",
+            context={"length": len(text), "limit": MAX_INPUT_CHARS},
+            code=ErrorCode.INPUT_TOO_LARGE
+        )
+
+
+def precheck(text: str, task: str) -> int:
+    """
+    Быстрая проверка ввода без исключений и без разбора чисел
+
+    Отсекает слишком большой ввод, неверное число разделителей и пустой
+    первый массив. Для отказа в горячем цикле (например, batch.py) не
+    нужно строить исключение; точную позицию ошибки дает разбор.
+
+    Returns:
+        ErrorCode.OK или код ошибки
+    """
+    if len(text) > MAX_INPUT_CHARS:
+        return ErrorCode.INPUT_TOO_LARGE
+    if task == "4":
+        numbers = text.partition(";")[0]
+        if text.count(";") > 1 or numbers.count("|") != 1:
+            return ErrorCode.INPUT_FORMAT
+        first = numbers.partition("|")[0]
+    else:
+        if text.count(";") != 1:
+            return ErrorCode.INPUT_FORMAT
+        first = text.partition(";")[0]
+    if not first.strip():
+        return ErrorCode.INPUT_EMPTY
+    return ErrorCode.OK
+
+
+def _split(text: str, sep: str, parts: int, user_format: str) -> list:
+    """Деление на части с проверкой их количества; возвращает (начало, часть)"""
+    pieces = text.split(sep)
+    if len(pieces) != parts:
+        position = 0
+        if len(pieces) > parts:
+            # Позиция лишнего разделителя
+            position = len(sep.join(pieces[:parts]))
+        raise _error(f"Expected {parts} parts separated by '{sep}'", user_format, text, position)
+
+    result = []
+    offset = 0
+    for piece in pieces:
+        result.append((offset, piece))
+        offset += len(piece) + len(sep)
+    return result
+
+
+def _locate_bad_token(text: str, offset: int, segment: str, user_format: str):
+    """Поиск первого неверного числа в части (медленный путь, только при ошибке)"""
+    for match in _TOKEN.finditer(segment):
+        token = match.group()
+        try:
+            if "_" in token:
+                raise ValueError(token)
+            value = int(token)
+        except ValueError:
+            raise _error(f"Invalid number {token!r}", f"Неверное число '{token[:20]}'. {user_format}",
+                         text, offset + match.start())
+        if not -2 ** 63 <= value < 2 ** 63:
+            raise _error(f"Number out of range {token[:20]!r}", f"Слишком большое число. {user_format}",
+                         text, offset + match.start())
+    raise _error("Invalid numbers", user_format, text, offset)
+
+
+def _same_tokens(segment: str, values) -> bool:
+    """
+    Разобрал ли fromstring каждое число части ровно один раз
+
+    fromstring читает пустую часть и одиночный знак ("-", "+") как 0, а
+    "1 - 2" - как [1, -2]. Поэтому быстрый путь верен, только если чисел
+    столько же, сколько слов, и ни одно слово не состоит из одного знака.
+    """
+    raw = np.frombuffer(segment.encode("utf-8"), dtype=np.uint8)
+    # Пробел ASCII (" ", "\t" ... "\r") на месте каждого байта; края части - пробел
+    space = np.ones(len(raw) + 2, dtype=bool)
+    np.logical_or(raw == 32, (raw - 9) <= 4, out=space[1:-1])
+    starts = int(np.count_nonzero(space[:-2] > space[1:-1]))
+    if starts != len(values):
+        return False
+    sign = (raw == 43) | (raw == 45)
+    return not (sign & space[:-2] & space[2:]).any()
+
+
+def parse_numbers(text: str, offset: int, segment: str, user_format: str,
+                  as_numpy: bool = False, limit: int = MAX_ELEMENTS):
+    """
+    Разбор части с целыми числами через пробел
+
+    Returns:
+        array('q') или numpy.ndarray (int64)
+    """
+    # Оценка сверху до разбора: чисел не больше, чем пробельных символов + 1
+    if (sum(map(segment.count, _WHITESPACE)) + 1 > limit
+            and sum(1 for _ in _TOKEN.finditer(segment)) > limit):
+        raise _error(f"More than {limit} elements", f"Слишком много чисел (больше {limit})",
+                     text, offset)
+
+    if np is not None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(segment, dtype=np.int64, sep=" ")
+            except (ValueError, DeprecationWarning):
+                values = None
+        # fromstring насыщает переполнение до границ int64: такие значения
+        # перепроверяются точным медленным путем
+        if (values is not None and not (values == _INT64_MAX).any()
+                and not (values == _INT64_MIN).any() and _same_tokens(segment, values)):
+            if as_numpy:
+                return values
+            result = array('q')
+            result.frombytes(values.tobytes())
+            return result
+
+    try:
+        if "_" in segment:
+            raise ValueError(segment)
+        values = array('q', map(int, segment.split()))
+    except (ValueError, OverflowError):
+        _locate_bad_token(text, offset, segment, user_format)
+    return np.frombuffer(values, dtype=np.int64) if as_numpy and np is not None else values
+
+
+def parse_digits(text: str, offset: int, segment: str, user_format: str,
+                 as_numpy: bool = False):
+    """Разбор числа-массива цифр: "1 2 3" или слитно "123\""""
+    stripped = segment.strip()
+    if stripped and not _SPACE.search(stripped):
+        # Слитная запись: каждая цифра - один символ
+        if len(stripped) > MAX_DIGITS:
+            raise _error(f"More than {MAX_DIGITS} digits", f"Слишком длинное число (больше {MAX_DIGITS} цифр)",
+                         text, offset)
+        if not stripped.isdigit() or not stripped.isascii():
+            bad = next(i for i, c in enumerate(stripped) if not ("0" <= c <= "9"))
+            start = offset + segment.index(stripped) + bad
+            raise _error("Invalid digit", f"Ожидаются цифры 0-9. {user_format}", text, start)
+        raw = stripped.encode("ascii")
+        if np is not None:
+            digits = np.frombuffer(raw, dtype=np.uint8).astype(np.int64) - 48
+            if as_numpy:
+                return digits
+            result = array('q')
+            result.frombytes(digits.tobytes())
+            return result
+        return array('q', (c - 48 for c in raw))
+
+    values = parse_numbers(text, offset, segment, user_format, as_numpy, MAX_DIGITS)
+    if not _all_digits(values):
+        for match in _TOKEN.finditer(segment):
+            token = match.group()
+            if not token.isdigit() or int(token) > 9:
+                raise _error(f"Invalid digit {token!r}", f"Ожидаются цифры 0-9. {user_format}",
+                             text, offset + match.start())
+    return values
+
+
+def _all_digits(values) -> bool:
+    if np is not None and isinstance(values, np.ndarray):
+        return bool(((values >= 0) & (values <= 9)).all()) if values.size else True
+    return not values or (min(values) >= 0 and max(values) <= 9)
+
+
+def _require(values, text: str, offset: int, user_format: str):
+    if len(values) == 0:
+        raise _error("Empty array", f"Массив не может быть пустым. {user_format}", text, offset)
+
+
+# ========== ФОРМАТЫ ЗАДАНИЙ ==========
+
+def parse_task1(text: str, as_numpy: bool = False) -> Tuple:
+    """"a;b" -> (arr1, arr2)"""
+    _check_size(text)
+    (o1, s1), (o2, s2) = _split(text, ";", 2, FORMAT_TASK1)
+    arr1 = parse_numbers(text, o1, s1, FORMAT_TASK1, as_numpy)
+    arr2 = parse_numbers(text, o2, s2, FORMAT_TASK1, as_numpy)
+    _require(arr1, text, o1, FORMAT_TASK1)
+    _require(arr2, text, o2, FORMAT_TASK1)
+    return arr1, arr2
+
+
+def parse_task4(text: str, as_numpy: bool = False) -> Tuple:
+    """"a|b;op" или "a|b" -> (arr1, arr2, операция или None)"""
+    _check_size(text)
+    operation: Optional[str] = None
+    numbers = text
+    if ";" in text:
+        (_, numbers), (op_offset, op) = _split(text, ";", 2, FORMAT_TASK4)
+        operation = op.strip()
+        if operation not in ("+", "-"):
+            raise _error(f"Unknown operation {operation!r}", f"Операция должна быть + или -. {FORMAT_TASK4}",
+                         text, op_offset)
+
+    (o1, s1), (o2, s2) = _split(numbers, "|", 2, FORMAT_TASK4)
+    arr1 = parse_digits(text, o1, s1, FORMAT_TASK4, as_numpy)
+    arr2 = parse_digits(text, o2, s2, FORMAT_TASK4, as_numpy)
+    _require(arr1, text, o1, FORMAT_TASK4)
+    _require(arr2, text, o2, FORMAT_TASK4)
+    return arr1, arr2, operation
+
+
+def parse_task5(text: str, as_numpy: bool = False) -> Tuple:
+    """"arr;target" -> (arr, target)"""
+    _check_size(text)
+    (o1, s1), (o2, s2) = _split(text, ";", 2, FORMAT_TASK5)
+    arr = parse_numbers(text, o1, s1, FORMAT_TASK5, as_numpy)
+    _require(arr, text, o1, FORMAT_TASK5)
+    try:
+        if not _INTEGER.match(s2):
+            raise ValueError(s2)
+        target = int(s2)
+    except ValueError:
+        raise _error(f"Invalid target {s2.strip()[:20]!r}", f"Неверная сумма. {FORMAT_TASK5}",
+                     text, o2)
+    return arr, target
+
+
+# ========== ИЗМЕНЕНИЕ ДАННЫХ ==========
+
+def is_edit(text: str) -> bool:
+    """Команда изменения данных: "+ ..." или "set ..." """
+    return text.startswith("+ ") or text.startswith("set ")
+
+
+def parse_edit(text: str, task: str) -> Tuple:
+    """
+    Команда изменения данных задания 1 или 5
+
+    Returns:
+        ("append", массивы...) - добавление в конец: для задания 5 один
+            массив, для задания 1 два массива одинаковой длины
+        ("set", номер массива, позиция с 0, значение) - замена элемента
+    """
+    _check_size(text)
+    if task not in ("1", "5"):
+        raise _error("Edit is not supported", "Добавление и изменение доступны для заданий 1 и 5",
+                     text, 0)
+
+    if text.startswith("set "):
+        match = _SET.match(text)
+        if match is None:
+            raise _error("Invalid set command", FORMAT_SET, text, 0)
+        which, position, value = match.groups()
+        if (which is None) != (task == "5"):
+            raise _error("Array number mismatch", FORMAT_SET, text, 0)
+        value = int(value)
+        if not _INT64_MIN <= value <= _INT64_MAX:
+            raise _error("Value out of range", f"Слишком большое число. {FORMAT_SET}",
+                         text, match.start(3))
+        if int(position) < 1:
+            raise _error("Position must be positive", f"Позиции считаются с 1. {FORMAT_SET}",
+                         text, match.start(2))
+        return "set", int(which or 1), int(position) - 1, value
+
+    body = text[1:]
+    if task == "5":
+        values = parse_numbers(text, 1, body, FORMAT_APPEND)
+        _require(values, text, 1, FORMAT_APPEND)
+        return "append", values
+
+    (o1, s1), (o2, s2) = _split(body, ";", 2, FORMAT_APPEND)
+    arr1 = parse_numbers(text, o1 + 1, s1, FORMAT_APPEND)
+    arr2 = parse_numbers(text, o2 + 1, s2, FORMAT_APPEND)
+    _require(arr1, text, o1 + 1, FORMAT_APPEND)
+    if len(arr1) != len(arr2):
+        raise _error("Different lengths", f"Добавляется поровну в оба массива. {FORMAT_APPEND}",
+                     text, o2 + 1)
+    return "append", arr1, arr2
+
+
+PARSERS = {
+    "1": parse_task1,
+    "4": parse_task4,
+    "5": parse_task5,
+}
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+НАГРУЗОЧНЫЙ ТЕСТ ОБРАБОТЧИКОВ БОТА БЕЗ ДОСТУПА К СЕТИ
+
+Диспетчер bot.dp запускается в режиме long polling против локальной
+имитации Bot API (fake_api.py). N виртуальных пользователей проходят
+сценарий /start -> "Задание X" -> "Сгенерировать" или ввод данных ->
+"Выполнить" -> "Результат". Каждый шаг ждет ответа бота; сообщения
+планировщика о ходе долгого расчета ответом не считаются.
+
+Отчет: обработанные обновления в секунду, перцентили задержки по
+обработчикам и задержка цикла событий.
+
+Пример:
+    python loadtest.py --users 1000 --concurrency 200 --size 1000 --task 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from benchmark import percentile
+from fake_api import FakeTelegramAPI
+from metrics import LoopLagMonitor
+from scheduler import is_progress
+
+# Шаг сценария -> обработчик в handlers.py
+STEP_HANDLERS = {
+    "/start": "start_cmd",
+    "select": "task_select",
+    "Сгенерировать": "generate_data",
+    "input": "handle_text",
+    "Выполнить": "execute_task",
+    "Результат": "show_result",
+}
+
+REPLY_TIMEOUT = 60.0
+
+
+def make_input(task: str, size: int, rng: random.Random) -> str:
+    """Текст ввода для задания в формате messages.HELP"""
+    if task == "1":
+        arr1 = " ".join(str(rng.randint(-100, 100)) for _ in range(size))
+        arr2 = " ".join(str(rng.randint(-100, 100)) for _ in range(size))
+        return f"{arr1};{arr2}"
+    if task == "4":
+        num1 = " ".join(str(rng.randint(0, 9)) for _ in range(size))
+        num2 = " ".join(str(rng.randint(0, 9)) for _ in range(size))
+        return f"{num1}|{num2};{rng.choice('+-')}"
+    arr = " ".join(str(rng.randint(-10, 10)) for _ in range(size))
+    return f"{arr};{rng.randint(-10, 10)}"
+
+
+async def wait_answer(api: FakeTelegramAPI, user_id: int, progress: List[int]) -> Dict[str, Any]:
+    """Ответ обработчика: сообщения о ходе расчета пропускаются (и считаются)"""
+    while True:
+        reply = await api.wait_reply(user_id, REPLY_TIMEOUT)
+        if not is_progress(reply.get("text")):
+            return reply
+        progress[0] += 1
+
+
+async def simulate_user(api: FakeTelegramAPI, user_id: int, task: str, size: int,
+                        generate: bool, latencies: Dict[str, List[float]],
+                        rng: random.Random, progress: List[int]):
+    """Один пользователь проходит сценарий целиком"""
+    steps = [("/start", "/start"), ("select", f"Задание {task}")]
+    if generate:
+        steps.append(("Сгенерировать", "Сгенерировать"))
+    else:
+        steps.append(("input", make_input(task, size, rng)))
+    steps += [("Выполнить", "Выполнить"), ("Результат", "Результат")]
+
+    for step, text in steps:
+        start = time.perf_counter()
+        api.push_message(user_id, text)
+        reply = await wait_answer(api, user_id, progress)
+        latencies[STEP_HANDLERS[step]].append((reply["received"] - start) * 1000)
+        # Задание 4 без операции в сгенерированных данных просит ввести ее
+        if reply.get("text") == "Введите операцию (+ или -):":
+            api.push_message(user_id, "+")
+            await wait_answer(api, user_id, progress)
+            api.push_message(user_id, "Выполнить")
+            await wait_answer(api, user_id, progress)
+
+
+async def run_load(users: int, concurrency: int, size: int, tasks: List[str],
+                   generate: bool, seed: int = 0, rate_limits: bool = False) -> Dict[str, Any]:
+    """Запуск нагрузки и сбор статистики"""
+    import bot as app
+
+    api = FakeTelegramAPI()
+    await api.start()
+    bot = api.make_bot()
+    if not rate_limits:
+        # Замеряются обработчики, а не лимиты Telegram на отправку
+        app.outbox.set_limits(global_rate=1e9, chat_rate=1e9)
+    polling = asyncio.create_task(
+        app.dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+
+    lag = LoopLagMonitor(record=False)
+    lag.start()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    rng = random.Random(seed)
+    gate = asyncio.Semaphore(concurrency)
+    progress = [0]
+
+    async def one(user_id: int):
+        async with gate:
+            task = tasks[user_id % len(tasks)]
+            await simulate_user(api, 10_000 + user_id, task, size, generate, latencies, rng,
+                                progress)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(users)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await lag.stop()
+        await app.dp.stop_polling()
+        await polling
+        await app.outbox.close()
+        await bot.session.close()
+        await api.stop()
+        app.executor.shutdown()
+
+    handled = sum(len(v) for v in latencies.values())
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "size": size,
+        "tasks": tasks,
+        "generate": generate,
+        "elapsed_s": elapsed,
+        "updates": handled,
+        "updates_per_s": handled / elapsed if elapsed else 0.0,
+        "progress_messages": progress[0],
+        "handlers": {
+            name: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": max(values),
+            }
+            for name, values in latencies.items()
+        },
+        "loop_lag_ms": {
+            "p50": percentile(lag.samples, 50) if lag.samples else 0.0,
+            "p99": percentile(lag.samples, 99) if lag.samples else 0.0,
+            "max": max(lag.samples, default=0.0),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--size", type=int, default=100,
+                        help="размер вводимых массивов (при --generate не используется)")
+    parser.add_argument("--task", nargs="+", choices=["1", "4", "5"], default=["1", "4", "5"])
+    parser.add_argument("--generate", action="store_true",
+                        help="использовать кнопку 'Сгенерировать' вместо ввода")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="соблюдать лимиты Telegram на отправку (по умолчанию отключены)")
+    parser.add_argument("--output", help="файл для отчета JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args.users, args.concurrency, args.size,
+                                  args.task, args.generate, args.seed, args.rate_limits))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,232 @@
+"""
+Логирование без блокировки обработчиков
+
+Записи кладутся в очередь (QueueHandler), а в файл их пишет фоновый
+поток (QueueListener). Формат - JSON по одной записи в строке с полями
+user_id и task. Повторяющиеся информационные сообщения ограничиваются
+по частоте, файл ротируется по размеру.
+
+Файл открывает только главный процесс: ротация одного файла из нескольких
+процессов небезопасна. Дочерние процессы (рабочие supervisor.py) получают
+очередь process_queue() при запуске и передают записи через нее вызовом
+attach(). Процессы без такой очереди (пулы расчетов) в файл не пишут.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+LOG_FILE = "bot.log"
+LOG_LEVEL = logging.INFO
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+# Дублировать записи в консоль (выключено: печать из обработчиков дорогая)
+LOG_CONSOLE = False
+
+# Не больше RATE_BURST одинаковых информационных сообщений за RATE_INTERVAL секунд
+RATE_INTERVAL = 10.0
+RATE_BURST = 20
+
+_NUMBERS = re.compile(r"\d+")
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога в виде одной строки JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничение частоты похожих сообщений уровня ниже WARNING
+
+    Сообщения считаются похожими, если совпадают после замены чисел
+    (например, "Update id=... is handled. Duration N ms"). Количество
+    отброшенных записей добавляется к следующей пропущенной записи.
+    """
+
+    def __init__(self, interval: float = RATE_INTERVAL, burst: int = RATE_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._windows: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, _NUMBERS.sub("#", str(record.msg)))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] > self.interval:
+            if len(self._windows) > 10_000:
+                self._windows.clear()
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            record.suppressed = suppressed
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class _FastQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в потоке обработчика"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _ProcessQueueHandler(_FastQueueHandler):
+    """Передача записей дочернего процесса в главный через multiprocessing.Queue"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            # Значения полей приводятся так же, как их запишет JsonFormatter, чтобы запись сериализовалась
+            record.fields = json.loads(json.dumps(fields, default=str))
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_records: Optional[queue.SimpleQueue] = None
+# Очередь записей дочерних процессов и поток, перекладывающий их в _records
+_process_queue = None
+_forwarder: Optional[threading.Thread] = None
+
+
+def setup(filename: str = LOG_FILE, level: int = LOG_LEVEL, console: bool = LOG_CONSOLE):
+    """Подключение очереди к корневому логгеру и запуск фонового писателя"""
+    global _listener, _records
+    # parent_process() при spawn задается уже после импорта модулей, а имя процесса - до
+    if _listener is not None or multiprocessing.current_process().name != "MainProcess":
+        return
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    handlers = [file_handler]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+
+    rate_limit = RateLimitFilter()
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(rate_limit)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_FastQueueHandler(records))
+
+    _records = records
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def process_queue(context=None):
+    """
+    Очередь для записей дочерних процессов (передается им при запуске)
+
+    Args:
+        context: контекст multiprocessing, которым запускаются процессы
+    """
+    global _process_queue, _forwarder
+    if _records is None:
+        raise RuntimeError("logger.setup() has not been called in this process")
+    if _process_queue is None:
+        _process_queue = (context or multiprocessing).Queue()
+        _forwarder = threading.Thread(target=_forward, args=(_process_queue, _records),
+                                      name="log-forwarder", daemon=True)
+        _forwarder.start()
+    return _process_queue
+
+
+def _forward(source, target: queue.SimpleQueue):
+    while True:
+        try:
+            record = source.get()
+        except (EOFError, OSError):
+            return
+        if record is None:
+            return
+        target.put(record)
+
+
+def attach(records, level: int = LOG_LEVEL):
+    """Отправка записей дочернего процесса в очередь, полученную от process_queue()"""
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_ProcessQueueHandler(records))
+
+
+def shutdown():
+    """Остановка фонового писателя с записью оставшихся сообщений"""
+    global _listener, _process_queue, _forwarder
+    if _forwarder is not None:
+        _process_queue.put(None)
+        # Процесс, убитый во время записи, мог оставить очередь заблокированной
+        _forwarder.join(1.0)
+        _process_queue = _forwarder = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Именованный логгер для модулей, которым нужен стандартный интерфейс logging
+logger = logging.getLogger("bot")
+
+
+def log(msg, user_id=None, task=None, **fields):
+    """Информационное сообщение с необязательными полями user_id, task и др."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(msg, extra={"fields": _fields(user_id, task, fields)})
+
+
+def error(msg, user_id=None, task=None, **fields):
+    """Сообщение об ошибке с необязательными полями user_id, task и др."""
+    logger.error(msg, extra={"fields": _fields(user_id, task, fields)})
+
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(message)s",
-    filename="bot.log"
-)
+def _fields(user_id, task, fields) -> Dict[str, Any]:
+    if user_id is not None:
+        fields["user_id"] = user_id
+    if task is not None:
+        fields["task"] = task
+    return fields
 
-def log(msg):
-    logging.info(msg)
-    print(f"[LOG] {msg}")
 
-def error(msg):
-    logging.error(msg)
-    print(f"[ERROR] {msg}")
\ No newline at end of file
+setup()
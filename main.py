@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
-"""Запуск бота"""
+"""Запуск бота (режим polling или webhook задается BOT_RUN_MODE, см. config.py)"""
 
 import asyncio
+import sys
+
 from bot import main
+from exceptions import ConfigurationError
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except ConfigurationError as e:
+        print(e.user_message, file=sys.stderr)
+        sys.exit(2)
@@ -23,6 +23,13 @@ HELP = """ПОМОЩЬ ПО БОТУ:
 • Задание 1: 1 2 3;4 5 6
 • Задание 4: 1 2 3|4 5 6;+ или сначала числа, потом операцию
 • Задание 5: 1 2 3 4;5
+Цифры в задании 4 можно писать слитно: 123|456;+
+Большие массивы можно прислать текстовым файлом в том же формате
+
+ИЗМЕНЕНИЕ ДАННЫХ (задания 1 и 5):
+• + 5 7 9 - добавить элементы в конец (задание 1: + 1 2;3 4)
+• set 3=10 - заменить элемент на позиции 3 (задание 1: set 2 3=10 - в массиве 2)
+Результат пересчитывается только для изменившейся части
 
 КОМАНДЫ:
 /start - начало работы
@@ -41,18 +48,28 @@ TASK1_DETAILS = """Алгоритм:
 
 TASK4_DETAILS = """Алгоритм:
 1. Числа представлены как массивы цифр
-2. Массивы преобразуются в числа
-3. Выполняется операция (+ или -)
-4. Результат преобразуется обратно в массив цифр
+2. Операция (+ или -) выполняется поразрядно
+   с переносом или заемом, без перевода в число
+3. Знак результата определяется сравнением чисел
+4. Результат возвращается массивом цифр
 
 Введите 2 числа (массивы цифр) через '|' и операцию через ';'
 Пример: 1 2 3|4 5 6;+"""
 
 TASK5_DETAILS = """Алгоритм:
-1. Рассматриваются все возможные подмассивы
-2. Для каждого считается сумма элементов
-3. Сравнивается с целевой суммой
-4. Считается количество совпадений
+1. Считаются префиксные суммы массива
+2. Для каждой позиции ищется, сколько раз раньше встречалась
+   префиксная сумма, меньшая текущей на целевую сумму
+3. Количество совпадений суммируется за один проход O(n)
+
+При первом нажатии "Выполнить" для массива до 2000 элементов
+(без NumPy - до 630) строится таблица всех сумм подмассивов,
+если она невелика (значения с небольшим разбросом): повторный
+расчет с другой суммой для того же массива выполняется
+мгновенно. Иначе каждый расчет - один проход O(n).
+
+После расчета кнопка "Показать подмассивы" выводит найденные
+подмассивы по страницам.
 
 Введите массив и целевую сумму через ';'
 Пример: 1 2 3 4;5"""
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+Метрики производительности бота в формате Prometheus
+
+Внешний middleware диспетчера измеряет задержку каждого обновления по
+обработчикам, отдельно учитываются время и размер входных данных
+execute_*, попадания в кэш, глубина очереди исполнителя и задержка
+цикла событий. Метрики отдаются по HTTP на локальном порту (/metrics).
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9100
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и набором меток"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Счетчики корзин, +Inf, сумма
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labels, series in sorted(items):
+            total = 0
+            for bound, count in zip(self.buckets, series):
+                total += count
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {total}")
+            total += series[len(self.buckets)]
+            le = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {total}")
+            plain = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+            lines.append(f"{self.name}_count{plain} {total}")
+        return lines
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Значение, которое считывается функцией в момент сбора метрик"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {float(self.read())}"]
+
+
+class Registry:
+    """Набор метрик с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def get(self, name: str) -> Optional[Any]:
+        """Зарегистрированная метрика с именем name (None - нет такой)"""
+        return next((metric for metric in self._metrics if metric.name == name), None)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ========== МЕТРИКИ БОТА ==========
+
+registry = Registry()
+
+update_latency = registry.add(Histogram(
+    "bot_update_latency_seconds", "Время обработки обновления по обработчикам", ["handler"]))
+task_duration = registry.add(Histogram(
+    "bot_task_execution_seconds", "Время вычисления execute_* (без попаданий в кэш)", ["task"]))
+task_input_size = registry.add(Histogram(
+    "bot_task_input_size", "Размер входных данных execute_*", ["task"], SIZE_BUCKETS))
+task_errors = registry.add(Counter(
+    "bot_task_errors_total", "Ошибки при вычислении execute_*", ["task"]))
+loop_lag = registry.add(Histogram(
+    "bot_event_loop_lag_seconds", "Опоздание цикла событий относительно таймера"))
+
+
+def watch(name: str, help_text: str, read: Callable[[], float]):
+    """
+    Регистрация показателя, считываемого при каждом сборе метрик
+
+    Повторная регистрация того же имени (новый сервер webhook, новое
+    приложение) заменяет функцию чтения, а не добавляет второй показатель.
+    """
+    gauge = registry.get(name)
+    if isinstance(gauge, Gauge):
+        gauge.help, gauge.read = help_text, read
+    else:
+        registry.add(Gauge(name, help_text, read))
+
+
+async def measure_task(task: str, runner: Callable[..., Awaitable], func: Callable,
+                       *args, size: int = 0) -> Any:
+    """Вызов runner(func, *args) с учетом времени и размера входных данных"""
+    task_input_size.observe(size, task)
+    start = time.perf_counter()
+    try:
+        return await runner(func, *args)
+    except Exception:
+        task_errors.inc(task)
+        raise
+    finally:
+        task_duration.observe(time.perf_counter() - start, task)
+
+
+class _Probe:
+    """Общий для внешнего и внутреннего middleware объект одного обновления"""
+    __slots__ = ("handler",)
+
+    def __init__(self):
+        self.handler = "unhandled"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений: измеряет полное время обработки
+
+    Имя обработчика выбирается фильтрами уже после внешнего middleware,
+    поэтому его сообщает парный внутренний middleware через объект _Probe.
+    """
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        probe = data["metrics_probe"] = _Probe()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_latency.observe(time.perf_counter() - start, probe.handler)
+
+
+class _HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: запоминает имя выбранного обработчика"""
+
+    async def __call__(self, handler, event, data):
+        probe = data.get("metrics_probe")
+        if probe is not None:
+            probe.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+def setup(dp: Dispatcher):
+    """Подключение middleware метрик к диспетчеру"""
+    dp.update.outer_middleware(MetricsMiddleware())
+    name_middleware = _HandlerNameMiddleware()
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(name_middleware)
+
+
+class LoopLagMonitor:
+    """Замер задержки цикла событий: насколько позже просыпается sleep"""
+
+    def __init__(self, interval: float = 0.01, record: bool = True):
+        """
+        Args:
+            interval: период замера в секундах
+            record: дополнительно учитывать замеры в метрике bot_event_loop_lag_seconds
+        """
+        self.interval = interval
+        self.record = record
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.samples.append(lag * 1000)
+            if len(self.samples) > 100_000:
+                del self.samples[:50_000]
+            if self.record:
+                loop_lag.observe(lag)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class MetricsServer:
+    """HTTP-сервер с эндпоинтом /metrics и служебными эндпоинтами (route)"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._routes: List[Tuple[str, Callable]] = []
+        self.lag = LoopLagMonitor()
+
+    def route(self, path: str, handler: Callable[[web.Request], Awaitable[web.Response]]):
+        """Дополнительный эндпоинт (GET и POST); вызывается до start"""
+        self._routes.append((path, handler))
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(),
+                            content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        for path, handler in self._routes:
+            app.router.add_get(path, handler)
+            app.router.add_post(path, handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.lag.start()
+
+    async def stop(self):
+        await self.lag.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,366 @@
+"""
+Очередь исходящих сообщений с учетом ограничений Telegram
+
+Обработчики не ждут отправки: send(msg.answer(...)) кладет запрос в
+очередь и сразу возвращает управление. Отправкой занимается одна фоновая
+задача, которая соблюдает общий лимит (около 30 сообщений в секунду) и
+лимит на чат (около 1 сообщения в секунду) через корзины токенов. Сообщения одному чату уходят по порядку, подряд идущие
+тексты в один чат склеиваются в одно сообщение. Ответ 429 (retry after)
+откладывает только этот чат, остальные продолжают отправляться.
+"""
+
+import asyncio
+import heapq
+import ssl
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import certifi
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import __version__ as AIOGRAM_VERSION
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from aiogram.methods.base import TelegramMethod
+
+import metrics
+from logger import log, error
+
+# Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в чат.
+# За любую секунду корзина пропускает не больше burst + rate запросов
+GLOBAL_RATE = 25.0
+GLOBAL_BURST = 5
+CHAT_RATE = 1.0
+CHAT_BURST = 1
+# Одновременных запросов к Bot API и соединений в пуле
+MAX_IN_FLIGHT = 16
+POOL_SIZE = 32
+KEEPALIVE_TIMEOUT = 60.0
+# Длина сообщения Telegram и разделитель склеенных сообщений
+MAX_TEXT = 4096
+COALESCE_SEPARATOR = "\n\n"
+# Ограничение очереди: сверх него запрос отклоняется сразу
+MAX_QUEUE = 10_000
+CLOSE_TIMEOUT = 10.0
+
+sent_total = metrics.registry.add(metrics.Counter(
+    "bot_outbox_sent_total", "Запросы, отправленные через очередь исходящих сообщений"))
+coalesced_total = metrics.registry.add(metrics.Counter(
+    "bot_outbox_coalesced_total", "Сообщения, склеенные с предыдущим в тот же чат"))
+retry_after_total = metrics.registry.add(metrics.Counter(
+    "bot_outbox_retry_after_total", "Ответы 429 от Bot API"))
+send_delay = metrics.registry.add(metrics.Histogram(
+    "bot_outbox_delay_seconds", "Время от постановки в очередь до отправки"))
+
+
+class PooledSession(AiohttpSession):
+    """
+    Сессия Bot API с настроенным пулом соединений
+
+    AiohttpSession задает коннектору только общий limit, поэтому клиент
+    aiohttp создается здесь (create_session - точка расширения aiogram):
+    пул на хост и долгий keep-alive соединений. Прокси не поддерживается.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, keepalive: float = KEEPALIVE_TIMEOUT,
+                 **kwargs: Any):
+        super().__init__(limit=pool_size, **kwargs)
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self._client: Optional[ClientSession] = None
+
+    async def create_session(self) -> ClientSession:
+        if self._client is None or self._client.closed:
+            connector = TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=3600,
+            )
+            self._client = ClientSession(
+                connector=connector,
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{AIOGRAM_VERSION}"})
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+        await super().close()
+
+
+def make_session(api=None, pool_size: int = POOL_SIZE,
+                 keepalive: float = KEEPALIVE_TIMEOUT) -> AiohttpSession:
+    """Сессия aiohttp с увеличенным пулом и долгим keep-alive соединений"""
+    kwargs = {"api": api} if api is not None else {}
+    return PooledSession(pool_size=pool_size, keepalive=keepalive, **kwargs)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def give_back(self):
+        """Возврат неиспользованного токена (не больше capacity)"""
+        self.tokens = min(self.capacity, self.tokens + 1.0)
+
+    def take(self, now: float) -> float:
+        """Взять токен; возвращает 0 или время ожидания следующего токена"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Item:
+    """Запрос в очереди и ожидающие его результата"""
+
+    __slots__ = ("method", "futures", "queued")
+
+    def __init__(self, method: TelegramMethod, future: asyncio.Future):
+        self.method = method
+        self.futures = [future]
+        self.queued = time.monotonic()
+
+
+def _retrieve(future: asyncio.Future):
+    # Результат отправки обычно никто не ждет: исключение забирается,
+    # чтобы asyncio не предупреждал о необработанной ошибке
+    if not future.cancelled():
+        future.exception()
+
+
+class Outbox:
+    """
+    Планировщик исходящих запросов к Bot API
+
+    Args:
+        global_rate, global_burst: общий лимит запросов в секунду и запас
+        chat_rate, chat_burst: лимит на один чат
+        max_in_flight: одновременных запросов к Bot API
+        coalesce: склеивать подряд идущие тексты в один чат
+        max_queue: предел запросов в очереди
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST,
+                 chat_rate: float = CHAT_RATE, chat_burst: int = CHAT_BURST,
+                 max_in_flight: int = MAX_IN_FLIGHT, coalesce: bool = True,
+                 max_queue: int = MAX_QUEUE):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_in_flight = max_in_flight
+        self.coalesce = coalesce
+        self.max_queue = max_queue
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._queues: Dict[Any, Deque[_Item]] = {}
+        # Чаты, готовые к отправке, и отложенные до момента времени (куча)
+        self._ready: Deque[Any] = deque()
+        self._delayed: List[Tuple[float, int, Any]] = []
+        self._scheduled: Set[Any] = set()
+        self._sending: Set[Any] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._counter = 0
+        self.queued = 0
+
+    def set_limits(self, global_rate: float, chat_rate: float, global_burst: Optional[int] = None,
+                   chat_burst: Optional[int] = None):
+        """Изменение лимитов (например, для замеров без ограничений Telegram)"""
+        self._global = TokenBucket(global_rate, global_burst or max(1, int(global_rate)))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst or max(1, int(chat_rate))
+        self._buckets.clear()
+
+    # ========== ПОСТАНОВКА В ОЧЕРЕДЬ ==========
+
+    def submit(self, method: TelegramMethod) -> asyncio.Future:
+        """
+        Постановка запроса (например, msg.answer(...) без await) в очередь
+
+        Returns:
+            Future с результатом запроса; ждать его не обязательно
+        """
+        loop = asyncio.get_running_loop()
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = loop.create_task(self._run())
+
+        future = loop.create_future()
+        future.add_done_callback(_retrieve)
+        if self.queued >= self.max_queue:
+            future.set_exception(RuntimeError("Outbox queue is full"))
+            error("Outbox queue is full", queued=self.queued)
+            return future
+
+        chat_id = getattr(method, "chat_id", None)
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        elif queue and self.coalesce and self._merge(queue[-1], method, future):
+            coalesced_total.inc()
+            return future
+
+        queue.append(_Item(method, future))
+        self.queued += 1
+        self._schedule(chat_id)
+        return future
+
+    @staticmethod
+    def _merge(last: _Item, method: TelegramMethod, future: asyncio.Future) -> bool:
+        """Склейка текста с последним запросом в очереди того же чата"""
+        prev = last.method
+        if not (isinstance(prev, SendMessage) and isinstance(method, SendMessage)):
+            return False
+        # Клавиатура предыдущего сообщения потерялась бы, ответы в ветках не склеиваем
+        if prev.reply_markup is not None or prev.parse_mode != method.parse_mode:
+            return False
+        if prev.message_thread_id != method.message_thread_id or method.reply_parameters:
+            return False
+        text = prev.text + COALESCE_SEPARATOR + method.text
+        if len(text) > MAX_TEXT:
+            return False
+        last.method = prev.model_copy(update={"text": text, "reply_markup": method.reply_markup})
+        last.futures.append(future)
+        return True
+
+    # ========== ОТПРАВКА ==========
+
+    def _schedule(self, chat_id: Any, delay: float = 0.0):
+        """Постановка чата в готовые или отложенные, если он еще не там"""
+        if chat_id in self._scheduled or chat_id in self._sending:
+            return
+        self._scheduled.add(chat_id)
+        if delay > 0:
+            self._counter += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, self._counter, chat_id))
+        else:
+            self._ready.append(chat_id)
+        self._wakeup.set()
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[2])
+
+            if not self._ready:
+                self._wakeup.clear()
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self._global.take(now)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            chat_id = self._ready.popleft()
+            bucket = self._bucket(chat_id)
+            wait = bucket.take(now)
+            if wait:
+                # Токен общего лимита не использован: возвращаем его
+                self._global.give_back()
+                self._scheduled.discard(chat_id)
+                self._schedule(chat_id, wait)
+                continue
+
+            await semaphore.acquire()
+            self._scheduled.discard(chat_id)
+            self._sending.add(chat_id)
+            item = self._queues[chat_id].popleft()
+            self.queued -= 1
+            task = asyncio.get_running_loop().create_task(self._send(chat_id, item, semaphore))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 100_000:
+                # Полные корзины ничего не ограничивают: их можно забыть
+                now = time.monotonic()
+                for key in [k for k, b in self._buckets.items() if b.full(now)]:
+                    del self._buckets[key]
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _send(self, chat_id: Any, item: _Item, semaphore: asyncio.Semaphore):
+        delay = 0.0
+        try:
+            send_delay.observe(time.monotonic() - item.queued)
+            result = await item.method
+        except TelegramRetryAfter as e:
+            # Повтор того же запроса первым в очереди чата, без ожидания в обработчике
+            retry_after_total.inc()
+            self._queues[chat_id].appendleft(item)
+            self.queued += 1
+            delay = float(e.retry_after)
+            log("Outbox retry after", chat_id=chat_id, retry_after=e.retry_after)
+        except Exception as e:
+            error("Outbox send failed", chat_id=chat_id, error=str(e))
+            for future in item.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            sent_total.inc()
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            semaphore.release()
+            self._sending.discard(chat_id)
+            if self._queues.get(chat_id):
+                self._schedule(chat_id, delay)
+            else:
+                self._queues.pop(chat_id, None)
+
+    # ========== ОСТАНОВКА ==========
+
+    async def flush(self, timeout: Optional[float] = None):
+        """Ожидание отправки всего, что уже в очереди"""
+        async def wait_empty():
+            while self.queued or self._tasks:
+                if self._tasks:
+                    await asyncio.wait(set(self._tasks))
+                else:
+                    await asyncio.sleep(0.01)
+        await asyncio.wait_for(wait_empty(), timeout)
+
+    async def close(self, timeout: float = CLOSE_TIMEOUT):
+        """Отправка оставшихся запросов и остановка"""
+        if self._runner is None:
+            return
+        try:
+            await self.flush(timeout)
+        except asyncio.TimeoutError:
+            error("Outbox closed with unsent requests", queued=self.queued)
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self.queued, "chats": len(self._queues), "sending": len(self._sending)}
@@ -0,0 +1,237 @@
+"""
+Профилирование работающего бота по запросу
+
+Команда администратора (/profile в handlers.py) или локальный эндпоинт
+/profile сервера метрик включают cProfile на следующие N обновлений или
+N секунд и одновременно снимают снимки tracemalloc в начале и в конце.
+Результаты пишутся в каталог PROFILE_DIR:
+    profile-<время>.pstats  - для pstats/snakeviz
+    profile-<время>.txt     - самые дорогие функции по суммарному времени
+    profile-<время>-memory.txt - рост памяти по строкам кода
+
+Пока профилирование выключено, накладных расходов нет: middleware
+подсчета обновлений подключается к диспетчеру только на время замера.
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+from logger import log
+
+PROFILE_DIR = "profiles"
+# Строк в текстовых отчетах и кадров стека tracemalloc на одно выделение
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+TRACE_FRAMES = 1
+# Пределы одного замера
+MAX_UPDATES = 100_000
+MAX_SECONDS = 600.0
+
+USAGE = "Использование: /profile 100 (обновлений), /profile 30s (секунд), /profile stop"
+
+
+def parse_request(text: str) -> Tuple[Optional[int], Optional[float]]:
+    """
+    "100" -> (100, None), "30s" -> (None, 30.0)
+
+    Raises:
+        ValueError: неверный или слишком большой размер замера
+    """
+    text = text.strip().lower()
+    try:
+        if text.endswith("s"):
+            seconds = float(text[:-1])
+        else:
+            seconds, updates = None, int(text)
+    except ValueError:
+        raise ValueError(f"Неверный размер замера: {text[:20]!r}")
+    if seconds is not None:
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"Длительность от 0 до {MAX_SECONDS:.0f} секунд")
+        return None, seconds
+    if not 0 < updates <= MAX_UPDATES:
+        raise ValueError(f"Количество обновлений от 1 до {MAX_UPDATES}")
+    return updates, None
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Выделения самого tracemalloc в отчет не попадают
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+class _CountingMiddleware(BaseMiddleware):
+    """Внешний middleware на время замера: считает обновления и останавливает замер после N"""
+
+    def __init__(self, profiler: "Profiler"):
+        self.profiler = profiler
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            self.profiler._count_update()
+
+
+class Profiler:
+    """
+    Замер cProfile и tracemalloc по запросу
+
+    Одновременно идет не больше одного замера. on_done получает словарь
+    с результатом (см. stop) после завершения по счетчику или таймеру.
+    """
+
+    def __init__(self, dp: Dispatcher, directory: str = PROFILE_DIR):
+        self.dp = dp
+        self.directory = directory
+        self.last: Optional[Dict[str, Any]] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._middleware = _CountingMiddleware(self)
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._own_tracing = False
+        self._updates_left: Optional[int] = None
+        self._updates = 0
+        self._started = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def status(self) -> Dict[str, Any]:
+        if not self.active:
+            return {"active": False, "last": self.last}
+        return {"active": True, "updates": self._updates, "updates_left": self._updates_left,
+                "elapsed_s": time.perf_counter() - self._started}
+
+    def start(self, updates: Optional[int] = None, seconds: Optional[float] = None,
+              memory: bool = True, on_done: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Включение замера на updates обновлений или seconds секунд
+
+        Raises:
+            RuntimeError: замер уже идет
+        """
+        if self.active:
+            raise RuntimeError("Профилирование уже запущено")
+        if (updates is None) == (seconds is None):
+            raise ValueError("Нужно указать либо число обновлений, либо время")
+
+        self._updates_left = updates
+        self._updates = 0
+        self._on_done = on_done
+        self.dp.update.outer_middleware.register(self._middleware)
+        if seconds is not None:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self._finish)
+
+        if memory:
+            self._own_tracing = not tracemalloc.is_tracing()
+            if self._own_tracing:
+                tracemalloc.start(TRACE_FRAMES)
+            self._snapshot = _snapshot()
+        self._started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        log("Profiling started", updates=updates, seconds=seconds, memory=memory)
+
+    def _count_update(self):
+        if not self.active:
+            return
+        self._updates += 1
+        if self._updates_left is not None:
+            self._updates_left -= 1
+            if self._updates_left <= 0:
+                self._finish()
+
+    def _finish(self):
+        result = self.stop()
+        if self._on_done is not None and result is not None:
+            self._on_done(result)
+
+    def stop(self) -> Optional[Dict[str, Any]]:
+        """
+        Остановка замера и запись файлов
+
+        Returns:
+            {"updates", "seconds", "files"} или None, если замер не шел
+        """
+        if not self.active:
+            return None
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._started
+        profile, self._profile = self._profile, None
+        memory = None
+        if self._snapshot is not None:
+            memory = _snapshot().compare_to(self._snapshot, "lineno")
+            self._snapshot = None
+            if self._own_tracing:
+                tracemalloc.stop()
+        if self._middleware in self.dp.update.outer_middleware:
+            self.dp.update.outer_middleware.unregister(self._middleware)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        files = self._write(profile, memory, elapsed)
+        self.last = {"updates": self._updates, "seconds": round(elapsed, 3), "files": files}
+        log("Profiling finished", **self.last)
+        return self.last
+
+    def _write(self, profile: cProfile.Profile, memory, elapsed: float) -> list:
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        base = os.path.join(self.directory, "profile-" + stamp)
+        profile.dump_stats(base + ".pstats")
+
+        text = io.StringIO()
+        text.write(f"Обновлений: {self._updates}, время: {elapsed:.3f} с\n\n")
+        stats = pstats.Stats(profile, stream=text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        files = [base + ".pstats", base + ".txt"]
+
+        if memory is not None:
+            total = sum(stat.size_diff for stat in memory)
+            with open(base + "-memory.txt", "w", encoding="utf-8") as f:
+                f.write(f"Рост памяти за замер: {total / 1024:.1f} KB\n\n")
+                for stat in memory[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+            files.append(base + "-memory.txt")
+        return files
+
+    # ========== ЛОКАЛЬНЫЙ ЭНДПОИНТ ==========
+
+    async def handle_http(self, request: web.Request) -> web.Response:
+        """
+        GET /profile - состояние; POST /profile?updates=N или ?seconds=S -
+        запуск; POST /profile?stop=1 - досрочная остановка
+        """
+        if request.method == "GET":
+            return web.json_response(self.status())
+        query = request.query
+        if "stop" in query:
+            return web.json_response(self.stop() or self.status())
+        try:
+            if "updates" in query:
+                updates, seconds = parse_request(query["updates"])
+            else:
+                updates, seconds = parse_request(query.get("seconds", "") + "s")
+            self.start(updates, seconds, memory=query.get("memory", "1") != "0")
+        except (ValueError, RuntimeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(self.status())
@@ -0,0 +1,150 @@
+"""
+Запись входящих обновлений для воспроизведения (replay.py)
+
+Внешний middleware сохраняет каждое обновление вместе со временем
+поступления, длительностью обработки и именем обработчика. Записи
+пишутся фоновым потоком пачками: каждая пачка - строки JSON, сжатые zlib,
+с 4-байтовой длиной впереди. Файл только дополняется, поэтому его можно
+читать во время работы бота, а оборванная последняя пачка пропускается.
+"""
+
+import atexit
+import json
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+MAGIC = b"BOTREC1\n"
+FRAME_HEADER = struct.Struct(">I")
+# Пачка записывается при накоплении FLUSH_RECORDS записей или раз в FLUSH_INTERVAL секунд
+FLUSH_RECORDS = 256
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+_TIMEOUT = object()
+
+
+class TraceWriter:
+    """Фоновая запись пачек в файл трассы"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        self._queue.put(record)
+
+    def _run(self):
+        batch = []
+        deadline = 0.0
+        while True:
+            # Пустая пачка ждет без ограничения, начатая - не дольше FLUSH_INTERVAL
+            timeout = max(deadline - time.monotonic(), 0.0) if batch else None
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = _TIMEOUT
+            if isinstance(record, dict):
+                if not batch:
+                    deadline = time.monotonic() + FLUSH_INTERVAL
+                batch.append(record)
+                if len(batch) < FLUSH_RECORDS:
+                    continue
+            if batch:
+                self._flush(batch)
+                batch = []
+            if record is _STOP:
+                return
+
+    def _flush(self, batch):
+        lines = "\n".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in batch)
+        frame = zlib.compress(lines.encode("utf-8"), 6)
+        self._file.write(FRAME_HEADER.pack(len(frame)) + frame)
+        self._file.flush()
+        self.records += len(batch)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._file.close()
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """Записи трассы по порядку (оборванная последняя пачка пропускается)"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a trace file")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            frame = f.read(FRAME_HEADER.unpack(header)[0])
+            try:
+                lines = zlib.decompress(frame).decode("utf-8")
+            except zlib.error:
+                return
+            for line in lines.split("\n"):
+                yield json.loads(line)
+
+
+class RecorderMiddleware(BaseMiddleware):
+    """
+    Внешний middleware: обновление, время поступления и длительность обработки
+
+    Имя обработчика берется из объекта metrics_probe, который заполняют
+    middleware метрик (metrics.setup должен быть вызван раньше).
+    """
+
+    def __init__(self, writer: TraceWriter):
+        self.writer = writer
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        received = time.time()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.perf_counter() - start
+            probe = data.get("metrics_probe")
+            self.writer.write({
+                "t": round(received, 6),
+                "d": round(duration * 1000, 3),
+                "h": probe.handler if probe is not None else "unknown",
+                "u": event.model_dump(mode="json", exclude_none=True)
+                if isinstance(event, Update) else None,
+            })
+
+
+_writer: Optional[TraceWriter] = None
+
+
+def setup(dp: Dispatcher, path: str) -> TraceWriter:
+    """Подключение записи обновлений диспетчера в файл path"""
+    global _writer
+    if _writer is None:
+        _writer = TraceWriter(path)
+        atexit.register(close)
+    dp.update.outer_middleware(RecorderMiddleware(_writer))
+    return _writer
+
+
+def close():
+    """Запись оставшихся обновлений и закрытие файла"""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
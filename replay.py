@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+ВОСПРОИЗВЕДЕНИЕ ЗАПИСАННЫХ ОБНОВЛЕНИЙ БЕЗ ДОСТУПА К СЕТИ
+
+Обновления из файла трассы (recorder.py, BOT_RECORD_FILE) подаются
+в диспетчер bot.dp по одному через feed_update, ответы бота уходят в
+локальную имитацию Bot API (fake_api.py). Случайные данные кнопки
+"Сгенерировать" фиксируются через --seed, поэтому повторные прогоны
+обрабатывают одинаковые данные. Документы воспроизводятся без
+содержимого файла: оно в трассу не записывается.
+
+Скорость:
+    --speed 0 (по умолчанию) - обновления подряд, без пауз
+    --speed 1 - с исходными интервалами, --speed 10 - в 10 раз быстрее
+    (паузы длиннее --max-gap сокращаются, например между запусками бота)
+
+Отчет: перцентили задержки по обработчикам при воспроизведении и в
+исходной записи. Для сравнения двух сборок трасса воспроизводится еще раз
+с модулями бота из каталога --build (или берется сохраненный --baseline),
+и выводится разница медиан и 95-го перцентиля по обработчикам.
+
+Примеры:
+    python replay.py trace.rec --output new.json
+    python replay.py trace.rec --speed 10 --baseline old.json
+    python replay.py trace.rec --build ../bot-release --threshold 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+DEFAULT_THRESHOLD = 0.25
+# Самая длинная пауза между обновлениями при воспроизведении с интервалами (секунды)
+MAX_GAP = 5.0
+
+
+def _summary(values: List[float]) -> Dict[str, Any]:
+    from benchmark import percentile
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": max(values),
+    }
+
+
+async def run_replay(records: List[Dict[str, Any]], speed: float = 0.0,
+                     max_gap: float = MAX_GAP, seed: int = 0) -> Dict[str, Any]:
+    """Воспроизведение записей трассы через bot.dp"""
+    from aiogram.types import Update
+    from fake_api import FakeTelegramAPI
+    import bot as app
+
+    random.seed(seed)
+    api = FakeTelegramAPI()
+    await api.start()
+    bot = api.make_bot()
+    outbox = getattr(app, "outbox", None)
+    if outbox is not None:
+        # Замеряются обработчики, а не лимиты Telegram на отправку
+        outbox.set_limits(global_rate=1e9, chat_rate=1e9)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failed = 0
+
+    async def feed(record: Dict[str, Any]):
+        nonlocal failed
+        update = Update.model_validate(record["u"], context={"bot": bot})
+        start = time.perf_counter()
+        try:
+            await app.dp.feed_update(bot, update)
+        except Exception:
+            failed += 1
+        latencies[record["h"]].append((time.perf_counter() - start) * 1000)
+
+    records = [r for r in records if r.get("u")]
+    tasks = []
+    start = time.perf_counter()
+    try:
+        if speed > 0:
+            # Смещение каждого обновления от начала с учетом сокращенных пауз
+            offset, prev = 0.0, records[0]["t"] if records else 0.0
+            for record in records:
+                offset += min(record["t"] - prev, max_gap) / speed
+                prev = record["t"]
+                delay = offset - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(feed(record)))
+            await asyncio.gather(*tasks)
+        else:
+            for record in records:
+                await feed(record)
+        if outbox is not None:
+            await outbox.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        if outbox is not None:
+            await outbox.close()
+        await bot.session.close()
+        await api.stop()
+        app.executor.shutdown()
+
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    for record in records:
+        recorded[record["h"]].append(record["d"])
+    return {
+        "updates": len(records),
+        "failed": failed,
+        "speed": speed,
+        "seed": seed,
+        "elapsed_s": elapsed,
+        "handlers": {name: _summary(values) for name, values in latencies.items()},
+        "recorded": {name: _summary(values) for name, values in recorded.items()},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float) -> List[str]:
+    """
+    Разница задержек по обработчикам между сборками
+
+    Returns:
+        list: строки таблицы; регрессии (медиана медленнее больше чем на
+        threshold) помечены "!"
+    """
+    lines = []
+    for name, case in sorted(report["handlers"].items()):
+        base = baseline.get("handlers", {}).get(name)
+        if not base:
+            continue
+        ratio = case["p50_ms"] / max(base["p50_ms"], 1e-6)
+        mark = "!" if ratio > 1 + threshold else " "
+        lines.append(
+            f"{mark} {name:20} p50 {base['p50_ms']:9.3f} -> {case['p50_ms']:9.3f} мс "
+            f"({(ratio - 1) * 100:+6.1f}%)  p95 {base['p95_ms']:9.3f} -> "
+            f"{case['p95_ms']:9.3f} мс"
+        )
+    return lines
+
+
+def replay_build(build: str, trace: str, speed: float, max_gap: float, seed: int) -> Dict[str, Any]:
+    """Воспроизведение той же трассы с модулями бота из каталога build"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "report.json")
+        cmd = [sys.executable, os.path.abspath(__file__), os.path.abspath(trace),
+               "--speed", str(speed), "--max-gap", str(max_gap), "--seed", str(seed),
+               "--as-build", os.path.abspath(build), "--output", output]
+        subprocess.run(cmd, cwd=build, check=True)
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений бота")
+    parser.add_argument("trace", help="файл трассы (BOT_RECORD_FILE)")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="ускорение относительно записи (0 - без пауз)")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP,
+                        help="предел паузы между обновлениями, секунды")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для отчета JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="отчет другой сборки для сравнения")
+    parser.add_argument("--build", help="каталог другой сборки бота для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление медианы (0.25 = 25%%)")
+    parser.add_argument("--as-build", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    from recorder import read_trace
+    records = list(read_trace(args.trace))
+    if args.as_build:
+        # Модули бота (bot, task_*, sessions...) берутся из каталога сборки
+        sys.path.insert(0, args.as_build)
+        sys.modules.pop("recorder", None)
+
+    baseline = None
+    if args.build:
+        baseline = replay_build(args.build, args.trace, args.speed, args.max_gap, args.seed)
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = asyncio.run(run_replay(records, args.speed, args.max_gap, args.seed))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if baseline is not None:
+        lines = compare(report, baseline, args.threshold)
+        print("ЗАДЕРЖКА ПО ОБРАБОТЧИКАМ (другая сборка -> текущая):", file=sys.stderr)
+        for line in lines:
+            print(f"  {line}", file=sys.stderr)
+        if any(line.startswith("!") for line in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
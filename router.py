@@ -0,0 +1,163 @@
+"""
+Маршрутизация текстовых сообщений по таблице
+
+Вместо цепочки фильтров F.text == ... и ветвлений по строкам состояний
+все текстовые сообщения попадают в один обработчик bot.route, который:
+1. ищет текст кнопки в словаре (одна операция)
+2. ищет команду ("/start", "/profile ...") по первому слову
+3. иначе выбирает обработчик по паре (состояние, вид ввода) из таблицы
+
+Состояния - aiogram StatesGroup, хранятся в Session.state. Задания
+описываются TaskSpec и регистрируются через register_task: кнопка
+"Задание N", описание, разбор, генерация и расчет берутся из описания,
+общие обработчики бота сами по заданиям не ветвятся.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State, StatesGroup
+
+from input_parser import is_edit
+
+# Виды текстового ввода в состоянии задания
+INPUT_DATA = "data"
+INPUT_EDIT = "edit"
+INPUT_OPERATION = "operation"
+OPERATIONS = ("+", "-")
+
+
+class BotStates(StatesGroup):
+    """Состояния диалога"""
+    main = State()
+    # Ввод данных задания (номер задания - Session.task)
+    task = State()
+    # Ожидание операции задания 4 перед расчетом
+    await_op = State()
+
+
+# Состояния из сессий, сохраненных в SQLite до перехода на StatesGroup
+_LEGACY_STATES = {"main": BotStates.main.state, "await_op": BotStates.await_op.state}
+
+
+def normalize_state(state: Optional[str]) -> str:
+    """Состояние из старого формата ("main", "task1", ...) в формат StatesGroup"""
+    if not state:
+        return BotStates.main.state
+    if state.startswith("task") and ":" not in state:
+        return BotStates.task.state
+    return _LEGACY_STATES.get(state, state)
+
+
+class TaskSpec:
+    """
+    Описание задания для общих обработчиков
+
+    Args:
+        key: номер задания ("1", "4", "5")
+        description: текст из messages.py, показывается при выборе
+        input_format: подсказка формата ввода (кнопка "Ввести")
+        parse: текст -> кортеж данных (ошибки - InputError)
+        generate: () -> кортеж случайных данных того же вида
+        load: (session, *данные) -> строки ответа; сохраняет данные в сессию
+        run: async (session, progress) -> (текст ответа, клавиатура или None);
+            текст None - показать session.result через delivery (сообщение или
+            документ); progress(text) - сообщение о ходе долгого расчета
+        operations: задание принимает операцию "+" / "-" отдельным сообщением
+        editable: поддерживает добавление и изменение элементов
+    """
+
+    __slots__ = ("key", "description", "input_format", "parse", "generate", "load", "run",
+                 "operations", "editable")
+
+    def __init__(self, key: str, description: str, input_format: str,
+                 parse: Callable, generate: Callable, load: Callable, run: Callable,
+                 operations: bool = False, editable: bool = False):
+        self.key = key
+        self.description = description
+        self.input_format = input_format
+        self.parse = parse
+        self.generate = generate
+        self.load = load
+        self.run = run
+        self.operations = operations
+        self.editable = editable
+
+    @property
+    def button(self) -> str:
+        return f"Задание {self.key}"
+
+
+class StateRouter:
+    """Таблицы кнопок, команд и обработчиков по (состояние, вид ввода)"""
+
+    def __init__(self):
+        self.buttons: Dict[str, Callable] = {}
+        self.commands: Dict[str, Callable] = {}
+        self.table: Dict[Tuple[str, str], Callable] = {}
+        self.tasks: Dict[str, TaskSpec] = {}
+        self.fallback: Optional[Callable] = None
+
+    def button(self, *texts: str):
+        """Декоратор: обработчик нажатия кнопок с текстами texts"""
+        def register(handler):
+            for text in texts:
+                self.buttons[text] = handler
+            return handler
+        return register
+
+    def command(self, name: str):
+        """Декоратор: обработчик команды (первое слово сообщения)"""
+        def register(handler):
+            self.commands[name] = handler
+            return handler
+        return register
+
+    def on(self, state: State, *kinds: str):
+        """Декоратор: обработчик ввода видов kinds в состоянии state"""
+        def register(handler):
+            for kind in kinds:
+                self.table[(state.state, kind)] = handler
+            return handler
+        return register
+
+    def otherwise(self, handler):
+        """Декоратор: обработчик сообщений, не найденных в таблицах"""
+        self.fallback = handler
+        return handler
+
+    def register_task(self, spec: TaskSpec, select: Callable):
+        """Регистрация задания: описание и кнопка выбора с обработчиком select"""
+        self.tasks[spec.key] = spec
+        self.buttons[spec.button] = select
+
+    def task(self, key: Optional[str]) -> TaskSpec:
+        """Описание задания (по умолчанию - первого зарегистрированного)"""
+        spec = self.tasks.get(key) if key is not None else None
+        return spec if spec is not None else next(iter(self.tasks.values()))
+
+    @staticmethod
+    def input_kind(text: str, spec: Optional[TaskSpec]) -> str:
+        """Вид свободного ввода с учетом возможностей задания"""
+        if spec is not None:
+            if spec.operations and text in OPERATIONS:
+                return INPUT_OPERATION
+            if spec.editable and is_edit(text):
+                return INPUT_EDIT
+        return INPUT_DATA
+
+    def resolve(self, raw: str, state: str, spec: Optional[TaskSpec]) -> Tuple[Callable, str]:
+        """
+        Обработчик сообщения и текст для него (без пробелов по краям)
+
+        Кнопки сравниваются с исходным текстом, как и прежние фильтры
+        F.text == ..., свободный ввод - после strip.
+        """
+        handler = self.buttons.get(raw)
+        if handler is not None:
+            return handler, raw
+        text = raw.strip()
+        if text.startswith("/"):
+            handler = self.commands.get(text.split(maxsplit=1)[0])
+            if handler is not None:
+                return handler, text
+        return self.table.get((state, self.input_kind(text, spec)), self.fallback), text
@@ -0,0 +1,337 @@
+"""
+Справедливый планировщик тяжелых заданий
+
+Задания, которые не считаются прямо в обработчике (см. INLINE_THRESHOLD
+в executor.py), ждут свободного места в пуле здесь, а не в порядке
+поступления. Очередь - взвешенная справедливая (WFQ):
+1. время задания оценивается по размеру входа и виду задания
+   (execute_1 - n log n, execute_4 и execute_5 - n), коэффициенты
+   (секунд на единицу сложности) уточняются по фактическому времени;
+2. каждое задание получает метку окончания: max(виртуальное время,
+   метка предыдущего задания пользователя) + оценка времени;
+3. первым запускается задание с меньшей меткой.
+Поэтому дешевые задания проходят раньше дорогих, а пользователь с
+большим массивом не задерживает остальных: его следующие задания
+получают метки после уже поставленных. У каждого пользователя не больше
+user_jobs выполняемых и user_queue ожидающих заданий.
+
+Пока задание ждет или выполняется дольше progress_delay, планировщик
+сообщает о ходе работы через progress (например, сообщением в чат):
+место в очереди и прошедшее время относительно оценки.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+import metrics
+from exceptions import ErrorCode, ResourceError
+from executor import TaskExecutor, input_size
+
+# Ограничения на пользователя по умолчанию
+USER_JOBS = 1
+USER_QUEUE = 3
+# Первое сообщение о ходе работы и период следующих (секунды)
+PROGRESS_DELAY = 2.0
+PROGRESS_INTERVAL = 10.0
+# Начало сообщений о ходе работы (по нему клиенты отличают их от результата)
+PROGRESS_QUEUED = "Расчет в очереди"
+PROGRESS_RUNNING = "Идет расчет"
+# Доля нового замера в уточняемом коэффициенте стоимости
+RATE_SMOOTHING = 0.2
+
+# Вид задания -> (сложность от размера n, начальная оценка секунд на единицу сложности)
+COST_MODELS: Dict[str, tuple] = {
+    "execute_1": (lambda n: n * math.log2(n + 2), 5e-8),
+    "execute_4": (lambda n: n, 2e-8),
+    "execute_5": (lambda n: n, 2e-7),
+}
+DEFAULT_MODEL = (lambda n: n, 1e-7)
+
+wait_time = metrics.registry.add(metrics.Histogram(
+    "bot_scheduler_wait_seconds", "Ожидание задания в очереди планировщика", ["task"]))
+run_time = metrics.registry.add(metrics.Histogram(
+    "bot_scheduler_run_seconds", "Выполнение задания после выхода из очереди", ["task"]))
+rejected_total = metrics.registry.add(metrics.Counter(
+    "bot_scheduler_rejected_total", "Задания, отклоненные из-за лимитов очереди", ["reason"]))
+
+
+def is_progress(text: Optional[str]) -> bool:
+    """Сообщение о ходе работы, а не ответ обработчика"""
+    return bool(text) and text.startswith((PROGRESS_QUEUED, PROGRESS_RUNNING))
+
+
+def _seconds(value: float) -> str:
+    return "меньше секунды" if value < 1 else f"~{value:.0f} с"
+
+
+class _Job:
+    """Задание в очереди планировщика"""
+
+    __slots__ = ("task", "user_id", "cost", "estimate", "finish", "queued", "started",
+                 "slot", "cancelled")
+
+    def __init__(self, task: str, user_id: Any, cost: float, estimate: float):
+        self.task = task
+        self.user_id = user_id
+        self.cost = cost
+        self.estimate = estimate
+        self.finish = 0.0
+        self.queued = time.monotonic()
+        self.started: Optional[float] = None
+        # Разрешение на запуск: результат выставляет _dispatch
+        self.slot: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.cancelled = False
+
+
+class _User:
+    __slots__ = ("running", "queued", "finish")
+
+    def __init__(self):
+        self.running = 0
+        self.queued = 0
+        # Метка окончания последнего поставленного задания
+        self.finish = 0.0
+
+
+class TaskStats:
+    """Ожидание и выполнение заданий одного вида"""
+
+    __slots__ = ("jobs", "wait_total", "wait_max", "run_total", "run_max", "rate")
+
+    def __init__(self, rate: float):
+        self.jobs = 0
+        self.wait_total = self.wait_max = 0.0
+        self.run_total = self.run_max = 0.0
+        # Уточняемая оценка секунд на единицу сложности
+        self.rate = rate
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "jobs": self.jobs,
+            "wait_avg_s": self.wait_total / self.jobs if self.jobs else 0.0,
+            "wait_max_s": self.wait_max,
+            "run_avg_s": self.run_total / self.jobs if self.jobs else 0.0,
+            "run_max_s": self.run_max,
+            "rate": self.rate,
+        }
+
+
+class Scheduler:
+    """
+    Очередь заданий перед TaskExecutor
+
+    Args:
+        executor: пул, в котором выполняются задания
+        slots: одновременно выполняемых заданий (по умолчанию - рабочих пула)
+        user_jobs: выполняемых заданий одного пользователя
+        user_queue: ожидающих заданий одного пользователя
+        max_queue: ожидающих заданий всего (по умолчанию - очередь пула)
+    """
+
+    def __init__(self, executor: TaskExecutor, slots: Optional[int] = None,
+                 user_jobs: int = USER_JOBS, user_queue: int = USER_QUEUE,
+                 max_queue: Optional[int] = None,
+                 progress_delay: float = PROGRESS_DELAY,
+                 progress_interval: float = PROGRESS_INTERVAL):
+        self.executor = executor
+        self.slots = slots or executor.max_workers
+        self.user_jobs = user_jobs
+        self.user_queue = user_queue
+        self.max_queue = max_queue if max_queue is not None else executor.max_queue
+        self.progress_delay = progress_delay
+        self.progress_interval = progress_interval
+        self.running = 0
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._users: Dict[Any, _User] = {}
+        # Виртуальное время: метка начала последнего запущенного задания
+        self._virtual = 0.0
+        self.stats: Dict[str, TaskStats] = {}
+
+    @property
+    def queued(self) -> int:
+        """Задания, ожидающие запуска"""
+        return sum(user.queued for user in self._users.values())
+
+    def estimate(self, task: str, size: int) -> tuple:
+        """(стоимость в единицах сложности, оценка времени в секундах)"""
+        complexity, rate = COST_MODELS.get(task, DEFAULT_MODEL)
+        stats = self.stats.get(task)
+        cost = complexity(size)
+        return cost, cost * (stats.rate if stats is not None else rate)
+
+    async def run(self, func: Callable, *args, user_id: Any = None,
+                  progress: Optional[Callable[[str], Any]] = None,
+                  size: Optional[int] = None) -> Any:
+        """
+        Выполнение func(*args) в порядке очереди планировщика
+
+        Args:
+            user_id: владелец задания (None - без лимитов пользователя)
+            progress: вызывается с текстом о ходе работы долгого задания
+
+        Raises:
+            ResourceError: превышены лимиты очереди или времени выполнения
+        """
+        if size is None:
+            size = input_size(args)
+        if size < self.executor.inline_threshold:
+            return await self.executor.run(func, *args, size=size)
+
+        task = func.__name__
+        cost, estimate = self.estimate(task, size)
+        job = self._enqueue(_Job(task, user_id, cost, estimate))
+        reporter = None
+        if progress is not None:
+            reporter = asyncio.get_running_loop().create_task(self._report(job, progress))
+        try:
+            try:
+                await job.slot
+            except asyncio.CancelledError:
+                self._cancel(job)
+                raise
+            try:
+                return await self.executor.run(func, *args, size=size)
+            finally:
+                self._complete(job, size)
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+    # ========== ОЧЕРЕДЬ ==========
+
+    def _enqueue(self, job: _Job) -> _Job:
+        user = self._users.get(job.user_id)
+        if user is None:
+            user = self._users[job.user_id] = _User()
+        limited = job.user_id is not None
+        if limited and user.queued >= self.user_queue:
+            self._reject("user_queue", job, "Дождитесь завершения предыдущих расчетов")
+        if self.queued >= self.max_queue:
+            self._reject("queue", job, "Бот перегружен, попробуйте позже")
+
+        # Вес - оценка в секундах: сложности разных видов заданий несравнимы
+        job.finish = max(self._virtual, user.finish if limited else 0.0) + job.estimate
+        if limited:
+            user.finish = job.finish
+        user.queued += 1
+        heapq.heappush(self._heap, (job.finish, next(self._seq), job))
+        self._dispatch()
+        return job
+
+    def _reject(self, reason: str, job: _Job, user_message: str):
+        rejected_total.inc(reason)
+        self._forget(job.user_id)
+        raise ResourceError(
+            message=f"Scheduler queue limit: {reason}",
+            user_message=user_message,
+            context={"user_id": job.user_id, "task": job.task, "queued": self.queued},
+            code=ErrorCode.QUEUE_FULL
+        )
+
+    def _dispatch(self):
+        """Запуск заданий с меньшими метками, пока есть свободные места"""
+        deferred = []
+        while self.running < self.slots and self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if job.cancelled:
+                continue
+            user = self._users[job.user_id]
+            if job.user_id is not None and user.running >= self.user_jobs:
+                # Пользователь на лимите: задание ждет его завершения
+                deferred.append(entry)
+                continue
+            user.queued -= 1
+            user.running += 1
+            self.running += 1
+            self._virtual = max(self._virtual, job.finish - job.estimate)
+            job.started = time.monotonic()
+            job.slot.set_result(None)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    def _cancel(self, job: _Job):
+        """Отмена ожидания (например, обработчик прерван)"""
+        if job.started is not None:
+            # Место уже выдано, но задание не запущено
+            self._complete(job, None)
+            return
+        job.cancelled = True
+        self._users[job.user_id].queued -= 1
+        self._forget(job.user_id)
+
+    def _complete(self, job: _Job, size: Optional[int]):
+        user = self._users[job.user_id]
+        user.running -= 1
+        self.running -= 1
+        self._forget(job.user_id)
+        if size is not None:
+            self._record(job, size)
+        self._dispatch()
+        if not self.running and not self.queued:
+            # Очередь пуста: прошлые расчеты не должны отодвигать следующие задания
+            self._virtual = max([self._virtual] + [u.finish for u in self._users.values()])
+            self._users.clear()
+            self._heap.clear()
+
+    def _forget(self, user_id: Any):
+        user = self._users.get(user_id)
+        if user is not None and not user.running and not user.queued:
+            # Метка окончания устарела, если виртуальное время ее обогнало
+            if user.finish <= self._virtual:
+                del self._users[user_id]
+
+    def _record(self, job: _Job, size: int):
+        now = time.monotonic()
+        waited, ran = job.started - job.queued, now - job.started
+        wait_time.observe(waited, job.task)
+        run_time.observe(ran, job.task)
+        stats = self.stats.get(job.task)
+        if stats is None:
+            stats = self.stats[job.task] = TaskStats(COST_MODELS.get(job.task, DEFAULT_MODEL)[1])
+        stats.jobs += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        stats.run_total += ran
+        stats.run_max = max(stats.run_max, ran)
+        if job.cost > 0:
+            stats.rate += RATE_SMOOTHING * (ran / job.cost - stats.rate)
+
+    # ========== ХОД РАБОТЫ ==========
+
+    def position(self, job: _Job) -> int:
+        """Сколько ожидающих заданий запустится раньше job"""
+        return sum(1 for finish, _, other in self._heap
+                   if not other.cancelled and other is not job and finish < job.finish)
+
+    async def _report(self, job: _Job, progress: Callable[[str], Any]):
+        await asyncio.sleep(self.progress_delay)
+        while True:
+            if job.started is None:
+                ahead = self.position(job)
+                progress(f"{PROGRESS_QUEUED}: впереди {ahead}, "
+                         f"оценка времени расчета {_seconds(job.estimate)}")
+            else:
+                elapsed = time.monotonic() - job.started
+                progress(f"{PROGRESS_RUNNING}: прошло {elapsed:.0f} с, оценка {_seconds(job.estimate)}")
+            await asyncio.sleep(self.progress_interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние очереди и статистика по видам заданий"""
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "users": len(self._users),
+            "tasks": {task: stats.to_dict() for task, stats in self.stats.items()},
+        }
+
+    async def handle_http(self, request: web.Request) -> web.Response:
+        """GET /scheduler на сервере метрик - состояние очереди и статистика"""
+        return web.json_response(self.snapshot())
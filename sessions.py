@@ -0,0 +1,441 @@
+"""
+Хранилище пользовательских сессий
+
+Сессии занимают минимум памяти: объекты со __slots__, массивы данных
+хранятся в array('q'). Неактивные сессии вытесняются по LRU и по времени
+простоя, общий объем ограничен. При указании файла SQLite сессии
+сохраняются на диск и переживают перезапуск бота: записываются только
+изменившиеся сессии, пачкой и в потоке, не блокируя цикл событий.
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from cache import estimate_size
+from router import BotStates, normalize_state
+
+MAIN_STATE = BotStates.main.state
+
+# Ограничения по умолчанию
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_IDLE_TTL = 24 * 60 * 60
+# Задержка записи в SQLite: изменения за это время уходят одной транзакцией
+FLUSH_DELAY = 0.5
+
+# Поля с массивами и их тип в array
+ARRAY_FIELDS = ("arr1", "arr2", "arr")
+ARRAY_TYPECODE = 'q'
+
+
+def to_array(values: Iterable[int]) -> array:
+    """Компактное представление массива целых чисел"""
+    if isinstance(values, array) and values.typecode == ARRAY_TYPECODE:
+        return values
+    return array(ARRAY_TYPECODE, values)
+
+
+class Session:
+    """Состояние одного пользователя"""
+
+    __slots__ = ("user_id", "state", "task", "arr1", "arr2", "arr",
+                 "target", "operation", "result", "index", "pager", "incremental",
+                 "fsm", "last_seen")
+
+    def __init__(self, user_id: int, state: str = MAIN_STATE):
+        self.user_id = user_id
+        self.state = state
+        self.task: Optional[str] = None
+        self.arr1: Optional[array] = None
+        self.arr2: Optional[array] = None
+        self.arr: Optional[array] = None
+        self.target: Optional[int] = None
+        self.operation: Optional[str] = None
+        self.result: Any = None
+        # Индекс сумм подмассивов для задания 5 (не сохраняется в SQLite)
+        self.index: Any = None
+        # Перечисление подмассивов задания 5 по страницам (только в памяти)
+        self.pager: Any = None
+        # Состояние пересчета при добавлении и изменении элементов (только в памяти)
+        self.incremental: Any = None
+        # Состояние FSM aiogram: (chat_id, thread_id, destiny) -> (state, data)
+        self.fsm: Optional[Dict[Tuple, Tuple[Optional[str], Dict[str, Any]]]] = None
+        self.last_seen = time.monotonic()
+
+    def reset(self, state: str = MAIN_STATE, task: Optional[str] = None):
+        """Сброс данных задания (например, при выборе другого задания)"""
+        self.state = state
+        self.task = task
+        self.clear_data()
+
+    def clear_data(self):
+        """Удаление введенных данных и результата"""
+        self.arr1 = self.arr2 = self.arr = None
+        self.target = None
+        self.operation = None
+        self.result = None
+        self.index = None
+        self.pager = None
+        self.incremental = None
+
+    def set_arrays(self, **arrays: Iterable[int]):
+        """Сохранение массивов (arr1, arr2, arr) в компактном виде"""
+        for name, values in arrays.items():
+            if name not in ARRAY_FIELDS:
+                raise AttributeError(name)
+            setattr(self, name, to_array(values))
+        self.result = None
+        self.index = None
+        self.pager = None
+        self.incremental = None
+
+    def has_data(self) -> bool:
+        """Введены ли данные для текущего задания"""
+        if self.task == "5":
+            return self.arr is not None and self.target is not None
+        return self.arr1 is not None and self.arr2 is not None
+
+    def nbytes(self) -> int:
+        """Приблизительный объем памяти сессии"""
+        size = sys.getsizeof(self)
+        for name in ARRAY_FIELDS:
+            values = getattr(self, name)
+            if values is not None:
+                size += sys.getsizeof(values)
+        if self.result is not None:
+            size += estimate_size(self.result)
+        for extra in (self.index, self.incremental):
+            if extra is not None:
+                size += extra.nbytes
+        return size
+
+
+class SessionStore:
+    """
+    Ограниченное хранилище сессий с вытеснением и сохранением в SQLite
+
+    Вытесненная из памяти сессия остается в файле (если он задан) и
+    загружается при следующем обращении пользователя.
+
+    save не пишет в файл сам: строка сессии (поля, которые сохраняются)
+    сравнивается с последней записанной и, если изменилась, ставится в
+    очередь. Очередь записывается через FLUSH_DELAY одной транзакцией в
+    потоке (без цикла событий - сразу), а при close - полностью.
+    """
+
+    def __init__(self,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 idle_ttl: Optional[float] = DEFAULT_IDLE_TTL,
+                 path: Optional[str] = None,
+                 flush_delay: float = FLUSH_DELAY):
+        """
+        Args:
+            max_sessions: максимальное количество сессий в памяти
+            max_bytes: максимальный суммарный объем сессий в памяти
+            idle_ttl: время простоя в секундах, после которого сессия вытесняется
+            path: файл SQLite для сохранения сессий (None - только память)
+            flush_delay: задержка пачки записей в SQLite (секунды)
+        """
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[int, Session]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._bytes = 0
+        self.evictions = 0
+        self.flush_delay = flush_delay
+        self._db: Optional[sqlite3.Connection] = None
+        # Соединение используется из потока записи и из цикла событий
+        self._db_lock = threading.Lock()
+        # Последняя записанная строка сессии в памяти, очередь записи и пачка в записи
+        self._written: Dict[int, tuple] = {}
+        self._pending: Dict[int, tuple] = {}
+        self._inflight: Dict[int, tuple] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.writes = 0
+        if path is not None:
+            self._open(path)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sessions
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, user_id: int) -> Session:
+        """Сессия пользователя (создается или загружается при отсутствии)"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._load(user_id) or Session(user_id)
+            self._sessions[user_id] = session
+            self._account(session)
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_seen = time.monotonic()
+        self._evict()
+        return session
+
+    def reset(self, user_id: int, state: str = MAIN_STATE, task: Optional[str] = None) -> Session:
+        """Сброс сессии пользователя в начальное состояние"""
+        session = self.get(user_id)
+        session.reset(state, task)
+        self.save(session)
+        return session
+
+    def save(self, session: Session):
+        """
+        Учет изменений сессии: пересчет объема и запись в SQLite
+
+        Сессия, вытесненная пока обработчик ждал (расчет, отправка), снова
+        попадает в память: без файла SQLite ее изменения иначе потерялись бы.
+        """
+        user_id = session.user_id
+        current = self._sessions.get(user_id)
+        if current is not session:
+            if current is not None:
+                self._forget(user_id)
+            self._sessions[user_id] = session
+            session.last_seen = time.monotonic()
+        else:
+            self._sessions.move_to_end(user_id)
+        self._account(session)
+        self._evict()
+        if self._db is not None:
+            row = _row(session)
+            if _changed(row, self._written.get(user_id)):
+                self._written[user_id] = row
+                self._pending[user_id] = row
+                self._schedule_flush()
+
+    def drop(self, user_id: int):
+        """Полное удаление сессии (из памяти и из файла)"""
+        self._forget(user_id)
+        self._pending.pop(user_id, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                self._db.commit()
+
+    def _account(self, session: Session):
+        size = session.nbytes()
+        self._bytes += size - self._sizes.get(session.user_id, 0)
+        self._sizes[session.user_id] = size
+
+    def _forget(self, user_id: int):
+        if self._sessions.pop(user_id, None) is not None:
+            self._bytes -= self._sizes.pop(user_id, 0)
+        # Строка держит массивы сессии: вытесненную сессию она не должна удерживать
+        self._written.pop(user_id, None)
+
+    def _evict(self):
+        """Вытеснение самых давних сессий сверх лимитов и простаивающих дольше TTL"""
+        sessions = self._sessions
+        now = time.monotonic()
+        while sessions:
+            user_id, oldest = next(iter(sessions.items()))
+            idle = self.idle_ttl is not None and now - oldest.last_seen > self.idle_ttl
+            # Самую свежую сессию не вытесняем: она нужна текущему обработчику
+            over = len(sessions) > 1 and (
+                len(sessions) > self.max_sessions or self._bytes > self.max_bytes)
+            if not (idle or over):
+                break
+            self._forget(user_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "bytes": self._bytes,
+                "evictions": self.evictions}
+
+    # ========== SQLITE ==========
+
+    def _open(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, state TEXT, task TEXT, "
+            "arr1 BLOB, arr2 BLOB, arr BLOB, target INTEGER, operation TEXT, "
+            "fsm TEXT, updated REAL)"
+        )
+        self._db.commit()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне цикла событий (утилиты, тесты) - запись сразу
+            self.flush()
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Изменения, пришедшие во время записи пачки, уходят следующей пачкой
+        while self._pending:
+            await asyncio.sleep(self.flush_delay)
+            rows = self._take()
+            try:
+                await asyncio.to_thread(self._write_rows, rows)
+            finally:
+                self._inflight.clear()
+
+    def _take(self) -> Dict[int, tuple]:
+        rows, self._pending = self._pending, {}
+        self._inflight.update(rows)
+        return rows
+
+    def flush(self):
+        """Запись очереди изменений в SQLite (синхронно)"""
+        if self._db is not None and self._pending:
+            try:
+                self._write_rows(self._take())
+            finally:
+                self._inflight.clear()
+
+    def _write_rows(self, rows: Dict[int, tuple]):
+        # Массивы не меняются на месте (изменение заменяет их), поэтому байты
+        # можно получить здесь, в потоке записи
+        now = time.time()
+        values = [
+            (user_id, state, task,
+             *(b.tobytes() if b is not None else None for b in (arr1, arr2, arr)),
+             target, operation, fsm, now)
+            for user_id, (state, task, arr1, arr2, arr, target, operation, fsm) in rows.items()
+        ]
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+            self._db.commit()
+        self.writes += len(values)
+
+    def _load(self, user_id: int) -> Optional[Session]:
+        if self._db is None:
+            return None
+        # Еще не записанные изменения новее файла
+        row = self._pending.get(user_id) or self._inflight.get(user_id)
+        if row is None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT state, task, arr1, arr2, arr, target, operation, fsm "
+                    "FROM sessions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+            if row is None:
+                return None
+
+        state, task, arr1, arr2, arr, target, operation, fsm = row
+        # Сессии старых версий хранят состояния вида "task1"
+        session = Session(user_id, normalize_state(state))
+        session.task = task
+        for name, stored in zip(ARRAY_FIELDS, (arr1, arr2, arr)):
+            if isinstance(stored, bytes):
+                values = array(ARRAY_TYPECODE)
+                values.frombytes(stored)
+                stored = values
+            setattr(session, name, stored)
+        session.target = target
+        session.operation = operation
+        if fsm:
+            session.fsm = {tuple(k): (s, d) for k, s, d in json.loads(fsm)}
+        return session
+
+    def purge(self, older_than: float):
+        """Удаление из файла сессий, не обновлявшихся дольше older_than секунд"""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM sessions WHERE updated < ?",
+                                 (time.time() - older_than,))
+                self._db.commit()
+
+    def close(self):
+        """Запись оставшихся изменений и закрытие файла"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+
+def _row(session: Session) -> tuple:
+    """Сохраняемые поля сессии (порядок - как в таблице sessions)"""
+    fsm = None
+    if session.fsm:
+        fsm = json.dumps([[list(k), s, d] for k, (s, d) in session.fsm.items()])
+    return (session.state, session.task, session.arr1, session.arr2, session.arr,
+            session.target, session.operation, fsm)
+
+
+def _changed(row: tuple, written: Optional[tuple]) -> bool:
+    """Отличается ли строка от записанной (массивы - по объекту: они заменяются, а не меняются)"""
+    if written is None:
+        return True
+    return any(new is not old and (isinstance(new, array) or new != old)
+               for new, old in zip(row, written))
+
+
+class SessionStorage(BaseStorage):
+    """
+    Хранилище FSM aiogram поверх SessionStore (замена MemoryStorage)
+
+    Состояние хранится в сессии пользователя, поэтому вытесняется и
+    сохраняется вместе с ней.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    @staticmethod
+    def _slot(key: StorageKey) -> Tuple:
+        return key.chat_id, key.thread_id, key.destiny
+
+    def _record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        fsm = self.store.get(key.user_id).fsm
+        if not fsm:
+            return None, {}
+        return fsm.get(self._slot(key), (None, {}))
+
+    def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        session = self.store.get(key.user_id)
+        if session.fsm is None:
+            session.fsm = {}
+        if state is None and not data:
+            session.fsm.pop(self._slot(key), None)
+        else:
+            session.fsm[self._slot(key)] = (state, data)
+        self.store.save(session)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        self._write(key, state, self._record(key)[1])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._record(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self._write(key, self._record(key)[0], dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(self._record(key)[1])
+
+    async def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+ЗАМЕР ХОЛОДНОГО СТАРТА БОТА
+
+Каждый замер - новый процесс интерпретатора, который:
+1. импортирует bot (должно быть дешево: без aiogram и обработчиков)
+2. собирает приложение (bot.create_app: aiogram, обработчики, задания)
+3. запускает polling против локальной имитации Bot API (fake_api.py)
+   и ждет ответа на первое обновление "/start"
+
+Время каждого этапа считается от запуска процесса. Отдельный прогон
+с python -X importtime дает разбивку импорта по модулям и пакетам.
+
+Бюджет: если медиана импорта bot или времени до ответа на первое
+обновление больше заданного (--import-budget, --budget), код выхода 1.
+
+Пример:
+    python startup.py --runs 5 --budget 3000 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Бюджеты по умолчанию (мс от запуска процесса)
+IMPORT_BUDGET_MS = 300.0
+FIRST_UPDATE_BUDGET_MS = 8000.0
+# Строк в разбивке импорта по модулям и пакетам
+TOP_MODULES = 25
+FIRST_UPDATE_TIMEOUT = 60.0
+USER_ID = 1
+
+
+# ========== ЗАМЕР В ДОЧЕРНЕМ ПРОЦЕССЕ ==========
+
+def _child(spawned: float):
+    """Этапы старта в мс от spawned (time.monotonic родителя: часы общие для процессов)"""
+    started = time.monotonic()
+    import bot as app_module
+    imported = time.monotonic()
+    import asyncio
+    app = app_module.create_app()
+    created = time.monotonic()
+
+    async def first_update() -> Dict[str, float]:
+        from fake_api import FakeTelegramAPI
+        api = FakeTelegramAPI()
+        await api.start()
+        bot = api.make_bot()
+        polling_started = time.monotonic()
+        api.push_message(USER_ID, "/start")
+        polling = asyncio.create_task(
+            app.dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+        try:
+            await api.wait_reply(USER_ID, FIRST_UPDATE_TIMEOUT)
+            replied = time.monotonic()
+        finally:
+            await app.dp.stop_polling()
+            await polling
+            await app.close()
+            await bot.session.close()
+            await api.stop()
+        return {"polling_start": polling_started, "first_reply": replied}
+
+    stamps = asyncio.run(first_update())
+    ms = lambda stamp: (stamp - spawned) * 1000
+    print(json.dumps({
+        "interpreter_ms": ms(started),
+        "import_bot_ms": ms(imported),
+        "create_app_ms": ms(created),
+        "polling_start_ms": ms(stamps["polling_start"]),
+        "first_update_ms": ms(stamps["first_reply"]),
+    }))
+
+
+def run_once(importtime: bool = False) -> Dict[str, Any]:
+    """Один холодный старт в новом процессе"""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    spawned = time.monotonic()
+    cmd += [os.path.abspath(__file__), "--child", repr(spawned)]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = result.stdout.strip().splitlines()
+    return {"phases": json.loads(lines[-1]), "stderr": result.stderr}
+
+
+# ========== РАЗБИВКА ИМПОРТА ==========
+
+def parse_importtime(text: str) -> List[Dict[str, Any]]:
+    """
+    Строки "import time: self | cumulative | name" из вывода -X importtime
+
+    Returns:
+        list: {"module", "self_ms", "cumulative_ms", "depth"} в порядке вывода
+    """
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # заголовок таблицы
+        name = parts[2].rstrip()
+        module = name.lstrip()
+        rows.append({
+            "module": module,
+            "self_ms": int(parts[0]) / 1000,
+            "cumulative_ms": int(parts[1]) / 1000,
+            # Вложенность - отступ по два пробела на уровень
+            "depth": (len(name) - len(module) - 1) // 2,
+        })
+    return rows
+
+
+def import_breakdown(rows: List[Dict[str, Any]], top: int = TOP_MODULES) -> Dict[str, Any]:
+    """Самые долгие модули (собственное время) и пакеты верхнего уровня (сумма)"""
+    packages: Dict[str, float] = defaultdict(float)
+    for row in rows:
+        packages[row["module"].split(".")[0]] += row["self_ms"]
+    modules = sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:top]
+    return {
+        "total_ms": sum(row["self_ms"] for row in rows),
+        "bot_ms": next((row["cumulative_ms"] for row in rows if row["module"] == "bot"), None),
+        "packages": [{"package": name, "self_ms": value} for name, value in
+                     sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+        "modules": [{"module": row["module"], "self_ms": row["self_ms"],
+                     "cumulative_ms": row["cumulative_ms"]} for row in modules],
+    }
+
+
+# ========== ОТЧЕТ ==========
+
+def run_startup(runs: int, top: int = TOP_MODULES) -> Dict[str, Any]:
+    """Медианы этапов по runs холодным стартам и разбивка импорта"""
+    samples = [run_once()["phases"] for _ in range(runs)]
+    phases = {name: statistics.median(sample[name] for sample in samples)
+              for name in samples[0]}
+    traced = run_once(importtime=True)
+    return {
+        "runs": runs,
+        "phases_ms": phases,
+        "samples": samples,
+        "imports": import_breakdown(parse_importtime(traced["stderr"]), top),
+    }
+
+
+def check_budget(report: Dict[str, Any], import_budget: float, budget: float) -> List[str]:
+    """Превышения бюджета (пустой список - бюджет соблюден)"""
+    phases = report["phases_ms"]
+    failures = []
+    if phases["import_bot_ms"] > import_budget:
+        failures.append(f"import bot: {phases['import_bot_ms']:.0f} мс > {import_budget:.0f} мс")
+    if phases["first_update_ms"] > budget:
+        failures.append(f"первое обновление: {phases['first_update_ms']:.0f} мс > {budget:.0f} мс")
+    return failures
+
+
+def print_summary(report: Dict[str, Any], file=sys.stderr):
+    phases = report["phases_ms"]
+    print(f"ХОЛОДНЫЙ СТАРТ (медиана {report['runs']} запусков, мс от запуска процесса):", file=file)
+    print(f"  интерпретатор        {phases['interpreter_ms']:9.1f}", file=file)
+    print(f"  import bot           {phases['import_bot_ms']:9.1f}", file=file)
+    print(f"  create_app           {phases['create_app_ms']:9.1f}", file=file)
+    print(f"  первое обновление    {phases['first_update_ms']:9.1f}", file=file)
+    imports = report["imports"]
+    print(f"ИМПОРТ ПО ПАКЕТАМ (-X importtime, всего {imports['total_ms']:.1f} мс):", file=file)
+    for row in imports["packages"][:10]:
+        print(f"  {row['package']:30} {row['self_ms']:9.1f}", file=file)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замер холодного старта бота")
+    parser.add_argument("--runs", type=int, default=3, help="число холодных стартов")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS,
+                        help="бюджет импорта bot, мс от запуска процесса")
+    parser.add_argument("--budget", type=float, default=FIRST_UPDATE_BUDGET_MS,
+                        help="бюджет ответа на первое обновление, мс от запуска процесса")
+    parser.add_argument("--top", type=int, default=TOP_MODULES,
+                        help="строк в разбивке импорта")
+    parser.add_argument("--output", help="файл для отчета JSON (по умолчанию stdout)")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        _child(args.child)
+        return 0
+
+    report = run_startup(max(1, args.runs), args.top)
+    failures = check_budget(report, args.import_budget, args.budget)
+    report["budget_ms"] = {"import_bot": args.import_budget, "first_update": args.budget}
+    report["failures"] = failures
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    print_summary(report)
+    for failure in failures:
+        print(f"  ! бюджет превышен: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
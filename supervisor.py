@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Запуск бота в нескольких процессах с распределением по пользователям
+
+Супервизор сам получает обновления (getUpdates) и раздает их N рабочим
+процессам. В каждом рабочем процессе работают обработчики бота (handlers.py) со
+своими сессиями. Рабочий выбирается согласованным хешированием по
+from_user.id, поэтому все обновления одного пользователя попадают в один
+процесс и его состояние остается локальным. При перезапуске процесса с тем
+же номером пользователи не переезжают, а при изменении числа процессов
+переезжает только их небольшая доля.
+
+Супервизор периодически проверяет рабочих (ping/pong), перезапускает
+упавшие и зависшие процессы, а при остановке дожидается завершения уже
+принятых обновлений (drain). Пока упавший процесс ждет перезапуска, его
+обновления копятся в супервизоре и вместе с непрочитанными из старой очереди
+передаются новому процессу. Обновления, которые процесс уже взял в работу,
+теряются вместе с ним. Сессии пользователей упавшего процесса переживают
+перезапуск, только если задан BOT_SESSION_DB (config.py).
+
+Пример:
+    python supervisor.py --workers 4
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+import logger
+from logger import log, error
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Виртуальных точек на кольце для каждого рабочего
+RING_REPLICAS = 64
+# Проверка рабочих: период и время без ответа, после которого процесс перезапускается
+HEALTH_INTERVAL = 5.0
+HEALTH_TIMEOUT = 30.0
+# Ожидание готовности рабочего после запуска и завершения при остановке
+START_TIMEOUT = 60.0
+DRAIN_TIMEOUT = 30.0
+# Пауза перед повторным перезапуском процесса, который падает сразу после старта
+RESTART_BACKOFF = 1.0
+# Ожидание очередного сообщения при сборе непрочитанных обновлений упавшего процесса
+SALVAGE_TIMEOUT = 0.05
+# Long polling супервизора
+POLL_TIMEOUT = 30
+POLL_LIMIT = 100
+
+
+# ========== СОГЛАСОВАННОЕ ХЕШИРОВАНИЕ ==========
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Кольцо согласованного хеширования с виртуальными точками"""
+
+    def __init__(self, nodes: int, replicas: int = RING_REPLICAS):
+        points = sorted((_hash(f"{node}:{i}"), node) for node in range(nodes) for i in range(replicas))
+        self._points = [p for p, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def node(self, key: int) -> int:
+        """Номер узла для ключа"""
+        i = bisect.bisect(self._points, _hash(str(key)))
+        return self._nodes[i % len(self._nodes)]
+
+
+def update_key(update: Dict[str, Any]) -> int:
+    """Ключ маршрутизации: from_user.id, иначе id чата, иначе update_id"""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return update.get("update_id", 0)
+
+
+# ========== РАБОЧИЙ ПРОЦЕСС ==========
+
+def _worker_main(index: int, inbox, conn, token: str, api_base: Optional[str],
+                 metrics_port: Optional[int], log_queue):
+    """Точка входа рабочего процесса"""
+    # Файл лога пишет только супервизор: записи рабочего уходят к нему через очередь
+    logger.attach(log_queue)
+    # Ctrl+C получает вся группа процессов: остановкой рабочих управляет супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(index, inbox, conn, token, api_base, metrics_port))
+
+
+async def _worker(index: int, inbox, conn, token: str, api_base: Optional[str],
+                  metrics_port: Optional[int]):
+    import bot as app
+    import metrics
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_base)) if api_base else None
+    bot = Bot(token=token, session=session)
+    loop = asyncio.get_running_loop()
+    messages: asyncio.Queue = asyncio.Queue()
+    parent = multiprocessing.parent_process()
+
+    def read_inbox():
+        # multiprocessing.Queue читается блокирующе, поэтому в отдельном потоке
+        while True:
+            try:
+                item = inbox.get(timeout=1.0)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    item = ("drain",)
+                else:
+                    continue
+            loop.call_soon_threadsafe(messages.put_nowait, item)
+            if item[0] == "drain":
+                return
+
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = metrics.MetricsServer(metrics.DEFAULT_HOST, metrics_port + index)
+        await metrics_server.start()
+
+    await app.dp.emit_startup(bot=bot, dispatcher=app.dp, bots=[bot], **app.dp.workflow_data)
+    threading.Thread(target=read_inbox, name="inbox", daemon=True).start()
+    conn.send(("ready", index))
+
+    in_flight: set = set()
+    handled = 0
+    while True:
+        item = await messages.get()
+        kind = item[0]
+        if kind == "update":
+            task = asyncio.create_task(app.dp.feed_raw_update(bot, item[1]))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            handled += 1
+        elif kind == "ping":
+            conn.send(("pong", index, len(in_flight), handled))
+        elif kind == "drain":
+            break
+
+    if in_flight:
+        await asyncio.wait(set(in_flight), timeout=DRAIN_TIMEOUT)
+    await app.dp.emit_shutdown(bot=bot, dispatcher=app.dp, bots=[bot], **app.dp.workflow_data)
+    await app.outbox.close()
+    await bot.session.close()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    app.executor.shutdown()
+    app.sessions.close()
+    try:
+        conn.send(("drained", index, handled))
+    except (BrokenPipeError, OSError):
+        pass
+
+
+class _WorkerHandle:
+    """Рабочий процесс глазами супервизора"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.inbox = None
+        self.conn = None
+        self.ready: Optional[asyncio.Future] = None
+        self.drained: Optional[asyncio.Future] = None
+        self.last_pong = 0.0
+        self.started = 0.0
+        self.restarts = 0
+        self.dispatched = 0
+        self.in_flight = 0
+        # Перезапуск начат: новые обновления копятся в held до появления нового процесса
+        self.restarting = False
+        self.held: List[Dict[str, Any]] = []
+
+    def alive(self) -> bool:
+        return (not self.restarting and self.inbox is not None
+                and self.process is not None and self.process.is_alive())
+
+
+# ========== СУПЕРВИЗОР ==========
+
+class Supervisor:
+    """
+    Процессы-обработчики с маршрутизацией обновлений по пользователю
+
+    Args:
+        workers: количество рабочих процессов
+        token: токен бота
+        api_base: адрес Bot API (None - api.telegram.org; для тестов - fake_api)
+        metrics_port: первый порт /metrics рабочих (рабочий i слушает metrics_port + i;
+            None - без метрик)
+        health_interval, health_timeout: период проверки и допустимое время без ответа
+        start_method: способ запуска процессов multiprocessing
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, token: str = "",
+                 api_base: Optional[str] = None, metrics_port: Optional[int] = None,
+                 health_interval: float = HEALTH_INTERVAL, health_timeout: float = HEALTH_TIMEOUT,
+                 start_method: str = "spawn"):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.token = token
+        self.api_base = api_base
+        self.metrics_port = metrics_port
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.ring = HashRing(workers)
+        self.workers = [_WorkerHandle(i) for i in range(workers)]
+        self._context = multiprocessing.get_context(start_method)
+        self._health: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._offset = 0
+
+    # ---------- процессы ----------
+
+    def _spawn(self, handle: _WorkerHandle):
+        loop = asyncio.get_running_loop()
+        inbox = self._context.Queue()
+        conn, child = self._context.Pipe()
+        # Не демон: рабочему нужен собственный пул процессов для расчетов
+        process = self._context.Process(
+            target=_worker_main, name=f"bot-worker-{handle.index}",
+            args=(handle.index, inbox, child, self.token, self.api_base, self.metrics_port,
+                  logger.process_queue(self._context)))
+        process.start()
+        child.close()
+
+        handle.process, handle.inbox, handle.conn = process, inbox, conn
+        handle.ready = loop.create_future()
+        handle.drained = loop.create_future()
+        handle.started = handle.last_pong = time.monotonic()
+        loop.add_reader(conn.fileno(), self._on_message, handle, conn)
+
+    def _on_message(self, handle: _WorkerHandle, conn):
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            if handle.conn is conn:
+                self._on_exit(handle)
+            return
+
+        kind = message[0]
+        handle.last_pong = time.monotonic()
+        if kind == "ready" and not handle.ready.done():
+            handle.ready.set_result(True)
+        elif kind == "pong":
+            handle.in_flight = message[2]
+        elif kind == "drained" and not handle.drained.done():
+            handle.drained.set_result(message[2])
+
+    def _on_exit(self, handle: _WorkerHandle):
+        """Канал закрыт: процесс завершился"""
+        for future in (handle.ready, handle.drained):
+            if future is not None and not future.done():
+                future.set_result(False)
+        if not self._stopping:
+            error("Worker exited", worker=handle.index, exitcode=handle.process.exitcode)
+            handle.restarting = True
+            asyncio.get_running_loop().create_task(self._restart(handle))
+
+    async def _restart(self, handle: _WorkerHandle):
+        process = handle.process
+        handle.restarting = True
+        # Процесс, упавший сразу после старта, перезапускается с паузой
+        if time.monotonic() - handle.started < RESTART_BACKOFF:
+            await asyncio.sleep(RESTART_BACKOFF)
+        if self._stopping or handle.process is not process:
+            return
+        self._discard(handle)
+        handle.restarts += 1
+        self._spawn(handle)
+        handle.restarting = False
+        held, handle.held = handle.held, []
+        for update in held:
+            handle.inbox.put(("update", update))
+        log("Worker restarted", worker=handle.index, restarts=handle.restarts, replayed=len(held))
+
+    def _discard(self, handle: _WorkerHandle):
+        """Освобождение ресурсов старого процесса"""
+        if handle.conn is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(handle.conn.fileno())
+            except (ValueError, OSError):
+                pass
+            handle.conn.close()
+            handle.conn = None
+        if handle.process is not None and handle.process.is_alive():
+            handle.process.kill()
+            handle.process.join(1.0)
+        if handle.inbox is not None:
+            handle.held[:0] = self._salvage(handle.inbox)
+            handle.inbox.cancel_join_thread()
+            handle.inbox.close()
+            handle.inbox = None
+
+    @staticmethod
+    def _salvage(inbox) -> List[Dict[str, Any]]:
+        """Обновления, которые завершившийся процесс не успел прочитать из очереди"""
+        # Процесс мог погибнуть внутри inbox.get(), не отпустив блокировку чтения,
+        # поэтому сообщения читаются из канала очереди напрямую, мимо блокировки
+        reader = inbox._reader
+        updates = []
+        try:
+            while reader.poll(SALVAGE_TIMEOUT):
+                item = reader.recv()
+                if item[0] == "update":
+                    updates.append(item[1])
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            error("Inbox salvage failed", error=str(e), salvaged=len(updates))
+        return updates
+
+    async def start(self):
+        """Запуск рабочих и ожидание их готовности"""
+        for handle in self.workers:
+            self._spawn(handle)
+        await asyncio.wait_for(asyncio.gather(*(h.ready for h in self.workers)), START_TIMEOUT)
+        self._health = asyncio.get_running_loop().create_task(self._health_loop())
+        log("Supervisor started", workers=len(self.workers))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for handle in self.workers:
+                if handle.inbox is None or not handle.ready.done():
+                    continue
+                # Завершившиеся процессы перезапускает _on_exit, здесь - зависшие
+                if now - handle.last_pong > self.health_timeout:
+                    error("Worker unhealthy", worker=handle.index,
+                          silent_s=round(now - handle.last_pong, 1))
+                    await self._restart(handle)
+                else:
+                    handle.inbox.put(("ping",))
+
+    # ---------- маршрутизация ----------
+
+    def dispatch(self, update: Dict[str, Any]) -> int:
+        """Передача обновления (словарь JSON Bot API) рабочему; возвращает его номер"""
+        handle = self.workers[self.ring.node(update_key(update))]
+        if handle.alive():
+            handle.inbox.put(("update", update))
+        else:
+            # Процесс упал и ждет перезапуска: _restart передаст обновление новому
+            handle.held.append(update)
+        handle.dispatched += 1
+        return handle.index
+
+    async def poll(self):
+        """Получение обновлений через getUpdates и раздача рабочим"""
+        server = TelegramAPIServer.from_base(self.api_base) if self.api_base else PRODUCTION
+        url = server.api_url(self.token, "getUpdates")
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            backoff = 0.5
+            while not self._stopping:
+                params = {"offset": str(self._offset), "limit": str(POLL_LIMIT),
+                          "timeout": str(POLL_TIMEOUT)}
+                try:
+                    async with session.post(url, data=params) as response:
+                        data = await response.json(loads=json.loads)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    error("getUpdates failed", error=str(e))
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 0.5
+                if not data.get("ok"):
+                    error("getUpdates failed", error=data.get("description"))
+                    await asyncio.sleep(data.get("parameters", {}).get("retry_after", 1))
+                    continue
+                for update in data["result"]:
+                    self._offset = update["update_id"] + 1
+                    self.dispatch(update)
+
+    # ---------- остановка ----------
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT):
+        """Остановка: рабочие дорабатывают принятые обновления и завершаются"""
+        self._stopping = True
+        if self._health is not None:
+            self._health.cancel()
+            self._health = None
+        running = [h for h in self.workers if h.inbox is not None]
+        for handle in running:
+            handle.inbox.put(("drain",))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(h.drained for h in running)), timeout)
+        except asyncio.TimeoutError:
+            error("Workers did not drain in time")
+        for handle in running:
+            handle.process.join(timeout)
+            self._discard(handle)
+        lost = sum(len(h.held) for h in self.workers)
+        if lost:
+            error("Updates not delivered before stop", count=lost)
+        log("Supervisor stopped")
+
+    async def run(self):
+        """Запуск, прием обновлений до отмены (Ctrl+C) и корректная остановка"""
+        await self.start()
+        try:
+            await self.poll()
+        finally:
+            await self.stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{
+            "worker": h.index,
+            "pid": h.process.pid if h.process else None,
+            "alive": bool(h.process and h.process.is_alive()),
+            "dispatched": h.dispatched,
+            "in_flight": h.in_flight,
+            "held": len(h.held),
+            "restarts": h.restarts,
+        } for h in self.workers]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Запуск бота в нескольких процессах")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--token", help="токен бота (по умолчанию - BOT_TOKEN)")
+    parser.add_argument("--api", help="адрес Bot API (по умолчанию api.telegram.org)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="первый порт /metrics рабочих (рабочий i слушает порт + i)")
+    args = parser.parse_args(argv)
+
+    token = args.token
+    if token is None:
+        from config import load_config
+        from exceptions import ConfigurationError
+        try:
+            token = load_config().require_token()
+        except ConfigurationError as e:
+            print(e.user_message, file=sys.stderr)
+            return 2
+
+    supervisor = Supervisor(args.workers, token, args.api, args.metrics_port)
+    print(f"Бот запущен в {args.workers} процессах. Используйте /start в Telegram")
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,16 +2,239 @@
 Задание 1
 """
 
-def execute_1(arr1, arr2):
-    """Алгоритм задания 1"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from numbers import Integral
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него работает sorted()
+    np = None
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:  # без sortedcontainers задание 1 пересчитывается полностью
+    SortedList = None
+
+# Начиная с этой длины массивов используется NumPy
+NUMPY_THRESHOLD = 2_000
+
+# Сортировка подсчетом, если диапазон значений не больше COUNTING_FACTOR * n
+COUNTING_FACTOR = 4
+COUNTING_MAX_RANGE = 1 << 22
+
+
+def _check(arr1, arr2):
     if len(arr1) != len(arr2):
         raise Exception("Массивы должны быть одинаковой длины")
-    
-    if not arr1 or not arr2:
+
+    if not len(arr1) or not len(arr2):
         raise Exception("Массивы не могут быть пустыми")
-    
+
+
+def _combine(a, b):
+    """Попарное сравнение: 0 при равенстве, иначе сумма"""
+    return [0 if x == y else x + y for x, y in zip(a, b)]
+
+
+def execute_1_python(arr1, arr2):
+    """Алгоритм задания 1 на sorted()"""
     a = sorted(arr1, reverse=True)
     b = sorted(arr2)
-    
-    result = [0 if x == y else x + y for x, y in zip(a, b)]
-    return sorted(result)
\ No newline at end of file
+    return sorted(_combine(a, b))
+
+
+# ========== NUMPY ==========
+
+def _counting_sort(values):
+    """Сортировка подсчетом через bincount, если диапазон значений мал"""
+    lo = int(values.min())
+    span = int(values.max()) - lo + 1
+    if span > min(COUNTING_FACTOR * values.size, COUNTING_MAX_RANGE):
+        return np.sort(values)
+    counts = np.bincount(values - lo, minlength=span)
+    return np.repeat(np.arange(lo, lo + span, dtype=np.int64), counts)
+
+
+def execute_1_numpy(arr1, arr2):
+    """Алгоритм задания 1: сортировка подсчетом или np.sort, векторное сложение"""
+    a = _counting_sort(np.asarray(arr1, dtype=np.int64))[::-1]
+    b = _counting_sort(np.asarray(arr2, dtype=np.int64))
+    result = np.where(a == b, 0, a + b)
+    return _counting_sort(result).tolist()
+
+
+def _numpy_applicable(arr1, arr2):
+    return np is not None and len(arr1) >= NUMPY_THRESHOLD and _fits_int64(arr1, arr2)
+
+
+def _fits_int64(*arrays):
+    """Все значения целые и сумма любых двух помещается в int64"""
+    limit = 2 ** 62
+    for arr in arrays:
+        lo, hi = min(arr), max(arr)
+        if not (isinstance(lo, Integral) and isinstance(hi, Integral) and -limit < lo and hi < limit):
+            return False
+    return True
+
+
+def execute_1(arr1, arr2):
+    """Алгоритм задания 1"""
+    _check(arr1, arr2)
+
+    if _numpy_applicable(arr1, arr2):
+        return execute_1_numpy(arr1, arr2)
+    return execute_1_python(arr1, arr2)
+
+
+# ========== ПАКЕТНАЯ ОБРАБОТКА ==========
+
+def _stack(pairs, indices):
+    """Пары одной длины -> два массива int64 (k, n) или None, если не подходят"""
+    first = np.array([pairs[i][0] for i in indices])
+    second = np.array([pairs[i][1] for i in indices])
+    limit = 2 ** 62
+    for values in (first, second):
+        if values.dtype.kind != "i" or values.ndim != 2:
+            return None
+        if max(-int(values.min()), int(values.max())) >= limit:
+            return None
+    return first.astype(np.int64, copy=False), second.astype(np.int64, copy=False)
+
+
+def execute_1_batch(pairs):
+    """
+    Алгоритм задания 1 для многих пар массивов за один вызов
+
+    Пары одинаковой длины объединяются в двумерные массивы и сортируются
+    NumPy построчно за одну операцию, что убирает накладные расходы на
+    вызов для каждой пары.
+
+    Args:
+        pairs: последовательность пар (arr1, arr2)
+
+    Returns:
+        list: результаты в порядке входных пар
+    """
+    pairs = list(pairs)
+    results = [None] * len(pairs)
+
+    groups = defaultdict(list)
+    for i, (arr1, arr2) in enumerate(pairs):
+        try:
+            _check(arr1, arr2)
+        except Exception as e:
+            raise Exception(f"Пара {i + 1}: {e}")
+        groups[len(arr1)].append(i)
+
+    for indices in groups.values():
+        stacked = _stack(pairs, indices) if np is not None and len(indices) > 1 else None
+        if stacked is None:
+            for i in indices:
+                results[i] = execute_1(*pairs[i])
+            continue
+
+        first, second = stacked
+        first.sort(axis=1)
+        second.sort(axis=1)
+        a = first[:, ::-1]
+        combined = np.where(a == second, 0, a + second)
+        combined.sort(axis=1)
+        for i, row in zip(indices, combined.tolist()):
+            results[i] = row
+
+    return results
+
+
+# ========== ИНКРЕМЕНТАЛЬНЫЙ ПЕРЕСЧЕТ ==========
+
+# Если изменение сдвигает больше 1/REBUILD_FRACTION пар, результат
+# пересобирается целиком: это быстрее поштучной замены
+REBUILD_FRACTION = 64
+
+
+class SortedPairing:
+    """
+    Результат задания 1 с пересчетом при добавлении и изменении элементов
+
+    Отсортированные массивы хранятся в списках с вставкой через bisect
+    (arr1 - с обратным знаком, чтобы индекс k давал k-й элемент по
+    убыванию), результат - в SortedList. Вставка или замена элемента
+    сдвигает пары только между его старой и новой позицией, поэтому
+    заменяются лишь они: O(d log n), где d - расстояние между позициями.
+    При большом d результат пересобирается за O(n log n), как при полном
+    расчете.
+    """
+
+    __slots__ = ("_desc", "_asc", "_result")
+
+    def __init__(self, arr1, arr2):
+        _check(arr1, arr2)
+        self._desc = sorted(-x for x in arr1)
+        self._asc = sorted(arr2)
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._asc)
+
+    @property
+    def nbytes(self):
+        # Оценка: ссылка и объект int на элемент в каждом из трех списков
+        return 3 * len(self._asc) * 40
+
+    def result(self):
+        return list(self._result)
+
+    def _rebuild(self):
+        self._result = SortedList(0 if x == -y else y - x for x, y in zip(self._desc, self._asc))
+
+    def _pair(self, k):
+        x, y = -self._desc[k], self._asc[k]
+        return 0 if x == y else x + y
+
+    def _update(self, lo, old_hi, new_hi, change):
+        """Пары lo..old_hi удаляются, change() меняет массивы, пары lo..new_hi добавляются"""
+        if (new_hi - lo) * REBUILD_FRACTION > len(self._asc):
+            change()
+            self._rebuild()
+            return
+        for k in range(lo, old_hi + 1):
+            self._result.remove(self._pair(k))
+        change()
+        for k in range(lo, new_hi + 1):
+            self._result.add(self._pair(k))
+
+    def append(self, values1, values2):
+        """Добавление элементов в конец обоих массивов (поровну)"""
+        if len(values1) != len(values2):
+            raise Exception("Массивы должны быть одинаковой длины")
+        if len(values1) * REBUILD_FRACTION > len(self._asc):
+            # Крупное добавление: одна пересборка вместо пересчета по элементу
+            for x, y in zip(values1, values2):
+                insort(self._desc, -x)
+                insort(self._asc, y)
+            self._rebuild()
+            return
+        for x, y in zip(values1, values2):
+            p = bisect_right(self._desc, -x)
+            q = bisect_right(self._asc, y)
+
+            def change(p=p, q=q, x=x, y=y):
+                self._desc.insert(p, -x)
+                self._asc.insert(q, y)
+            # Пары до min(p, q) не меняются, после max(p, q) - сдвигаются на одну
+            self._update(min(p, q), max(p, q) - 1, max(p, q), change)
+
+    def set(self, which, old, new):
+        """Замена одного значения old на new в массиве which (1 или 2)"""
+        values, old, new = (self._desc, -old, -new) if which == 1 else (self._asc, old, new)
+        p = bisect_left(values, old)
+        q = bisect_right(values, new)
+        # Позиция нового значения в массиве без старого
+        if p < q:
+            q -= 1
+
+        def change():
+            del values[p]
+            values.insert(q, new)
+        self._update(min(p, q), max(p, q), max(p, q), change)
@@ -2,43 +2,201 @@
 Задание 4
 """
 
+from cache import ResultCache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него работает поразрядный путь
+    np = None
+
+# Начиная с этой длины чисел используется блочная арифметика NumPy
+CHUNK_THRESHOLD = 2_000
+
+# Количество десятичных цифр в одном блоке (основание 10^9 помещается в int64)
+CHUNK_DIGITS = 9
+CHUNK_BASE = 10 ** CHUNK_DIGITS
+
+_DIGITS = frozenset(range(10))
+
+
+# ========== ПОРАЗРЯДНАЯ АРИФМЕТИКА ==========
+
+def _strip(digits):
+    """Удаление ведущих нулей (пустой массив считается нулем)"""
+    i = 0
+    last = len(digits) - 1
+    while i < last and digits[i] == 0:
+        i += 1
+    return list(digits[i:]) if digits else [0]
+
+
+def _compare(a, b):
+    """Сравнение модулей двух чисел без ведущих нулей: -1, 0 или 1"""
+    if len(a) != len(b):
+        return -1 if len(a) < len(b) else 1
+    for x, y in zip(a, b):
+        if x != y:
+            return -1 if x < y else 1
+    return 0
+
+
+def add_digits(a, b):
+    """Сложение массивов цифр с переносом"""
+    if len(a) < len(b):
+        a, b = b, a
+    result = [0] * (len(a) + 1)
+    carry = 0
+    offset = len(a) - len(b)
+
+    for i in range(len(a) - 1, -1, -1):
+        j = i - offset
+        s = a[i] + (b[j] if j >= 0 else 0) + carry
+        if s >= 10:
+            result[i + 1] = s - 10
+            carry = 1
+        else:
+            result[i + 1] = s
+            carry = 0
+
+    result[0] = carry
+    return _strip(result)
+
+
+def sub_digits(a, b):
+    """Вычитание массивов цифр с заемом (модуль a не меньше модуля b)"""
+    result = [0] * len(a)
+    borrow = 0
+    offset = len(a) - len(b)
+
+    for i in range(len(a) - 1, -1, -1):
+        j = i - offset
+        d = a[i] - (b[j] if j >= 0 else 0) - borrow
+        if d < 0:
+            result[i] = d + 10
+            borrow = 1
+        else:
+            result[i] = d
+            borrow = 0
+
+    return _strip(result)
+
+
+def calculate_digits(arr1, arr2, operation):
+    """Поразрядное выполнение операции, результат в формате execute_4"""
+    if not _DIGITS.issuperset(arr1) or not _DIGITS.issuperset(arr2):
+        raise ValueError("Массивы должны состоять из цифр 0-9")
+
+    a = _strip(arr1)
+    b = _strip(arr2)
+
+    if operation == '+':
+        return add_digits(a, b)
+    if operation != '-':
+        raise ValueError("Неизвестная операция")
+
+    if _compare(a, b) < 0:
+        result = sub_digits(b, a)
+        return ['-'] + result if result != [0] else result
+    return sub_digits(a, b)
+
+
+# ========== БЛОЧНАЯ АРИФМЕТИКА (NumPy) ==========
+
+def _to_chunks(values, size):
+    """Массив цифр -> блоки по основанию 10^k, младший блок первым"""
+    count = -(-size // CHUNK_DIGITS)
+    padded = np.zeros(count * CHUNK_DIGITS, dtype=np.int64)
+    padded[padded.size - values.size:] = values
+    powers = 10 ** np.arange(CHUNK_DIGITS - 1, -1, -1, dtype=np.int64)
+    return (padded.reshape(count, CHUNK_DIGITS) @ powers)[::-1].copy()
+
+
+def _from_chunks(chunks):
+    """Блоки по основанию 10^k -> массив цифр без ведущих нулей"""
+    powers = 10 ** np.arange(CHUNK_DIGITS - 1, -1, -1, dtype=np.int64)
+    digits = (chunks[::-1, None] // powers) % 10
+    digits = digits.reshape(-1)
+    nonzero = np.flatnonzero(digits)
+    if nonzero.size == 0:
+        return [0]
+    return digits[nonzero[0]:].tolist()
+
+
+def _propagate(generate, propagate):
+    """
+    Вычисление входящего переноса (заема) для каждого блока
+
+    Блок передает перенос дальше, если propagate, и порождает его, если
+    generate. Входящий перенос блока i равен значению generate ближайшего
+    младшего блока, который не передает перенос насквозь.
+    """
+    n = generate.size
+    stop = ~propagate
+    last = np.where(stop, np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+
+    incoming = np.zeros(n, dtype=np.int64)
+    source = last[:-1]
+    valid = source >= 0
+    incoming[1:][valid] = generate[source[valid]]
+    return incoming
+
+
+def calculate_chunked(arr1, arr2, operation):
+    """Векторизованное выполнение операции блоками по 10^9 за линейное время"""
+    if operation not in ('+', '-'):
+        raise ValueError("Неизвестная операция")
+
+    v1 = np.asarray(arr1, dtype=np.int64).reshape(-1)
+    v2 = np.asarray(arr2, dtype=np.int64).reshape(-1)
+    if ((v1 < 0) | (v1 > 9)).any() or ((v2 < 0) | (v2 > 9)).any():
+        raise ValueError("Массивы должны состоять из цифр 0-9")
+
+    size = max(v1.size, v2.size, 1)
+    a = _to_chunks(v1, size)
+    b = _to_chunks(v2, size)
+
+    if operation == '+':
+        s = a + b
+        carry = _propagate(s >= CHUNK_BASE, s == CHUNK_BASE - 1)
+        s += carry
+        top = int(s[-1] >= CHUNK_BASE)
+        s %= CHUNK_BASE
+        if top:
+            s = np.append(s, 1)
+        return _from_chunks(s)
+
+    # Знак определяется по старшему различающемуся блоку
+    diff = np.flatnonzero(a != b)
+    if diff.size == 0:
+        return [0]
+    negative = a[diff[-1]] < b[diff[-1]]
+    if negative:
+        a, b = b, a
+
+    d = a - b
+    borrow = _propagate(d < 0, d == 0)
+    d -= borrow
+    d %= CHUNK_BASE
+    result = _from_chunks(d)
+    return ['-'] + result if negative else result
+
+
+# ========== ТОЧКА ВХОДА ==========
+
 def execute_4(arr1, arr2, operation):
     """Алгоритм задания 4"""
     try:
-        # Преобразование в число
-        def to_number(arr):
-            if not arr:
-                return 0
-            return int(''.join(map(str, arr)))
-        
-        num1 = to_number(arr1)
-        num2 = to_number(arr2)
-        
-        # Выполнение операции
-        if operation == '+':
-            result = num1 + num2
-        elif operation == '-':
-            result = num1 - num2
-        else:
-            raise ValueError("Неизвестная операция")
-        
-        # Преобразование результата
-        if result < 0:
-            return ['-'] + [int(d) for d in str(abs(result))]
-        else:
-            return [int(d) for d in str(result)]
-    
+        if np is not None and max(len(arr1), len(arr2)) >= CHUNK_THRESHOLD:
+            return calculate_chunked(arr1, arr2, operation)
+        return calculate_digits(arr1, arr2, operation)
+
     except Exception as e:
         raise Exception(f"Ошибка вычислений: {e}")
 
 
-class Task4Cache:
-    """Кэш для задания 4"""
-    def __init__(self):
-        self.cache = {}
-    
+class Task4Cache(ResultCache):
+    """Кэш для задания 4 (ограниченный LRU-кэш по содержимому массивов)"""
+
     def execute_cached(self, arr1, arr2, operation):
-        key = (tuple(arr1), tuple(arr2), operation)
-        if key not in self.cache:
-            self.cache[key] = execute_4(arr1, arr2, operation)
-        return self.cache[key]
\ No newline at end of file
+        return self.call(execute_4, arr1, arr2, operation)
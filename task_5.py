@@ -2,20 +2,400 @@
 Задание 5
 """
 
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен: без него работает чистый Python
+    np = None
+
+# Начиная с этого размера массива используется векторизованный путь NumPy
+NUMPY_THRESHOLD = 10_000
+
+# Предел модуля префиксных сумм, при котором int64 гарантированно не переполнится
+_INT64_SAFE = 2 ** 62
+_INT64_MAX = 2 ** 63 - 1
+
+# Индекс строится, если пар (i, j) не больше INDEX_MAX_PAIRS (без NumPy -
+# INDEX_MAX_PAIRS_PYTHON), а таблица занимает не больше INDEX_MAX_BYTES
+INDEX_MAX_PAIRS = 2_000_000
+INDEX_MAX_PAIRS_PYTHON = 200_000
+INDEX_MAX_BYTES = 16 * 1024 * 1024
+# Байт на одну сумму в индексе: ключ и счетчик int64 или запись словаря
+INDEX_ENTRY_BYTES = 16
+TABLE_ENTRY_BYTES = 64
+# Построение индекса стоит примерно n / INDEX_BATCH_FACTOR проходов execute_5:
+# при меньшем числе сумм execute_5_batch считает каждую отдельно
+INDEX_BATCH_FACTOR = 20
+
+
+def count_subarrays_python(arr, target):
+    """
+    Подсчет подмассивов с суммой target через префиксные суммы
+
+    Для каждой позиции j ищем, сколько раньше встречалась префиксная
+    сумма prefix - target. Время O(n), память O(n).
+    """
+    counts = {0: 1}
+    get = counts.get
+    prefix = 0
+    total = 0
+
+    for x in arr:
+        prefix += x
+        total += get(prefix - target, 0)
+        counts[prefix] = get(prefix, 0) + 1
+
+    return total
+
+
+def count_subarrays_numpy(values, target):
+    """
+    Векторизованный подсчет подмассивов с суммой target
+
+    Позиции (P[i], i), запросы (P[j] - target, j) и маркеры начала группы
+    (P[j] - target, -1) кодируются одним ключом int64 и сортируются вместе.
+    Для каждого запроса число подходящих i < j равно числу позиций между
+    его маркером и им самим, что дает один накопленный счетчик.
+    Результат совпадает с count_subarrays_python.
+    """
+    n = values.size
+    prefix = np.empty(n + 1, dtype=np.int64)
+    prefix[0] = 0
+    np.cumsum(values, out=prefix[1:])
+    wanted = prefix - target
+
+    lo = min(int(prefix.min()), int(wanted.min()))
+    hi = max(int(prefix.max()), int(wanted.max()))
+    width = 4 * (n + 1)
+
+    if (hi - lo + 1) * width < _INT64_SAFE:
+        point_vals = prefix - lo
+        query_vals = wanted - lo
+    else:
+        # Слишком широкий диапазон сумм: сжимаем значения в ранги.
+        # Отсутствующие суммы получают четный ранг и не совпадают ни с одной позицией
+        uniq, ranks = np.unique(prefix, return_inverse=True)
+        pos = np.searchsorted(uniq, wanted)
+        hit = pos < uniq.size
+        hit[hit] = uniq[pos[hit]] == wanted[hit]
+        point_vals = ranks.reshape(-1).astype(np.int64) * 2 + 1
+        query_vals = pos.astype(np.int64) * 2 + hit
+
+    # Младшие биты ключа: 0 - маркер, 2 - запрос j, 3 - позиция i.
+    # Запрос j идет раньше позиции j, поэтому учитываются только i < j
+    index = np.arange(n + 1, dtype=np.int64) * 4
+    query_base = query_vals * width
+    keys = np.concatenate((point_vals * width + index + 3, query_base + index + 2, query_base))
+    keys.sort()
+
+    kind = keys & 3
+    points_before = np.cumsum(kind == 3, dtype=np.int64)
+    return int(points_before[kind == 2].sum() - points_before[kind == 0].sum())
+
+
+def _to_int64(arr, target, min_size=NUMPY_THRESHOLD):
+    """
+    Перевод массива в int64, если сумма гарантированно не переполнится
+
+    None - считать точным путем на Python (в том числе для чисел вне
+    int64: uint64 при переводе стал бы отрицательным)
+    """
+    if np is None or len(arr) < min_size or not isinstance(target, int):
+        return None
+    try:
+        values = np.asarray(arr)
+    except (OverflowError, ValueError):
+        return None
+    if values.dtype.kind not in "iu" or values.ndim != 1:
+        return None
+    if values.dtype.kind == "u" and values.size and int(values.max()) > _INT64_MAX:
+        return None
+    values = values.astype(np.int64, copy=False)
+    peak = int(np.abs(values).max()) if values.size else 0
+    if peak * values.size + abs(target) >= _INT64_SAFE:
+        return None
+    return values
+
+
+def _python_ints(arr):
+    """Массив NumPy - в список int (без переполнения при сложении), остальное как есть"""
+    if np is not None and isinstance(arr, np.ndarray):
+        return arr.tolist()
+    return arr
+
+
+# ========== ИНДЕКС ПО ВСЕМ СУММАМ ==========
+
+class SubarrayIndex:
+    """
+    Количество подмассивов для каждой возможной суммы
+
+    Хранит таблицу "сумма -> число подмассивов" по всем парам префиксных
+    сумм i < j, поэтому любой запрос отвечается за O(log m) без прохода
+    по массиву. Создается через build_index.
+    """
+
+    __slots__ = ("size", "_keys", "_counts", "_table")
+
+    def __init__(self, size, keys=None, counts=None, table=None):
+        self.size = size
+        self._keys = keys
+        self._counts = counts
+        self._table = table
+
+    def __len__(self):
+        """Количество различных сумм подмассивов"""
+        return len(self._table) if self._table is not None else self._keys.size
+
+    @property
+    def nbytes(self):
+        if self._table is not None:
+            return sys.getsizeof(self._table) + 64 * len(self._table)
+        return self._keys.nbytes + self._counts.nbytes
+
+    def count(self, target):
+        """Число подмассивов с суммой target"""
+        if self._table is not None:
+            return self._table.get(target, 0)
+        if not -_INT64_SAFE < target < _INT64_SAFE:
+            return 0
+        pos = int(np.searchsorted(self._keys, target))
+        if pos < self._keys.size and self._keys[pos] == target:
+            return int(self._counts[pos])
+        return 0
+
+    def count_many(self, targets):
+        """Пакетный запрос: список количеств для каждой суммы из targets"""
+        targets = list(targets)
+        if self._table is not None or not all(-_INT64_SAFE < t < _INT64_SAFE for t in targets):
+            return [self.count(t) for t in targets]
+        wanted = np.asarray(targets, dtype=np.int64)
+        pos = np.searchsorted(self._keys, wanted)
+        inside = pos < self._keys.size
+        found = np.zeros(wanted.size, dtype=np.int64)
+        hit = inside.copy()
+        hit[inside] = self._keys[pos[inside]] == wanted[inside]
+        found[hit] = self._counts[pos[hit]]
+        return found.tolist()
+
+
+class _NoIndex:
+    """Отметка "индекс для этого массива не строится": хранится вместо индекса,
+    чтобы не повторять попытку построения"""
+
+    __slots__ = ()
+    nbytes = 0
+
+    def __repr__(self):
+        return "NO_INDEX"
+
+
+NO_INDEX = _NoIndex()
+
+
+def build_index(arr, max_pairs=INDEX_MAX_PAIRS, max_bytes=INDEX_MAX_BYTES):
+    """
+    Построение SubarrayIndex для массива
+
+    Время и временная память O(n^2) по числу пар, поэтому для больших
+    массивов индекс не строится. Размер таблицы оценивается до построения:
+    различных сумм не больше пар и не больше ширины диапазона разностей
+    префиксных сумм, 2 * (max P - min P) + 1.
+
+    Returns:
+        SubarrayIndex или None, если массив слишком большой (тогда
+        запросы считаются через execute_5)
+    """
+    n = len(arr)
+    pairs = n * (n + 1) // 2
+    if not n:
+        return None
+
+    values = _to_int64(arr, 0, min_size=0) if pairs <= max_pairs else None
+    if values is None:
+        if pairs > INDEX_MAX_PAIRS_PYTHON:
+            return None
+        return _build_table(_python_ints(arr), max_bytes)
+
+    prefix = np.empty(n + 1, dtype=np.int64)
+    prefix[0] = 0
+    np.cumsum(values, out=prefix[1:])
+    if _max_sums(int(prefix.min()), int(prefix.max()), pairs) * INDEX_ENTRY_BYTES > max_bytes:
+        return None
+    # Разности P[j] - P[i] для всех i < j, строка за строкой в один буфер
+    sums = np.empty(pairs, dtype=np.int64)
+    offset = 0
+    for i in range(n):
+        row = sums[offset:offset + n - i]
+        np.subtract(prefix[i + 1:], prefix[i], out=row)
+        offset += n - i
+    sums.sort()
+    starts = np.empty(sums.size, dtype=bool)
+    starts[0] = True
+    np.not_equal(sums[1:], sums[:-1], out=starts[1:])
+    first = np.flatnonzero(starts)
+    keys = sums[first]
+    counts = np.diff(np.append(first, sums.size))
+    return SubarrayIndex(n, keys=keys, counts=counts)
+
+
+def _max_sums(low, high, pairs):
+    """Верхняя оценка числа различных сумм подмассивов"""
+    return min(pairs, 2 * (high - low) + 1)
+
+
+def _build_table(arr, max_bytes):
+    """Индекс на словаре (без NumPy или для чисел вне int64)"""
+    table = {}
+    get = table.get
+    prefixes = [0]
+    for x in arr:
+        prefixes.append(prefixes[-1] + x)
+    pairs = len(arr) * (len(arr) + 1) // 2
+    if _max_sums(min(prefixes), max(prefixes), pairs) * TABLE_ENTRY_BYTES > max_bytes:
+        return None
+    for i, start in enumerate(prefixes):
+        for end in prefixes[i + 1:]:
+            table[end - start] = get(end - start, 0) + 1
+    index = SubarrayIndex(len(arr), table=table)
+    return index if index.nbytes <= max_bytes else None
+
+
+# ========== ПЕРЕЧИСЛЕНИЕ ПОДМАССИВОВ ==========
+
+class SubarrayPager:
+    """
+    Ленивое перечисление подмассивов с суммой target
+
+    Пары (start, end) - индексы первого и последнего элемента, начиная с 0.
+    Порядок: по возрастанию end, для одного end - от коротких к длинным.
+    Памяти нужно O(n) на позиции префиксных сумм, найденные пары не
+    накапливаются.
+
+    Курсор (j, k) означает: следующая пара - (k+1)-я для префикса j, то есть
+    для end = j - 1. По курсору перечисление возобновляется без повторного
+    поиска пройденных пар: восстанавливаются только позиции префиксов до j.
+    """
+
+    def __init__(self, arr, target, cursor=(1, 0)):
+        self.arr = arr
+        self.target = target
+        self.cursor = tuple(cursor)
+        self._pairs = self._generate(*self.cursor)
+
+    def __iter__(self):
+        return self._pairs
+
+    @property
+    def done(self):
+        return self.cursor is None
+
+    def next_page(self, size):
+        """Следующие size пар (меньше - если пары закончились)"""
+        page = []
+        for pair in self._pairs:
+            page.append(pair)
+            if len(page) == size:
+                break
+        else:
+            self.cursor = None
+        return page
+
+    def _generate(self, start, skip):
+        arr, target = self.arr, self.target
+        # last[P] - последний префикс с суммой P, prev[j] - предыдущий с той же суммой
+        last = {0: 0}
+        prev = array('q', bytes(8 * (len(arr) + 1)))
+        prev[0] = -1
+        prefix = 0
+        for j in range(1, start):
+            prefix += arr[j - 1]
+            prev[j] = last.get(prefix, -1)
+            last[prefix] = j
+
+        for j in range(start, len(arr) + 1):
+            prefix += arr[j - 1]
+            i = last.get(prefix - target, -1)
+            k = 0
+            while i >= 0:
+                if k >= skip:
+                    self.cursor = (j, k + 1)
+                    yield i, j - 1
+                k += 1
+                i = prev[i]
+            skip = 0
+            prev[j] = last.get(prefix, -1)
+            last[prefix] = j
+        self.cursor = None
+
+
+def iter_subarrays(arr, target):
+    """Генератор пар (start, end) подмассивов с суммой target"""
+    return iter(SubarrayPager(arr, target))
+
+
+# ========== ИНКРЕМЕНТАЛЬНЫЙ ПЕРЕСЧЕТ ==========
+
+class PrefixCounter:
+    """
+    Счетчик подмассивов с суммой target, поддерживаемый при добавлении
+
+    Хранит последнюю префиксную сумму и словарь количеств префиксов, как
+    count_subarrays_python, поэтому добавление k элементов стоит O(k).
+    Замена элемента в середине меняет все последующие префиксы и требует
+    полного пересчета (rebuild).
+    """
+
+    __slots__ = ("target", "count", "_counts", "_prefix")
+
+    def __init__(self, arr, target):
+        self.target = target
+        self.rebuild(arr)
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self._counts) + 64 * len(self._counts)
+
+    def rebuild(self, arr):
+        self._counts = {0: 1}
+        self._prefix = 0
+        self.count = 0
+        self.extend(arr)
+
+    def extend(self, values):
+        """Добавление элементов в конец массива"""
+        counts, target = self._counts, self.target
+        get = counts.get
+        prefix, total = self._prefix, self.count
+        for x in values:
+            prefix += x
+            total += get(prefix - target, 0)
+            counts[prefix] = get(prefix, 0) + 1
+        self._prefix, self.count = prefix, total
+
+
+def execute_5_batch(arr, targets):
+    """
+    Задание 5 для нескольких сумм: через индекс, а для больших массивов и
+    немногих сумм - отдельным расчетом O(n) для каждой суммы
+    """
+    targets = list(targets)
+    if len(targets) * INDEX_BATCH_FACTOR >= len(arr):
+        index = build_index(arr)
+        if index is not None:
+            return index.count_many(targets)
+    return [execute_5(arr, target) for target in targets]
+
+
 def execute_5(arr, target):
     """Алгоритм задания 5"""
     try:
-        count = 0
-        n = len(arr)
-        
-        for i in range(n):
-            current_sum = 0
-            for j in range(i, n):
-                current_sum += arr[j]
-                if current_sum == target:
-                    count += 1
-        
-        return count
-    
+        values = _to_int64(arr, target)
+        if values is not None:
+            return count_subarrays_numpy(values, target)
+        return count_subarrays_python(_python_ints(arr), target)
+
     except Exception as e:
-        raise Exception(f"Ошибка вычислений: {e}")
\ No newline at end of file
+        raise Exception(f"Ошибка вычислений: {e}")
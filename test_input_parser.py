@@ -0,0 +1,62 @@
+"""
+Проверки разбора ввода: быстрый путь NumPy не должен принимать то, что
+отвергает точный разбор через int()
+
+Запуск: python -m pytest -q test_input_parser.py
+"""
+
+import pytest
+
+import input_parser
+from exceptions import InputError
+from input_parser import parse_edit, parse_task1, parse_task5
+
+
+@pytest.fixture(params=[False, True], ids=["array", "numpy"])
+def as_numpy(request):
+    return request.param
+
+
+@pytest.mark.parametrize("text", [
+    " ;1",          # пустой первый массив
+    "1 2; ",        # пустой второй массив
+    "1 2 -;3 4 5",  # одиночный знак в конце
+    "1 + 2;3 4 5",  # одиночный знак между числами
+    "1 - 2;3 4 5",  # fromstring читает как [1, -2]
+    "1_0 2;3 4",    # int() принимает "1_0"
+])
+def test_task1_rejects(text, as_numpy):
+    with pytest.raises(InputError):
+        parse_task1(text, as_numpy=as_numpy)
+
+
+@pytest.mark.parametrize("text", ["1 2 3;1_0", "1 2 3;", "1 2 3;-", "1 2 -;3"])
+def test_task5_rejects(text, as_numpy):
+    with pytest.raises(InputError):
+        parse_task5(text, as_numpy=as_numpy)
+
+
+def test_bad_token_position():
+    with pytest.raises(InputError) as error:
+        parse_task1("1 2 -;3 4 5")
+    assert error.value.context["position"] == 4
+
+
+def test_valid_input(as_numpy):
+    arr1, arr2 = parse_task1(" -1 +2\t3 ;4\n5 6", as_numpy=as_numpy)
+    assert list(arr1) == [-1, 2, 3] and list(arr2) == [4, 5, 6]
+    arr, target = parse_task5("1 2 3 4; -5 ", as_numpy=as_numpy)
+    assert list(arr) == [1, 2, 3, 4] and target == -5
+
+
+def test_append_rejects_bare_sign():
+    with pytest.raises(InputError):
+        parse_edit("+ 1 -", "5")
+
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(input_parser, "np", None)
+    with pytest.raises(InputError):
+        parse_task1("1_0;1")
+    arr1, arr2 = parse_task1("1 2;3 4")
+    assert list(arr1) == [1, 2] and list(arr2) == [3, 4]
@@ -0,0 +1,152 @@
+"""
+Режим webhook: прием обновлений локальным HTTP-сервером aiohttp
+
+Вместо циклов getUpdates Telegram сам присылает обновления POST-запросами
+на WEBHOOK_PATH. Запрос проверяется по секретному токену (заголовок
+X-Telegram-Bot-Api-Secret-Token), сразу получает ответ 200, а обработка
+идет фоновой задачей. Одновременно обрабатывается не больше max_in_flight
+обновлений: сверх лимита сервер отвечает 503, и Telegram повторит доставку.
+
+Для проверки без сети достаточно отправить записанное обновление:
+    curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: ..." \\
+         -d @update.json http://127.0.0.1:8080/webhook
+"""
+
+import asyncio
+from typing import Any, Optional, Set
+
+from aiohttp import web
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import metrics
+from logger import log
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_PATH = "/webhook"
+DEFAULT_MAX_IN_FLIGHT = 100
+# Сколько ждать завершения обрабатываемых обновлений при остановке
+DRAIN_TIMEOUT = 10.0
+# Telegram принимает max_connections от 1 до 100
+TELEGRAM_MAX_CONNECTIONS = 100
+
+webhook_rejected = metrics.registry.add(metrics.Counter(
+    "bot_webhook_rejected_total", "Обновления, отклоненные из-за лимита одновременной обработки"))
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик webhook с ограничением числа одновременно обрабатываемых обновлений
+
+    Ответ отправляется до обработки (handle_in_background), поэтому время
+    HTTP-ответа не зависит от расчетов в обработчиках.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 secret_token: Optional[str] = None, **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_in_flight = max_in_flight
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            return web.Response(body="Unauthorized", status=401)
+        if len(self._in_flight) >= self.max_in_flight:
+            webhook_rejected.inc()
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = await request.json(loads=self.bot.session.json_loads)
+        except ValueError:
+            return web.Response(body="Bad Request", status=400)
+
+        task = asyncio.create_task(self._background_feed_update(bot=self.bot, update=update))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return web.json_response({}, dumps=self.bot.session.json_dumps)
+
+    __call__ = handle
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """Ожидание обновлений, которые уже приняты в обработку"""
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight), timeout=timeout)
+
+
+class WebhookServer:
+    """
+    Локальный сервер webhook для диспетчера
+
+    Args:
+        dispatcher: диспетчер aiogram
+        bot: бот, от имени которого обрабатываются обновления
+        host, port, path: адрес, на котором принимаются обновления
+        secret_token: секрет для заголовка X-Telegram-Bot-Api-Secret-Token (None - без проверки)
+        max_in_flight: лимит одновременно обрабатываемых обновлений
+        url: публичный адрес для setWebhook (None - webhook не регистрируется,
+            например за обратным прокси, настроенным отдельно, или в тестах)
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, host: str = DEFAULT_HOST,
+                 port: int = DEFAULT_PORT, path: str = DEFAULT_PATH,
+                 secret_token: Optional[str] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, url: Optional[str] = None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.url = url
+        self.handler = LimitedRequestHandler(dispatcher, bot, max_in_flight, secret_token)
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        self.handler.register(app, path=self.path)
+        setup_application(app, self.dispatcher, bot=self.bot)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 система выбирает свободный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        if self.url:
+            await self.bot.set_webhook(
+                self.url,
+                secret_token=self.secret_token,
+                max_connections=min(self.handler.max_in_flight, TELEGRAM_MAX_CONNECTIONS),
+                allowed_updates=self.dispatcher.resolve_used_update_types(),
+            )
+        log("Webhook server started", host=self.host, port=self.port, path=self.path)
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        if self.url:
+            try:
+                await self.bot.delete_webhook()
+            except Exception as e:
+                log("Webhook removal failed", error=str(e))
+        await self.handler.drain()
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def serve_forever(self):
+        """Запуск сервера и ожидание отмены (Ctrl+C)"""
+        await self.start()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await self.stop()